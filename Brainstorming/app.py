@@ -3,18 +3,81 @@ from flask_cors import CORS
 import os
 import io
 import tempfile
+import threading
+import time
 import base64
 from brainstorming import (
     speak, listen_once, gemini_list_items, speech_client, tts_client,
     brainstorm_with_idea, brainstorm_without_idea, get_dynamic_categories,
-    get_dynamic_subtopics, get_dynamic_ideas
+    get_dynamic_subtopics, get_dynamic_ideas, warm_up
 )
 from google.cloud import speech
 from google.cloud import texttospeech
-import google.generativeai as genai
+
+# Metrics, tracing and Gemini calls are shared with the orchestrator; importing brainstorming
+# above puts the repo root (and so /providers) on sys.path
+from providers.brainstorming_utils import gemini_generate_text
+from providers.errors import ProviderError
+from providers.telemetry import (
+    CONTENT_TYPE, http_duration, http_errors, http_in_flight, registry, request_scope, server_timing, stage
+)
 
 app = Flask(__name__)
 
+
+def error_response(e: Exception):
+    """Gemini failures (after retries, or an open circuit) are a 503/502 with the reason; anything else a 500"""
+    if not isinstance(e, ProviderError):
+        return jsonify({'error': str(e)}), 500
+    headers = {'Retry-After': str(max(1, round(e.retry_after)))} if e.retry_after else {}
+    status = 503 if e.retryable or e.circuit_open else 502
+    return jsonify({'error': str(e), 'upstream_status': e.status}), status, headers
+
+
+class TelemetryMiddleware:
+    """WSGI middleware: root span per request (continuing traceparent), route
+    latency and in-flight metrics, Server-Timing and traceresponse headers"""
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        method = environ["REQUEST_METHOD"]
+        started = time.monotonic()
+        status = [500]
+        http_in_flight.inc()
+        with request_scope(f"{method} {environ.get('PATH_INFO', '')}", environ.get("HTTP_TRACEPARENT"),
+                           method=method) as (span, timings):
+            def start_with_headers(status_line, headers, exc_info=None):
+                status[0] = int(status_line.split(" ", 1)[0])
+                headers = headers + [
+                    ("Server-Timing", server_timing(timings, time.monotonic() - started)),
+                    ("traceresponse", span.traceparent()),
+                ]
+                return start_response(status_line, headers, exc_info)
+
+            try:
+                # Responses here are small JSON/audio bodies, so building them is the whole request
+                return self.wsgi_app(environ, start_with_headers)
+            finally:
+                http_in_flight.dec()
+                route = environ.get("kitchen.route", "unmatched")
+                span.name = f"{method} {route}"
+                span.attributes["status"] = status[0]
+                http_duration.observe(time.monotonic() - started, method=method, route=route, status=status[0])
+                if status[0] >= 500:
+                    http_errors.inc(route=route, status=status[0])
+
+
+app.wsgi_app = TelemetryMiddleware(app.wsgi_app)
+
+
+@app.before_request
+def record_route():
+    # The rule template, not the raw path, keeps metric labels bounded
+    if request.url_rule is not None:
+        request.environ["kitchen.route"] = request.url_rule.rule
+
 # Configure CORS with more permissive settings
 CORS(app, 
      origins=['http://localhost:5173', 'http://localhost:3000', 'http://127.0.0.1:5173', 'http://127.0.0.1:3000'],
@@ -26,6 +89,29 @@ CORS(app,
 SAMPLE_RATE = 16000
 CHANNELS = 1
 
+# Startup warm-up (opt-in): /ready stays 503 until Speech, TTS and Gemini are connected
+WARMUP = os.getenv("BRAINSTORM_WARMUP", "false").lower() == "true"
+WARMUP_PROBE = os.getenv("BRAINSTORM_WARMUP_PROBE", "false").lower() == "true"
+warmup_state = {"ready": not WARMUP, "attempts": 0, "timings": {}, "error": None}
+
+
+def _warm_up_until_ready():
+    while not warmup_state["ready"]:
+        warmup_state["attempts"] += 1
+        try:
+            warmup_state["timings"] = warm_up(probe=WARMUP_PROBE)
+            warmup_state["error"] = None
+            warmup_state["ready"] = True
+            print(f"Warm-up complete: {warmup_state['timings']}")
+        except Exception as e:
+            warmup_state["error"] = str(e)
+            print(f"Warm-up attempt {warmup_state['attempts']} failed: {e}")
+            time.sleep(10)
+
+
+if WARMUP:
+    threading.Thread(target=_warm_up_until_ready, name="warm-up", daemon=True).start()
+
 # Comprehensive CORS headers for all responses
 @app.after_request
 def after_request(response):
@@ -61,6 +147,19 @@ def health_check():
         'cors_enabled': True
     })
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics for this process"""
+    return registry.render(), 200, {'Content-Type': CONTENT_TYPE}
+
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """Readiness: 503 until the startup warm-up has finished"""
+    return jsonify({
+        'status': 'ready' if warmup_state['ready'] else 'warming',
+        **warmup_state
+    }), 200 if warmup_state['ready'] else 503
+
 @app.route('/api/speak', methods=['POST'])
 def text_to_speech():
     """Convert text to speech and return audio data"""
@@ -81,9 +180,10 @@ def text_to_speech():
             audio_encoding=texttospeech.AudioEncoding.LINEAR16
         )
 
-        response = tts_client.synthesize_speech(
-            input=synthesis_input, voice=voice, audio_config=audio_config
-        )
+        with stage("tts"):
+            response = tts_client.synthesize_speech(
+                input=synthesis_input, voice=voice, audio_config=audio_config
+            )
         
         # Return audio as base64 encoded data
         audio_base64 = base64.b64encode(response.audio_content).decode('utf-8')
@@ -95,7 +195,7 @@ def text_to_speech():
         })
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
 
 @app.route('/api/transcribe', methods=['POST'])
 def speech_to_text():
@@ -120,7 +220,8 @@ def speech_to_text():
         )
         
         # Perform speech recognition
-        resp = speech_client.recognize(config=config, audio=audio_g)
+        with stage("stt"):
+            resp = speech_client.recognize(config=config, audio=audio_g)
         
         if resp.results:
             transcript = resp.results[0].alternatives[0].transcript.strip()
@@ -135,7 +236,7 @@ def speech_to_text():
             })
             
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
 
 @app.route('/api/ask-yes-no', methods=['POST'])
 def ask_yes_no():
@@ -174,7 +275,7 @@ def ask_yes_no():
         })
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
 
 @app.route('/api/ask-description', methods=['POST'])
 def ask_description():
@@ -201,7 +302,7 @@ def ask_description():
         })
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
 
 @app.route('/api/generate-ideas', methods=['POST'])
 def generate_ideas():
@@ -240,7 +341,7 @@ def generate_ideas():
         })
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
 
 @app.route('/api/get-categories', methods=['GET'])
 def get_categories():
@@ -252,7 +353,7 @@ def get_categories():
             'categories': categories
         })
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
 
 @app.route('/api/get-subtopics', methods=['POST'])
 def get_subtopics():
@@ -270,7 +371,7 @@ def get_subtopics():
             'subtopics': subtopics
         })
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
 
 @app.route('/api/get-ideas', methods=['POST'])
 def get_ideas():
@@ -306,7 +407,7 @@ def get_ideas():
             'ideas': formatted_ideas
         })
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
 
 @app.route('/api/process-idea', methods=['POST'])
 def process_idea():
@@ -324,7 +425,7 @@ def process_idea():
             'result': result
         })
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
 
 @app.route('/api/process-custom-idea', methods=['POST'])
 def process_custom_idea():
@@ -338,8 +439,6 @@ def process_custom_idea():
             return jsonify({'error': 'Idea or audio is required'}), 400
         
         # Use Gemini to analyze and enhance the idea
-        model = genai.GenerativeModel("gemini-1.5-flash")
-        
         prompt = f"""
         Analyze this website idea and provide a structured response:
         Idea: "{idea}"
@@ -359,12 +458,12 @@ def process_custom_idea():
         - features: array of strings
         """
         
-        response = model.generate_content(prompt)
+        response_text = gemini_generate_text(prompt)
         
         # Try to parse the JSON response
         try:
             import json
-            result = json.loads(response.text)
+            result = json.loads(response_text)
         except:
             # Fallback if JSON parsing fails
             result = {
@@ -391,7 +490,7 @@ def process_custom_idea():
         })
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
 
 @app.route('/api/ask-choice', methods=['POST'])
 def ask_choice():
@@ -454,7 +553,7 @@ def ask_choice():
         })
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
 
 @app.route('/api/ask-repeat', methods=['POST'])
 def ask_repeat():
@@ -472,7 +571,7 @@ def ask_repeat():
         })
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
 
 @app.route('/api/complete-voice-flow', methods=['POST'])
 def complete_voice_flow():
@@ -494,7 +593,7 @@ def complete_voice_flow():
             
     except Exception as e:
         print(f"Error in complete voice flow: {e}")
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
 
 if __name__ == '__main__':
     app.run(debug=True, port=5121)
@@ -1,5 +1,6 @@
 import os
 import io
+import sys
 import time
 import queue
 import numpy as np
@@ -12,17 +13,15 @@ from dotenv import load_dotenv
 # --- Google Cloud ---
 from google.cloud import speech
 from google.cloud import texttospeech
-import google.generativeai as genai
 
 # ------------- Setup -------------
 load_dotenv()
 
-
-# Gemini API
-gemini_key = os.getenv("GEMINI_API_KEY")
-if not gemini_key:
-    raise RuntimeError("Set GEMINI_API_KEY in .env")
-genai.configure(api_key=gemini_key)
+# Gemini calls go through the shared providers package (repo root): cache, limiter,
+# GEMINI_API_ENDPOINT and LLM_PROVIDER_MODE record/replay apply here too
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from providers import brainstorming_utils
+from providers.router import model_router
 
 # Create Google Cloud clients
 speech_client = speech.SpeechClient()
@@ -124,34 +123,7 @@ def listen_once(prompt=None, max_record_sec=5) -> str:
 # ---------- Utils: Gemini ----------
 def gemini_list_items(prompt: str, n=3, exclude=None) -> list:
     """Get n short unique items from Gemini, avoiding exclude list."""
-    if exclude is None:
-        exclude = []
-
-    model = genai.GenerativeModel("gemini-1.5-flash")
-    sys_prompt = (
-        "Return exactly the requested number of short items.\n"
-        "Number them 1..N. Keep each under 12 words.\n"
-        "No extra commentary."
-    )
-
-    # Add exclusion note to prompt
-    exclude_text = ""
-    if exclude:
-        exclude_text = " Avoid repeating any of these: " + "; ".join(exclude)
-
-    r = model.generate_content(f"{sys_prompt}\n\nTask: {prompt}{exclude_text}\nReturn {n} items.")
-    lines = [ln.strip("-• ").strip() for ln in r.text.strip().splitlines() if ln.strip()]
-
-    items = []
-    for ln in lines:
-        if ln[0].isdigit():
-            ln = ln.split(".", 1)[-1].strip() if "." in ln[:3] else ln
-        items.append(ln)
-
-    # Deduplicate against history
-    unique_items = [it for it in items if it not in exclude]
-
-    return unique_items[:n]
+    return brainstorming_utils.gemini_list_items(prompt, n, exclude)
 
 
 # ---------- Flow ----------
@@ -386,6 +358,29 @@ def get_dynamic_ideas(category, subtopic):
 
 
 
+# ---------- Warm-up ----------
+def warm_up(probe=False) -> dict:
+    """Open the Speech, TTS and Gemini channels before the first request; returns seconds per step.
+
+    Connecting the gRPC channels covers DNS, TLS and HTTP/2 setup without
+    a billable call; probe adds a voice listing and a 1-token Gemini call.
+    """
+    import grpc
+
+    timings = {}
+    for name, client in (("speech", speech_client), ("tts", tts_client)):
+        started = time.time()
+        grpc.channel_ready_future(client.transport.grpc_channel).result(timeout=15)
+        timings[name] = round(time.time() - started, 3)
+
+    if probe:
+        started = time.time()
+        tts_client.list_voices(language_code="en-US")
+        timings["tts_probe"] = round(time.time() - started, 3)
+
+    timings.update(brainstorming_utils.warm([model_router.fast, model_router.strong], probe))
+    return timings
+
 
 # ---------- Entry ----------
 if __name__ == "__main__":
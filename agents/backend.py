@@ -1,35 +1,35 @@
 """Backend agent: generates code from backend prompt"""
 
-import os
+import asyncio
+from orchestrator.artifacts import artifact_store
+from orchestrator.deadline import Deadline, within
 from orchestrator.models import BackendPrompt
+from orchestrator.pipeline import Node
+from providers.prompts import compact
+from providers.telemetry import stage
 
 
-async def generate_backend(backend_prompt: BackendPrompt) -> None:
-    """Generate backend code from backend prompt using LLM"""
-    os.makedirs("output/backend", exist_ok=True)
-    
-    from providers.gemini import gemini_client
-    
-    # Create a comprehensive prompt for the LLM to generate the backend code
-    llm_prompt = f"""
+# Compacted before the fields are filled in: a multi-line field value would
+# otherwise leave the template's indentation in place
+BACKEND_TEMPLATE = compact("""
     You are a Backend Engineer. Generate complete, functional Python backend code based on the following requirements:
 
-    Role: {backend_prompt.role}
-    Domain Description: {backend_prompt.domain_description}
-    Project Context: {backend_prompt.project_context}
-    
+    Role: {role}
+    Domain Description: {domain_description}
+    Project Context: {project_context}
+
     Required Technologies:
-    - Programming Language: {backend_prompt.required_technologies.get('programming_language', 'Python')}
-    - Web Framework: {backend_prompt.required_technologies.get('web_framework', 'FastAPI')}
-    - Data Processing: {backend_prompt.required_technologies.get('data_processing', 'PySpark')}
-    - Database ORM: {backend_prompt.required_technologies.get('database_orm', 'SQLAlchemy')}
-    - Dependency Management: {backend_prompt.required_technologies.get('dependency_management', 'Python Poetry')}
-    
-    Code Requirements: {', '.join(backend_prompt.code_requirements)}
-    Core Deliverables: {', '.join(backend_prompt.core_deliverables)}
-    Integration Requirements: {', '.join(backend_prompt.integration_requirements)}
-    Constraints: {', '.join(backend_prompt.constraints)}
-    
+    - Programming Language: {programming_language}
+    - Web Framework: {web_framework}
+    - Data Processing: {data_processing}
+    - Database ORM: {database_orm}
+    - Dependency Management: {dependency_management}
+
+    Code Requirements: {code_requirements}
+    Core Deliverables: {core_deliverables}
+    Integration Requirements: {integration_requirements}
+    Constraints: {constraints}
+
     Generate complete, functional Python backend code that includes:
     1. A main.py file with FastAPI application setup
     2. A models.py file with SQLAlchemy models
@@ -38,20 +38,39 @@ async def generate_backend(backend_prompt: BackendPrompt) -> None:
     5. Database models and relationships
     6. The code should be immediately executable
     7. Include proper error handling and validation
-    
+
     Return the code in the following format:
     === MAIN.PY ===
     [main.py code here]
-    
+
     === MODELS.PY ===
     [models.py code here]
-    
+
     Return ONLY the code, nothing else.
-    """
-    
-    # Generate the backend code using the LLM
-    backend_code = gemini_client.generate(llm_prompt)
-    
+    """)
+
+
+def build_backend_prompt(backend_prompt: BackendPrompt) -> str:
+    """Create a comprehensive prompt for the LLM to generate the backend code"""
+    technologies = backend_prompt.required_technologies
+    return BACKEND_TEMPLATE.format(
+        role=backend_prompt.role,
+        domain_description=backend_prompt.domain_description,
+        project_context=backend_prompt.project_context,
+        programming_language=technologies.get('programming_language', 'Python'),
+        web_framework=technologies.get('web_framework', 'FastAPI'),
+        data_processing=technologies.get('data_processing', 'PySpark'),
+        database_orm=technologies.get('database_orm', 'SQLAlchemy'),
+        dependency_management=technologies.get('dependency_management', 'Python Poetry'),
+        code_requirements=', '.join(backend_prompt.code_requirements),
+        core_deliverables=', '.join(backend_prompt.core_deliverables),
+        integration_requirements=', '.join(backend_prompt.integration_requirements),
+        constraints=', '.join(backend_prompt.constraints),
+    )
+
+
+def write_backend(backend_code: str, backend_prompt: BackendPrompt) -> dict:
+    """Split the LLM response into main.py and models.py and store them; returns their manifest entries"""
     # Parse the response to extract main.py and models.py
     if "=== MAIN.PY ===" in backend_code and "=== MODELS.PY ===" in backend_code:
         parts = backend_code.split("=== MAIN.PY ===")[1].split("=== MODELS.PY ===")
@@ -77,9 +96,27 @@ class BaseModel(Base):
 # Add your models here following the project requirements
 '''
     
-    # Write files
-    with open("output/backend/main.py", "w") as f:
-        f.write(main_code)
-    
-    with open("output/backend/models.py", "w") as f:
-        f.write(models_code)
\ No newline at end of file
+    return {
+        "backend/main.py": artifact_store.put(main_code),
+        "backend/models.py": artifact_store.put(models_code),
+    }
+
+
+async def generate_backend(backend_prompt: BackendPrompt, use_cache: bool = True,
+                           deadline: Deadline = None) -> dict:
+    """Generate backend code from backend prompt using LLM; returns the stored files"""
+    from providers.gemini import gemini_client
+
+    with stage("backend"):
+        backend_code = await within(deadline, "backend", gemini_client.agenerate(
+            build_backend_prompt(backend_prompt), call_site="backend", use_cache=use_cache,
+            validate=lambda code: "=== MAIN.PY ===" in code,
+        ))
+    with stage("write_backend"):
+        # Blob writes are file I/O; keep them off the event loop
+        return await asyncio.to_thread(write_backend, backend_code, backend_prompt)
+
+
+# Same rendered prompt, same files: an unchanged backend prompt can reuse the last build's
+node = Node("backend", generate_backend, inputs=("backend_prompt",), outputs=("backend_files",),
+            fingerprint=build_backend_prompt)
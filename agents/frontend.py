@@ -1,33 +1,33 @@
 """Frontend agent: generates code from frontend prompt"""
 
-import os
+import asyncio
+from orchestrator.artifacts import artifact_store
+from orchestrator.deadline import Deadline, within
 from orchestrator.models import FrontendPrompt
+from orchestrator.pipeline import Node
+from providers.prompts import compact
+from providers.telemetry import stage
 
 
-async def generate_frontend(frontend_prompt: FrontendPrompt) -> None:
-    """Generate frontend code from frontend prompt using LLM"""
-    os.makedirs("output/frontend", exist_ok=True)
-    
-    from providers.gemini import gemini_client
-    
-    # Create a comprehensive prompt for the LLM to generate the frontend code
-    llm_prompt = f"""
+# Compacted before the fields are filled in: a multi-line field value would
+# otherwise leave the template's indentation in place
+FRONTEND_TEMPLATE = compact("""
     You are a Frontend Engineer. Generate a complete, functional HTML file based on the following requirements:
 
-    Role: {frontend_prompt.role}
-    Domain Description: {frontend_prompt.domain_description}
-    Project Context: {frontend_prompt.project_context}
-    
+    Role: {role}
+    Domain Description: {domain_description}
+    Project Context: {project_context}
+
     Required Technologies:
-    - Markup: {frontend_prompt.required_technologies.get('markup', 'HTML5')}
-    - Styling: {frontend_prompt.required_technologies.get('styling', 'CSS3')}
-    - Scripting: {frontend_prompt.required_technologies.get('scripting', 'Vanilla JavaScript ES6+')}
-    
-    Code Requirements: {', '.join(frontend_prompt.code_requirements)}
-    Core Deliverables: {', '.join(frontend_prompt.core_deliverables)}
-    API Integration Requirements: {', '.join(frontend_prompt.api_integration_requirements) if frontend_prompt.api_integration_requirements else 'None'}
-    Constraints: {', '.join(frontend_prompt.constraints)}
-    
+    - Markup: {markup}
+    - Styling: {styling}
+    - Scripting: {scripting}
+
+    Code Requirements: {code_requirements}
+    Core Deliverables: {core_deliverables}
+    API Integration Requirements: {api_integration_requirements}
+    Constraints: {constraints}
+
     Generate a complete, functional HTML file that includes:
     1. All HTML structure
     2. All CSS styling (embedded in <style> tags)
@@ -35,13 +35,31 @@ async def generate_frontend(frontend_prompt: FrontendPrompt) -> None:
     4. The file should be immediately executable and functional
     5. Make it visually appealing and user-friendly
     6. Ensure it works as a single file (no external dependencies)
-    
+
     Return ONLY the complete HTML code, nothing else.
-    """
-    
-    # Generate the HTML code using the LLM
-    html_code = gemini_client.generate(llm_prompt)
-    
+    """)
+
+
+def build_frontend_prompt(frontend_prompt: FrontendPrompt) -> str:
+    """Create a comprehensive prompt for the LLM to generate the frontend code"""
+    technologies = frontend_prompt.required_technologies
+    api_requirements = frontend_prompt.api_integration_requirements
+    return FRONTEND_TEMPLATE.format(
+        role=frontend_prompt.role,
+        domain_description=frontend_prompt.domain_description,
+        project_context=frontend_prompt.project_context,
+        markup=technologies.get('markup', 'HTML5'),
+        styling=technologies.get('styling', 'CSS3'),
+        scripting=technologies.get('scripting', 'Vanilla JavaScript ES6+'),
+        code_requirements=', '.join(frontend_prompt.code_requirements),
+        core_deliverables=', '.join(frontend_prompt.core_deliverables),
+        api_integration_requirements=', '.join(api_requirements) if api_requirements else 'None',
+        constraints=', '.join(frontend_prompt.constraints),
+    )
+
+
+def write_frontend(html_code: str) -> dict:
+    """Unwrap the LLM response if needed and store index.html; returns its manifest entry"""
     # Handle if the LLM returns JSON instead of raw HTML
     if html_code.strip().startswith('{'):
         try:
@@ -52,6 +70,23 @@ async def generate_frontend(frontend_prompt: FrontendPrompt) -> None:
         except:
             pass  # If JSON parsing fails, use the original response
     
-    # Write file
-    with open("output/frontend/index.html", "w") as f:
-        f.write(html_code)
\ No newline at end of file
+    return {"frontend/index.html": artifact_store.put(html_code)}
+
+
+async def generate_frontend(frontend_prompt: FrontendPrompt, use_cache: bool = True,
+                            deadline: Deadline = None) -> dict:
+    """Generate frontend code from frontend prompt using LLM; returns the stored files"""
+    from providers.gemini import gemini_client
+
+    with stage("frontend"):
+        html_code = await within(deadline, "frontend", gemini_client.agenerate(
+            build_frontend_prompt(frontend_prompt), call_site="frontend", use_cache=use_cache,
+            validate=lambda html: "<html" in html.lower(),
+        ))
+    with stage("write_frontend"):
+        return await asyncio.to_thread(write_frontend, html_code)
+
+
+# Same rendered prompt, same files: an unchanged frontend prompt can reuse the last build's
+node = Node("frontend", generate_frontend, inputs=("frontend_prompt",), outputs=("frontend_files",),
+            fingerprint=build_frontend_prompt)
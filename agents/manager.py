@@ -1,11 +1,16 @@
 """Manager agent using the correct system prompt"""
 
 import json
+from orchestrator.deadline import Deadline, within
 from orchestrator.models import ManagerOutput, BackendPrompt, FrontendPrompt
+from orchestrator.pipeline import Node
+from providers.errors import ProviderError
 from providers.gemini import gemini_client
+from providers.prompts import compact
+from providers.telemetry import stage
 
 
-SYSTEM_PROMPT = """
+SYSTEM_PROMPT = compact("""
 You are a Project Manager Agent. Analyze user requirements and determine the appropriate development approach.
 
 CORE RESPONSIBILITIES:
@@ -66,14 +71,16 @@ KEY PRINCIPLES:
 - Ensure executable code
 
 Return ONLY the JSON response matching the exact structure above.
-"""
+""")
 
 
-async def generate_manager_output(user_prompt: str) -> ManagerOutput:
-    """Generate manager output with backend and frontend prompts"""
-    full_prompt = f"{SYSTEM_PROMPT}\n\nUser Request: {user_prompt}"
+def build_manager_prompt(user_prompt: str) -> str:
+    """Prepend the system prompt to the user request"""
+    return f"{SYSTEM_PROMPT}\n\nUser Request: {user_prompt}"
+
 
-    response = gemini_client.generate(full_prompt)
+def parse_manager_output(response: str) -> ManagerOutput:
+    """Parse the manager's JSON response into backend and frontend prompts"""
     data = json.loads(response)
 
     project_type = data.get("project_type", "full_stack")
@@ -95,4 +102,36 @@ async def generate_manager_output(user_prompt: str) -> ManagerOutput:
             project_type=project_type,
             backend_engineer_prompt=backend_prompt,
             frontend_engineer_prompt=frontend_prompt
-        )
\ No newline at end of file
+        )
+
+
+async def generate_manager_output(user_prompt: str, use_cache: bool = True,
+                                  deadline: Deadline = None) -> ManagerOutput:
+    """Generate manager output with backend and frontend prompts"""
+    with stage("manager"):
+        response = await within(deadline, "manager", gemini_client.agenerate(
+            build_manager_prompt(user_prompt), call_site="manager", use_cache=use_cache, fingerprint=user_prompt,
+            # Runs on the fast tier; an answer that doesn't parse is retried on the strong model
+            validate=parse_manager_output,
+            # The system prompt is identical on every call; let the provider cache it
+            cached_prefix=SYSTEM_PROMPT,
+        ))
+    try:
+        return parse_manager_output(response)
+    except (ValueError, KeyError, TypeError) as e:
+        # JSONDecodeError and pydantic's ValidationError are ValueErrors
+        raise ProviderError(f"Manager returned an unusable plan: {e}") from e
+
+
+async def plan(user_prompt: str, use_cache: bool = True, deadline: Deadline = None) -> dict:
+    """Pipeline step: the manager's plan as separate values for the engineer agents"""
+    output = await generate_manager_output(user_prompt, use_cache=use_cache, deadline=deadline)
+    return {
+        "project_type": output.project_type,
+        # None skips the backend agent
+        "backend_prompt": output.backend_engineer_prompt if output.project_type != "frontend_only" else None,
+        "frontend_prompt": output.frontend_engineer_prompt,
+    }
+
+
+node = Node("manager", plan, inputs=("user_prompt",), outputs=("project_type", "backend_prompt", "frontend_prompt"))
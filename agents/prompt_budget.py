@@ -0,0 +1,41 @@
+"""Check every agent prompt template against its token budget
+
+Renders each template with empty fields, so only the fixed text is
+measured, and exits non-zero if any is over PROMPT_TOKEN_BUDGETS:
+
+    python -m agents.prompt_budget
+"""
+
+import sys
+from agents.backend import build_backend_prompt
+from agents.frontend import build_frontend_prompt
+from agents.manager import build_manager_prompt
+from orchestrator.models import BackendPrompt, FrontendPrompt
+from providers.brainstorming_utils import build_list_items_prompt
+from providers.config import PROMPT_TOKEN_BUDGETS
+from providers.prompts import estimate_tokens, over_budget
+
+
+def render_templates() -> dict:
+    empty = dict(role="", domain_description="", project_context="", required_technologies={},
+                 code_requirements=[], core_deliverables=[], constraints=[])
+    return {
+        "manager": build_manager_prompt(""),
+        "backend": build_backend_prompt(BackendPrompt(**empty, integration_requirements=[])),
+        "frontend": build_frontend_prompt(FrontendPrompt(**empty)),
+        "list_items": build_list_items_prompt("", 0, []),
+    }
+
+
+def main() -> int:
+    templates = render_templates()
+    for name, text in templates.items():
+        print(f"{name:<12} {estimate_tokens(text):>5} / {PROMPT_TOKEN_BUDGETS.get(name, '-')} tokens")
+    over = over_budget(templates)
+    for name, (tokens, budget) in over.items():
+        print(f"FAIL: {name} prompt template is ~{tokens} tokens, over its budget of {budget}")
+    return 1 if over else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
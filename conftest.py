@@ -0,0 +1 @@
+"""Lets pytest import the repo's packages (agents, orchestrator, providers) from the root"""
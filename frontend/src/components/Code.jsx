@@ -56,9 +56,10 @@ function Code({ onComplete, projectData }) {
         
         setGenerationStatus('Generating frontend interface...');
         
-        // Get the generated code files
-        const backendCode = await fetch('http://localhost:8000/output/backend/main.py').then(r => r.text()).catch(() => '');
-        const frontendCode = await fetch('http://localhost:8000/output/frontend/index.html').then(r => r.text()).catch(() => '');
+        // The generated files come back inline in the build manifest
+        const files = data.manifest?.files || {};
+        const backendCode = files['backend/main.py']?.content || '';
+        const frontendCode = files['frontend/index.html']?.content || '';
         
         // Combine backend and frontend code for display
         const combinedCode = `
@@ -75,7 +76,7 @@ ${frontendCode}
         setGenerationStatus('Code generation complete!');
         
         // Automatically proceed to review after code generation
-        handleContinue();
+        handleContinue({ buildId: data.manifest?.build_id });
         
       } else {
         throw new Error('Failed to generate code');
@@ -133,12 +134,13 @@ def create_item(item: Item):
     setIsGenerating(false);
   };
 
-  const handleContinue = () => {
+  const handleContinue = (extra = {}) => {
     onComplete({
       generatedCode,
       language: selectedLanguage,
       framework: selectedFramework,
-      status: 'complete'
+      status: 'complete',
+      ...extra
     });
   };
 
@@ -1,9 +1,13 @@
 import React, { useState, useRef } from 'react';
 
 // Get the actual generated HTML content
-const getGeneratedHTML = async () => {
+const getGeneratedHTML = async (buildId) => {
   try {
-    const response = await fetch('http://localhost:8000/output/frontend/index.html');
+    // This build's own copy when known, otherwise the most recent build's
+    const url = buildId
+      ? `http://localhost:8000/artifacts/${buildId}/frontend/index.html`
+      : 'http://localhost:8000/output/frontend/index.html';
+    const response = await fetch(url);
     if (response.ok) {
       return await response.text();
     }
@@ -70,7 +74,7 @@ function Review({ onComplete, projectData }) {
     // Load the actual generated HTML
     const loadProject = async () => {
       try {
-        const html = await getGeneratedHTML();
+        const html = await getGeneratedHTML(projectData.buildId);
         setProjectHTML(html);
         setIsLoading(false);
       } catch (error) {
@@ -0,0 +1,112 @@
+"""Content-addressed store for generated files, with one manifest per build
+
+Every file a build writes is stored once as a blob named by its SHA-256, so
+identical output from different builds (a cached frontend, an unchanged
+models.py) shares one copy. Each build then gets a manifest mapping its
+file names to blobs. Builds never write to a shared path, so concurrent
+builds cannot clobber each other; the only shared state is the LATEST
+pointer, replaced atomically when a build completes (a partial build gets a
+manifest but doesn't become LATEST).
+
+    ARTIFACTS_DIR/blobs/ab/abcdef...     file contents
+    ARTIFACTS_DIR/builds/<build_id>.json manifest
+    ARTIFACTS_DIR/LATEST                 id of the last complete build
+"""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+import uuid
+
+ARTIFACTS_DIR = os.getenv("ARTIFACTS_DIR", "output/artifacts")
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    """Write via a temporary file in the same directory and rename, so readers never see a partial file"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class ArtifactStore:
+    def __init__(self, root: str):
+        self.root = root
+
+    def blob_path(self, sha256: str) -> str:
+        if not re.fullmatch(r"[0-9a-f]{64}", sha256):
+            raise ValueError(f"Not a SHA-256 digest: {sha256}")
+        return os.path.join(self.root, "blobs", sha256[:2], sha256)
+
+    def _manifest_path(self, build_id: str) -> str:
+        if not re.fullmatch(r"[0-9a-f]{32}", build_id):
+            raise ValueError(f"Not a build id: {build_id}")
+        return os.path.join(self.root, "builds", f"{build_id}.json")
+
+    def put(self, content: str) -> dict:
+        """Store content (once) and return its manifest entry: {"sha256", "size"}"""
+        data = content.encode("utf-8")
+        sha256 = hashlib.sha256(data).hexdigest()
+        path = self.blob_path(sha256)
+        if not os.path.exists(path):
+            _write_atomic(path, data)
+        return {"sha256": sha256, "size": len(data)}
+
+    def read(self, sha256: str) -> str:
+        with open(self.blob_path(sha256), encoding="utf-8") as f:
+            return f.read()
+
+    def has_files(self, files: dict) -> bool:
+        """Whether every file ({name: entry from put}) still has its blob"""
+        return all(os.path.exists(self.blob_path(entry["sha256"])) for entry in files.values())
+
+    def record(self, files: dict, build_id: str = None, complete: bool = True) -> dict:
+        """Write the manifest for a finished build of files ({name: entry from put}).
+
+        A complete build with files becomes LATEST; a partial one only gets its manifest.
+        """
+        build_id = build_id or uuid.uuid4().hex
+        manifest = {
+            "build_id": build_id,
+            "created_at": time.time(),
+            "files": {
+                name: {**entry, "url": f"/artifacts/{build_id}/{name}"}
+                for name, entry in sorted(files.items())
+            },
+        }
+        _write_atomic(self._manifest_path(build_id), json.dumps(manifest, indent=2).encode())
+        if complete and files:
+            _write_atomic(os.path.join(self.root, "LATEST"), build_id.encode())
+        return manifest
+
+    def manifest(self, build_id: str):
+        """A build's manifest, or None if there is no such build"""
+        try:
+            with open(self._manifest_path(build_id)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def latest(self):
+        """The manifest of the most recently completed build, or None"""
+        try:
+            with open(os.path.join(self.root, "LATEST")) as f:
+                return self.manifest(f.read().strip())
+        except FileNotFoundError:
+            return None
+
+    def file_path(self, manifest: dict, name: str):
+        """Blob path of one file in a manifest, or None if the build has no such file"""
+        entry = manifest["files"].get(name)
+        return self.blob_path(entry["sha256"]) if entry else None
+
+
+artifact_store = ArtifactStore(ARTIFACTS_DIR)
@@ -0,0 +1,49 @@
+"""The build pipeline, shared by the synchronous /build endpoint and the job workers"""
+
+import asyncio
+from agents import backend, frontend, manager
+from orchestrator.artifacts import artifact_store
+from orchestrator.deadline import Deadline, DeadlineExceeded
+from orchestrator.pipeline import Pipeline
+
+# The backend and frontend agents only need the manager's plan, so they run side by side
+BUILD_PIPELINE = Pipeline([manager.node, backend.node, frontend.node])
+
+
+async def run_build(user_prompt: str, use_cache: bool, deadline: Deadline, on_change=None, reuse=None) -> dict:
+    """Run the pipeline under deadline and summarize it.
+
+    status is "complete", "partial" (the deadline ran out after the
+    manager) or "timeout" (it ran out before there was a plan). Provider
+    errors propagate. Whatever was generated is recorded as a new build in
+    the artifact store, and its manifest is returned.
+
+    With reuse (see Pipeline.run), agents whose input prompt is unchanged
+    since an earlier build take that build's files; "stages" lists which
+    were reused and which ran.
+    """
+    values = {"user_prompt": user_prompt}
+    timings = {}
+    try:
+        await BUILD_PIPELINE.run(values, timings, on_change, reuse, use_cache=use_cache, deadline=deadline)
+        status = "complete"
+    except DeadlineExceeded:
+        if "project_type" not in values:
+            return {"status": "timeout", "deadline": deadline.report(), "pipeline": timings}
+        status = "partial"
+
+    frontend_only = values["project_type"] == 'frontend_only'
+    result = {"status": status, "project_type": "frontend_only" if frontend_only else "full_stack"}
+    # The manager's plan is part of the result even when an agent didn't finish
+    if values.get("backend_prompt") is not None:
+        result["backend_prompt"] = values["backend_prompt"].dict()
+    result["frontend_prompt"] = values["frontend_prompt"].dict()
+    files = {**(values.get("backend_files") or {}), **(values.get("frontend_files") or {})}
+    result["manifest"] = await asyncio.to_thread(artifact_store.record, files, complete=status == "complete")
+    result["stages"] = {
+        "reused": [name for name, node in timings.items() if node["state"] == "reused"],
+        "rebuilt": [name for name, node in timings.items() if node["state"] == "done"],
+    }
+    result["deadline"] = deadline.report()
+    result["pipeline"] = timings
+    return result
@@ -0,0 +1,73 @@
+"""Request-scoped deadlines for the build pipeline"""
+
+import asyncio
+import os
+import time
+
+# Overall budget for one /build when the client doesn't send one
+DEFAULT_BUILD_TIMEOUT = float(os.getenv("BUILD_TIMEOUT_SECONDS", 300))
+
+
+class DeadlineExceeded(Exception):
+    def __init__(self, stage: str):
+        super().__init__(f"Deadline exceeded during {stage}")
+        self.stage = stage
+
+
+class Deadline:
+    """A fixed point in time every stage of one request works towards"""
+
+    def __init__(self, seconds: float):
+        self.budget = seconds
+        self.started = time.monotonic()
+        self.expires_at = self.started + seconds
+        self.exceeded_stage = None
+        self.stages = {}
+
+    @classmethod
+    def for_request(cls, requested: float = None) -> "Deadline":
+        """Client-requested budget, capped at the server default"""
+        if requested is None or requested <= 0:
+            return cls(DEFAULT_BUILD_TIMEOUT)
+        return cls(min(requested, DEFAULT_BUILD_TIMEOUT))
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    async def run(self, stage: str, awaitable):
+        """Await one stage with whatever budget is left; fail fast if none is"""
+        if self.expired:
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            self.exceeded_stage = self.exceeded_stage or stage
+            raise DeadlineExceeded(stage)
+        started = time.monotonic()
+        try:
+            return await asyncio.wait_for(awaitable, self.remaining())
+        except asyncio.TimeoutError:
+            self.exceeded_stage = self.exceeded_stage or stage
+            raise DeadlineExceeded(stage) from None
+        finally:
+            # Accumulates, so a streamed stage awaited chunk by chunk reports its total
+            self.stages[stage] = round(self.stages.get(stage, 0.0) + time.monotonic() - started, 3)
+
+    def report(self) -> dict:
+        return {
+            "budget_seconds": self.budget,
+            "elapsed_seconds": round(time.monotonic() - self.started, 3),
+            "remaining_seconds": round(self.remaining(), 3),
+            "exceeded": self.exceeded_stage is not None,
+            "exceeded_stage": self.exceeded_stage,
+            "stage_seconds": self.stages,
+        }
+
+
+async def within(deadline: Deadline, stage: str, awaitable):
+    """Await under deadline if there is one"""
+    if deadline is None:
+        return await awaitable
+    return await deadline.run(stage, awaitable)
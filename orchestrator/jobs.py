@@ -0,0 +1,270 @@
+"""Background build jobs: a persistent queue and a bounded pool of workers
+
+POST /builds queues a job and returns at once. Every orchestrator process
+runs BUILD_CONCURRENCY workers that claim queued jobs from a shared SQLite
+(WAL) file, so throughput is sized by worker count, not by how many
+clients are connected. A job whose worker stops heartbeating (crash,
+reload) is queued again, up to BUILD_MAX_ATTEMPTS times.
+"""
+
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from orchestrator.build import BUILD_PIPELINE
+from orchestrator.deadline import Deadline
+from orchestrator.memo import IDEMPOTENCY_TTL_SECONDS, IdempotencyConflict, build_key, build_memo_store
+from providers.errors import ProviderError
+from providers.telemetry import Gauge, registry
+
+BUILD_JOBS_PATH = os.getenv("BUILD_JOBS_PATH", ".cache/build_jobs.sqlite3")
+BUILD_CONCURRENCY = int(os.getenv("BUILD_CONCURRENCY", 2))
+BUILD_MAX_ATTEMPTS = int(os.getenv("BUILD_MAX_ATTEMPTS", 3))
+HEARTBEAT_SECONDS = 5.0
+# A running job not heartbeated for this long belongs to a worker that is gone
+STALE_SECONDS = 30.0
+POLL_SECONDS = 1.0
+
+
+class JobStore:
+    """Jobs table in SQLite (WAL); each thread keeps its own connection"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY, state TEXT, request TEXT, attempts INTEGER DEFAULT 0, worker TEXT,"
+                " stage TEXT, progress REAL DEFAULT 0, pipeline TEXT, result TEXT, error TEXT,"
+                " created_at REAL, started_at REAL, finished_at REAL, heartbeat_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (state, created_at)")
+            self._local.conn = conn
+        return conn
+
+    def submit(self, request: dict) -> str:
+        """Queue request, or return the job already submitted with its idempotency_key"""
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            existing = None
+            if request.get("idempotency_key"):
+                existing = conn.execute(
+                    "SELECT id, request FROM jobs WHERE json_extract(request, '$.idempotency_key') = ?"
+                    " AND created_at > ? ORDER BY created_at DESC LIMIT 1",
+                    (request["idempotency_key"], now - IDEMPOTENCY_TTL_SECONDS),
+                ).fetchone()
+            if existing is not None:
+                if build_key(json.loads(existing["request"])["user_prompt"]) != build_key(request["user_prompt"]):
+                    raise IdempotencyConflict(
+                        f"Idempotency-Key {request['idempotency_key']!r} was used for a different build"
+                    )
+                job_id = existing["id"]
+            else:
+                job_id = uuid.uuid4().hex
+                conn.execute(
+                    "INSERT INTO jobs (id, state, request, created_at) VALUES (?, 'queued', ?, ?)",
+                    (job_id, json.dumps(request), now),
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return job_id
+
+    def claim(self, worker: str):
+        """Mark the oldest queued job as running for worker and return it (None if the queue is empty)"""
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Jobs orphaned by a dead worker go back in line (or fail once out of attempts)
+            conn.execute(
+                "UPDATE jobs SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END,"
+                " error = CASE WHEN attempts >= ? THEN ? ELSE error END,"
+                " finished_at = CASE WHEN attempts >= ? THEN ? ELSE finished_at END"
+                " WHERE state = 'running' AND heartbeat_at < ?",
+                (BUILD_MAX_ATTEMPTS, BUILD_MAX_ATTEMPTS, json.dumps({"error": "Worker stopped responding"}),
+                 BUILD_MAX_ATTEMPTS, now, now - STALE_SECONDS),
+            )
+            row = conn.execute(
+                "UPDATE jobs SET state = 'running', worker = ?, attempts = attempts + 1, stage = 'queued',"
+                " progress = 0, started_at = ?, heartbeat_at = ?"
+                " WHERE id = (SELECT id FROM jobs WHERE state = 'queued' ORDER BY created_at LIMIT 1)"
+                " RETURNING *",
+                (worker, now, now),
+            ).fetchone()
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return dict(row) if row else None
+
+    def update(self, job_id: str, **fields) -> None:
+        fields["heartbeat_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        self._conn().execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id: str):
+        row = self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def counts(self) -> dict:
+        rows = self._conn().execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        return {state: count for state, count in rows}
+
+
+def progress(timings: dict) -> tuple:
+    """(stage, fraction done) from the pipeline's per-node states"""
+    running = [name for name, node in timings.items() if node["state"] == "running"]
+    settled = sum(1 for node in timings.values() if node["state"] != "running")
+    return "+".join(running) or "finishing", round(settled / len(BUILD_PIPELINE.nodes), 2)
+
+
+class BuildWorkers:
+    """BUILD_CONCURRENCY coroutines in this process, each running one job at a time"""
+
+    def __init__(self, store: JobStore, concurrency: int):
+        self.store = store
+        self.concurrency = concurrency
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self._wake = asyncio.Event()
+        self._tasks = []
+
+    async def submit(self, request: dict) -> str:
+        job_id = await asyncio.to_thread(self.store.submit, request)
+        self._wake.set()
+        return job_id
+
+    def start(self) -> None:
+        self._wake = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._work(index)) for index in range(self.concurrency)]
+
+    async def stop(self) -> None:
+        """Cancel running jobs; their heartbeats stop, so another worker picks them up later"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _work(self, index: int) -> None:
+        worker = f"{self.name}/{index}"
+        while True:
+            try:
+                job = await asyncio.to_thread(self.store.claim, worker)
+            except sqlite3.Error as e:
+                print(f"Build queue read failed: {e}")
+                job = None
+            if job is None:
+                self._wake.clear()
+                try:
+                    # Woken by a local submit; jobs queued by other processes are found by polling
+                    await asyncio.wait_for(self._wake.wait(), POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _run(self, job: dict) -> None:
+        request = json.loads(job["request"])
+        deadline = Deadline.for_request(request.get("timeout_seconds"))
+        # Progress waiting to be written; on_change runs on the event loop, so it only records it
+        latest = {}
+        changed = asyncio.Event()
+        stopping = False
+
+        def on_change(timings: dict) -> None:
+            stage, fraction = progress(timings)
+            latest.update(stage=stage, progress=fraction, pipeline=json.dumps(timings))
+            changed.set()
+
+        async def report():
+            """Write progress as it changes, or just a heartbeat every HEARTBEAT_SECONDS, one write at a time"""
+            while not stopping:
+                try:
+                    await asyncio.wait_for(changed.wait(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                changed.clear()
+                fields = dict(latest)
+                latest.clear()
+                try:
+                    await asyncio.to_thread(self.store.update, job["id"], **fields)
+                except sqlite3.Error as e:
+                    print(f"Build job {job['id']} progress write failed: {e}")
+
+        async def finish(**fields) -> None:
+            nonlocal stopping
+            stopping = True
+            changed.set()
+            # A progress write still in its thread must not land after the final one
+            await reporting
+            await asyncio.to_thread(self.store.update, job["id"], **fields)
+
+        reporting = asyncio.create_task(report())
+        try:
+            result = await build_memo_store.run(request["user_prompt"], request.get("use_cache", True), deadline,
+                                                request.get("idempotency_key"), on_change)
+            await finish(state=result["status"], stage="done", progress=1.0, result=json.dumps(result),
+                         finished_at=time.time())
+        except Exception as e:
+            print(f"Build job {job['id']} failed: {e}")
+            error = {"error": str(e)}
+            if isinstance(e, ProviderError):
+                error["upstream_status"] = e.status
+            await finish(state="failed", error=json.dumps(error), finished_at=time.time())
+        finally:
+            reporting.cancel()
+
+
+def describe(job: dict) -> dict:
+    """A job as reported by GET /builds/{id}"""
+    result = json.loads(job["result"]) if job["result"] else None
+    report = {
+        "id": job["id"],
+        "state": job["state"],
+        "stage": job["stage"],
+        "progress": job["progress"],
+        "attempts": job["attempts"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+        "pipeline": json.loads(job["pipeline"]) if job["pipeline"] else {},
+    }
+    if result is not None:
+        report["result"] = result
+    if result and "manifest" in result:
+        report["artifacts"] = [entry["url"] for entry in result["manifest"]["files"].values()]
+    if job["error"]:
+        report["error"] = json.loads(job["error"])
+    return report
+
+
+job_store = JobStore(BUILD_JOBS_PATH)
+build_workers = BuildWorkers(job_store, BUILD_CONCURRENCY)
+
+
+def job_metrics() -> list:
+    jobs = Gauge("kitchen_build_jobs", "Build jobs by state", ("state",))
+    for state, count in job_store.counts().items():
+        jobs.set(count, state=state)
+    return [jobs]
+
+
+registry.add_collector(job_metrics)
@@ -1,16 +1,64 @@
 """FastAPI orchestrator"""
 
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Optional
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
-import os
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
+import json
+import mimetypes
+from orchestrator.artifacts import artifact_store
+from orchestrator.deadline import Deadline, DeadlineExceeded
+from orchestrator.metrics import TelemetryMiddleware
+from orchestrator.profiling import ProfilingMiddleware, authorized, memory_diff, memory_snapshot, memory_stop
 from orchestrator.models import BuildRequest
-from agents.manager import generate_manager_output
-from agents.backend import generate_backend
-from agents.frontend import generate_frontend
-from providers.brainstorming_utils import gemini_list_items, gemini_generate_text
+from orchestrator.jobs import build_workers, describe, job_store
+from orchestrator.memo import IdempotencyConflict, build_memo_store
+from orchestrator.warmup import readiness, warm_up
+from agents.manager import SYSTEM_PROMPT, build_manager_prompt, parse_manager_output
+from agents.backend import build_backend_prompt, write_backend
+from agents.frontend import build_frontend_prompt, write_frontend
+from providers.brainstorming_utils import gemini_list_items, gemini_generate_text, list_batcher, warm as warm_genai
+from providers.breaker import breakers
+from providers.cache import cache_stats
+from providers.config import WARMUP_PROBE
+from providers.context_cache import prefix_cache
+from providers.errors import ProviderError
+from providers.gemini import gemini_client
+from providers.hedging import hedging
+from providers.limiter import outbound
+from providers.prompts import token_usage
+from providers.router import model_router
+from providers.telemetry import CONTENT_TYPE, registry, stage
 
-app = FastAPI(title="Kitchen Orchestrator")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Own the pooled Gemini session for the lifetime of the worker, warming it first if enabled"""
+    try:
+        await gemini_client.start()
+    except ProviderError as e:
+        # Serve everything that doesn't need Gemini; those endpoints report the error themselves
+        print(f"Gemini client not started: {e}")
+
+    warming = None
+    if readiness.enabled:
+        models = [model_router.fast, model_router.strong]
+        warming = asyncio.create_task(warm_up({
+            "gemini": lambda: gemini_client.warm(models, WARMUP_PROBE),
+            "genai": lambda: run_in_threadpool(warm_genai, models, WARMUP_PROBE),
+        }))
+    build_workers.start()
+    yield
+    await build_workers.stop()
+    if warming is not None:
+        warming.cancel()
+    await gemini_client.aclose()
+
+
+app = FastAPI(title="Kitchen Orchestrator", lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -19,7 +67,29 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "traceresponse"],
 )
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(TelemetryMiddleware)
+
+
+@app.exception_handler(ProviderError)
+async def provider_error_handler(request, exc: ProviderError):
+    """Upstream LLM failures (after retries) surface as 503/502 instead of a bare 500
+
+    An open circuit breaker is a 503 with Retry-After set to when it will probe again.
+    """
+    headers = {"Retry-After": str(max(1, round(exc.retry_after)))} if exc.retry_after else None
+    return JSONResponse(
+        status_code=503 if exc.retryable or exc.circuit_open else 502,
+        content={"error": str(exc), "upstream_status": exc.status},
+        headers=headers,
+    )
+
+
+@app.exception_handler(IdempotencyConflict)
+async def idempotency_conflict_handler(request, exc: IdempotencyConflict):
+    return JSONResponse(status_code=422, content={"error": str(exc)})
 
 
 @app.get("/")
@@ -27,49 +97,227 @@ async def root():
     """Health check endpoint"""
     return {"message": "Kitchen API is running", "status": "healthy"}
 
+@app.get("/ready")
+async def ready():
+    """Readiness: 503 until the startup warm-up (LLM_WARMUP=true) has opened every upstream connection"""
+    return JSONResponse(status_code=200 if readiness.ready else 503, content=readiness.snapshot())
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics for this worker
+
+    Rendered in a worker thread: collectors such as the build job counts read SQLite.
+    """
+    return PlainTextResponse(await run_in_threadpool(registry.render), media_type=CONTENT_TYPE)
+
+def _admin_token(authorization: Optional[str]) -> str:
+    scheme, _, token = (authorization or "").partition(" ")
+    return token if scheme.lower() == "bearer" else ""
+
+@app.post("/admin/memory/snapshot")
+async def admin_memory_snapshot(authorization: Optional[str] = Header(None)):
+    """Take a tracemalloc snapshot (the first call only starts tracing); needs Bearer PROFILE_TOKEN"""
+    if not authorized(_admin_token(authorization)):
+        return JSONResponse(status_code=403, content={"error": "Profiling is disabled or the token is wrong"})
+    return await run_in_threadpool(memory_snapshot)
+
+@app.get("/admin/memory/diff")
+async def admin_memory_diff(base: str, against: Optional[str] = None, authorization: Optional[str] = Header(None)):
+    """Top allocation growth from snapshot base to snapshot against (default: now)"""
+    if not authorized(_admin_token(authorization)):
+        return JSONResponse(status_code=403, content={"error": "Profiling is disabled or the token is wrong"})
+    try:
+        return await run_in_threadpool(memory_diff, base, against)
+    except (ValueError, FileNotFoundError) as e:
+        return JSONResponse(status_code=404, content={"error": str(e)})
+
+@app.post("/admin/memory/stop")
+async def admin_memory_stop(authorization: Optional[str] = Header(None)):
+    """Stop tracemalloc (tracing slows every allocation)"""
+    if not authorized(_admin_token(authorization)):
+        return JSONResponse(status_code=403, content={"error": "Profiling is disabled or the token is wrong"})
+    return memory_stop()
+
+@app.get("/api/provider-stats")
+async def provider_stats():
+    """Provider-layer counters for tuning cache thresholds"""
+    return {
+        "cache": cache_stats.snapshot(),
+        "limiter": outbound.snapshot(),
+        "hedging": hedging.snapshot(),
+        "routing": model_router.snapshot(),
+        "context_cache": prefix_cache.snapshot(),
+        "tokens": token_usage.snapshot(),
+        "breakers": breakers.snapshot(),
+        "list_batching": list_batcher.snapshot(),
+    }
+
+def _artifact_response(manifest: dict, name: str, immutable: bool = False):
+    """One file of a build, served from its blob"""
+    path = artifact_store.file_path(manifest, name) if manifest else None
+    if path is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    headers = {"ETag": f'"{manifest["files"][name]["sha256"]}"'}
+    if immutable:
+        headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return FileResponse(path, media_type=mimetypes.guess_type(name)[0] or "text/plain", headers=headers)
+
 @app.get("/output/backend/main.py")
 async def get_backend_code():
-    """Get generated backend code"""
-    file_path = "output/backend/main.py"
-    if os.path.exists(file_path):
-        return FileResponse(file_path)
-    else:
+    """Get generated backend code (of the most recently finished build)"""
+    manifest = await run_in_threadpool(artifact_store.latest)
+    if manifest is None or "backend/main.py" not in manifest["files"]:
         return {"error": "Backend code not found"}
+    return _artifact_response(manifest, "backend/main.py")
 
 @app.get("/output/frontend/index.html")
 async def get_frontend_code():
-    """Get generated frontend code"""
-    file_path = "output/frontend/index.html"
-    if os.path.exists(file_path):
-        return FileResponse(file_path)
-    else:
+    """Get generated frontend code (of the most recently finished build)"""
+    manifest = await run_in_threadpool(artifact_store.latest)
+    if manifest is None or "frontend/index.html" not in manifest["files"]:
         return {"error": "Frontend code not found"}
+    return _artifact_response(manifest, "frontend/index.html")
+
+@app.get("/artifacts/{build_id}")
+async def get_manifest(build_id: str):
+    """A build's manifest: file names with their SHA-256, size and URL"""
+    manifest = await run_in_threadpool(artifact_store.manifest, build_id)
+    if manifest is None:
+        raise HTTPException(status_code=404, detail="Unknown build")
+    return manifest
+
+@app.get("/artifacts/{build_id}/{name:path}")
+async def get_artifact(build_id: str, name: str):
+    """One file of a build; its content never changes, so it is cacheable forever"""
+    manifest = await run_in_threadpool(artifact_store.manifest, build_id)
+    return _artifact_response(manifest, name, immutable=True)
 
 @app.post("/build")
-async def build(request: BuildRequest):
-    """Build project from user prompt using correct system prompt"""
-    # Generate manager output with backend and frontend prompts
-    manager_output = await generate_manager_output(request.user_prompt)
-
-    # Check if this is a frontend-only project
-    if hasattr(manager_output, 'project_type') and manager_output.project_type == 'frontend_only':
-        # Only generate frontend code
-        await generate_frontend(manager_output.frontend_engineer_prompt)
-        return {
-            "status": "complete",
-            "project_type": "frontend_only",
-            "frontend_prompt": manager_output.frontend_engineer_prompt.dict()
-        }
-    else:
-        # Generate both backend and frontend code
-        await generate_backend(manager_output.backend_engineer_prompt)
-        await generate_frontend(manager_output.frontend_engineer_prompt)
-        return {
-            "status": "complete",
-            "project_type": "full_stack",
-            "backend_prompt": manager_output.backend_engineer_prompt.dict(),
-            "frontend_prompt": manager_output.frontend_engineer_prompt.dict()
-        }
+async def build(request: BuildRequest, x_request_timeout: Optional[float] = Header(None),
+                idempotency_key: Optional[str] = Header(None)):
+    """Build project from user prompt using correct system prompt
+
+    The whole build shares one deadline (X-Request-Timeout header or
+    timeout_seconds, capped by the server default). If it runs out after
+    the manager, whatever was generated is returned with status "partial".
+    The build's manifest comes back with each file's content inline.
+
+    A repeat of a running or recent build (or a retry with the same
+    Idempotency-Key) gets that build's result; see orchestrator.memo.
+    """
+    deadline = Deadline.for_request(x_request_timeout or request.timeout_seconds)
+    result = await build_memo_store.run(request.user_prompt, request.use_cache, deadline, idempotency_key)
+    if result["status"] == "timeout":
+        return JSONResponse(status_code=504, content=result)
+    for entry in result["manifest"]["files"].values():
+        entry["content"] = await run_in_threadpool(artifact_store.read, entry["sha256"])
+    return result
+
+@app.post("/builds", status_code=202)
+async def submit_build(request: BuildRequest, x_request_timeout: Optional[float] = Header(None),
+                       idempotency_key: Optional[str] = Header(None)):
+    """Queue a build for the worker pool; poll the returned status_url for progress
+
+    The deadline is the same as for /build, counted from when a worker
+    starts the job rather than from submission. Resubmitting with the same
+    Idempotency-Key returns the original job.
+    """
+    job_id = await build_workers.submit({
+        "user_prompt": request.user_prompt,
+        "use_cache": request.use_cache,
+        "timeout_seconds": x_request_timeout or request.timeout_seconds,
+        "idempotency_key": idempotency_key,
+    })
+    return {"id": job_id, "state": "queued", "status_url": f"/builds/{job_id}"}
+
+@app.get("/builds/{job_id}")
+async def get_build(job_id: str):
+    """A build job's state, current stage, progress and (once finished) result and artifact links"""
+    job = await run_in_threadpool(job_store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown build job")
+    return describe(job)
+
+def _sse(event: str, data: dict) -> str:
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _stream_stage(stage_name: str, prompt: str, chunks: list, use_cache: bool, deadline: Deadline,
+                        fingerprint: str = None, cached_prefix: str = None):
+    """Forward one agent's LLM output as it arrives, collecting it into chunks"""
+    yield _sse("stage", {"stage": stage_name, "state": "started"})
+    stream = gemini_client.astream(prompt, call_site=stage_name, use_cache=use_cache, fingerprint=fingerprint,
+                                   cached_prefix=cached_prefix)
+    with stage(stage_name):
+        try:
+            while True:
+                try:
+                    text = await deadline.run(stage_name, stream.__anext__())
+                except StopAsyncIteration:
+                    break
+                chunks.append(text)
+                yield _sse("chunk", {"stage": stage_name, "text": text})
+        finally:
+            await stream.aclose()
+    yield _sse("stage", {"stage": stage_name, "state": "done"})
+
+
+async def _build_events(user_prompt: str, use_cache: bool, deadline: Deadline):
+    """Run the build pipeline, emitting manager/backend/frontend output as SSE"""
+    result = {"status": "complete"}
+    files = {}
+    try:
+        manager_chunks = []
+        manager_prompt = build_manager_prompt(user_prompt)
+        async for event in _stream_stage("manager", manager_prompt, manager_chunks, use_cache, deadline,
+                                         fingerprint=user_prompt, cached_prefix=SYSTEM_PROMPT):
+            yield event
+        manager_output = parse_manager_output("".join(manager_chunks))
+
+        result["project_type"] = manager_output.project_type
+        if manager_output.project_type != 'frontend_only':
+            backend_chunks = []
+            backend_prompt = manager_output.backend_engineer_prompt
+            result["backend_prompt"] = backend_prompt.dict()
+            async for event in _stream_stage("backend", build_backend_prompt(backend_prompt), backend_chunks,
+                                             use_cache, deadline):
+                yield event
+            with stage("write_backend"):
+                files.update(await run_in_threadpool(write_backend, "".join(backend_chunks), backend_prompt))
+
+        frontend_chunks = []
+        frontend_prompt = manager_output.frontend_engineer_prompt
+        result["frontend_prompt"] = frontend_prompt.dict()
+        async for event in _stream_stage("frontend", build_frontend_prompt(frontend_prompt), frontend_chunks,
+                                         use_cache, deadline):
+            yield event
+        with stage("write_frontend"):
+            files.update(await run_in_threadpool(write_frontend, "".join(frontend_chunks)))
+
+        result["manifest"] = await run_in_threadpool(artifact_store.record, files)
+        result["deadline"] = deadline.report()
+        yield _sse("complete", result)
+    except DeadlineExceeded:
+        result["status"] = "partial" if "project_type" in result else "timeout"
+        if files:
+            result["manifest"] = await run_in_threadpool(artifact_store.record, files, complete=False)
+        result["deadline"] = deadline.report()
+        yield _sse("complete", result)
+    except Exception as e:
+        print(f"Error streaming build: {e}")
+        yield _sse("error", {"error": str(e)})
+
+
+@app.post("/build/stream")
+async def build_stream(request: BuildRequest, x_request_timeout: Optional[float] = Header(None)):
+    """Build project, streaming each agent's output as server-sent events"""
+    deadline = Deadline.for_request(x_request_timeout or request.timeout_seconds)
+    return StreamingResponse(
+        _build_events(request.user_prompt, request.use_cache, deadline),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @app.post("/api/generate-ideas")
 async def generate_ideas(request: dict):
@@ -87,7 +335,7 @@ async def generate_ideas(request: dict):
             prompt = f"Generate 4 creative website ideas for {area} in {category} within {industry} industry. Each idea should be a complete business concept with unique value proposition."
             
             # Get AI-generated ideas
-            ai_ideas = gemini_list_items(prompt, n=4)
+            ai_ideas = await run_in_threadpool(gemini_list_items, prompt, n=4, fingerprint=(area, category, industry))
             
             # Format the ideas into the expected structure
             formatted_ideas = []
@@ -111,7 +359,7 @@ async def generate_ideas(request: dict):
         else:
             # Fallback to generic ideas if specific data is missing
             prompt = "Generate 4 creative website ideas for business automation and digital transformation. Each idea should be innovative and market-ready."
-            ai_ideas = gemini_list_items(prompt, n=4)
+            ai_ideas = await run_in_threadpool(gemini_list_items, prompt, n=4)
             
             formatted_ideas = []
             for i, idea in enumerate(ai_ideas, 1):
@@ -129,6 +377,9 @@ async def generate_ideas(request: dict):
             
             return {"ideas": formatted_ideas}
             
+    except ProviderError:
+        # Gemini is failing or its circuit is open: a 503 with the reason, not made-up ideas
+        raise
     except Exception as e:
         print(f"Error generating ideas: {e}")
         # Return fallback ideas if AI generation fails
@@ -149,11 +400,18 @@ async def generate_ideas(request: dict):
         }
 
 @app.post("/api/process-custom-idea")
-async def process_custom_idea(request: dict):
-    """Process a custom idea and generate project details using AI, then pass to manager agent"""
+async def process_custom_idea(request: dict, x_request_timeout: Optional[float] = Header(None)):
+    """Process a custom idea and generate project details using AI, then pass to manager agent
+
+    As with /build, the whole request (the analysis calls too) shares one
+    deadline, and the build goes through the build memo, so a repeat of the
+    same idea attaches to or reuses the earlier build.
+    """
     try:
         idea_text = request.get('idea', '')
         audio_blob = request.get('audioBlob')  # Handle audio input if needed
+        use_cache = request.get('use_cache', True)
+        deadline = Deadline.for_request(x_request_timeout or request.get('timeout_seconds'))
         
         if not idea_text and not audio_blob:
             return {"error": "No idea provided"}
@@ -162,15 +420,15 @@ async def process_custom_idea(request: dict):
         if idea_text:
             # Get AI analysis
             analysis_prompt = f"Analyze this business idea and provide a detailed project specification: '{idea_text}'. Include the target industry, key features, technology requirements, and potential challenges."
-            ai_analysis = gemini_generate_text(analysis_prompt)
+            ai_analysis = await deadline.run("analysis", run_in_threadpool(gemini_generate_text, analysis_prompt, use_cache))
             
             # Generate project title
             title_prompt = f"Based on the idea '{idea_text}', generate a compelling project title (max 8 words):"
-            project_title = gemini_generate_text(title_prompt)
+            project_title = await deadline.run("title", run_in_threadpool(gemini_generate_text, title_prompt, use_cache))
             
             # Generate description
             desc_prompt = f"Write a brief description (2-3 sentences) for a project based on this idea: '{idea_text}'"
-            project_description = gemini_generate_text(desc_prompt)
+            project_description = await deadline.run("description", run_in_threadpool(gemini_generate_text, desc_prompt, use_cache))
             
             # Create a comprehensive user prompt for the manager agent
             manager_prompt = f"""
@@ -191,12 +449,10 @@ async def process_custom_idea(request: dict):
             - Ensure the application is ready for deployment
             """
             
-            # Generate manager output with backend and frontend prompts
-            manager_output = await generate_manager_output(manager_prompt)
-            
-            # Generate code using the specific prompts
-            await generate_backend(manager_output.backend_engineer_prompt)
-            await generate_frontend(manager_output.frontend_engineer_prompt)
+            # Plan with the manager, then generate backend and frontend code concurrently
+            result = await build_memo_store.run(manager_prompt, use_cache, deadline)
+            if result["status"] == "timeout":
+                return JSONResponse(status_code=504, content={"idea": idea_text, **result})
             
             return {
                 "idea": idea_text,
@@ -213,11 +469,14 @@ async def process_custom_idea(request: dict):
                 ],
                 "industry": "Technology",
                 "category": "Custom Solution",
-                "status": "complete",
-                "backend_prompt": manager_output.backend_engineer_prompt.dict(),
-                "frontend_prompt": manager_output.frontend_engineer_prompt.dict()
+                "backend_prompt": None,
+                **result
             }
         
+    except DeadlineExceeded:
+        return JSONResponse(status_code=504, content={"status": "timeout", "deadline": deadline.report()})
+    except ProviderError:
+        raise
     except Exception as e:
         print(f"Error processing custom idea: {e}")
         return {
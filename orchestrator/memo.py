@@ -0,0 +1,212 @@
+"""Build-level memoization and Idempotency-Key handling
+
+A build is identified by its normalized user prompt plus everything else
+that shapes its output: the manager's system prompt, the model tiers and
+the generation config. Repeats of a build that is still running attach to
+it, and repeats within BUILD_MEMO_TTL_SECONDS get the stored result (whose
+files are still in the artifact store) without calling the LLM at all.
+
+An Idempotency-Key pins a request to one result: a retry with the same key
+gets the same answer for IDEMPOTENCY_TTL_SECONDS, even with use_cache off.
+Reusing a key for a different prompt is rejected. Timeouts and errors are
+not stored, so a retry after one runs the build again. A stored result
+whose files have since been removed from the artifact store counts as a
+miss.
+
+Below whole builds, each fingerprinted agent's files are stored by its
+rendered prompt (StageReuse). A reworded request that changes only the
+frontend prompt re-runs the manager and the frontend agent, and reuses the
+backend files from before.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from agents.manager import SYSTEM_PROMPT
+from orchestrator.artifacts import artifact_store
+from orchestrator.build import run_build
+from orchestrator.deadline import Deadline, DeadlineExceeded
+from providers.config import FAST_MAX_PROMPT_CHARS, MODEL_FAST, MODEL_STRONG, TASK_TIERS
+from providers.gemini import gemini_client
+from providers.singleflight import AsyncSingleFlight
+from providers.telemetry import build_memo
+
+BUILD_MEMO_PATH = os.getenv("BUILD_MEMO_PATH", ".cache/build_memo.sqlite3")
+BUILD_MEMO_TTL_SECONDS = int(os.getenv("BUILD_MEMO_TTL_SECONDS", 24 * 3600))
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", 24 * 3600))
+# Bump to invalidate memoized builds after changing the engineer agents' prompts
+BUILD_MEMO_VERSION = os.getenv("BUILD_MEMO_VERSION", "1")
+
+# Only finished builds are worth replaying
+MEMO_STATUSES = ("complete",)
+IDEMPOTENT_STATUSES = ("complete", "partial")
+
+
+class IdempotencyConflict(Exception):
+    """An Idempotency-Key was reused for a different build"""
+
+
+def normalize_prompt(user_prompt: str) -> str:
+    """Whitespace differences (indentation, trailing newlines) don't change the build"""
+    return re.sub(r"\s+", " ", user_prompt).strip()
+
+
+def _config() -> str:
+    """Everything besides the prompt that shapes what the agents generate"""
+    return json.dumps({
+        "version": BUILD_MEMO_VERSION,
+        "manager_prompt": hashlib.sha256(SYSTEM_PROMPT.encode("utf-8")).hexdigest(),
+        "models": [MODEL_FAST, MODEL_STRONG],
+        "tiers": {task: TASK_TIERS[task] for task in ("plan", "code")},
+        "fast_max_prompt_chars": FAST_MAX_PROMPT_CHARS,
+        "generation_config": gemini_client.generation_config,
+    }, sort_keys=True)
+
+
+def build_key(user_prompt: str) -> str:
+    return hashlib.sha256(f"{_config()}\n{normalize_prompt(user_prompt)}".encode("utf-8")).hexdigest()
+
+
+def _files_available(result: dict) -> bool:
+    """Whether a stored result's files are all still in the artifact store"""
+    return artifact_store.has_files(result.get("manifest", {}).get("files", {}))
+
+
+class BuildMemo:
+    """Stored build results in SQLite (WAL), keyed "build:<key>" or "idempotency:<key>" """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._flights = AsyncSingleFlight()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " key TEXT PRIMARY KEY, build_key TEXT, result TEXT, created_at REAL, expires_at REAL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str):
+        """(build_key, result) stored under key, or None if missing/expired"""
+        try:
+            row = self._conn().execute(
+                "SELECT build_key, result FROM results WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"Build memo read failed: {e}")
+            return None
+        return (row[0], json.loads(row[1])) if row else None
+
+    def set(self, key: str, for_build: str, result: dict, ttl: int) -> None:
+        try:
+            conn = self._conn()
+            now = time.time()
+            conn.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+                (key, for_build, json.dumps(result), now, now + ttl),
+            )
+            conn.execute("DELETE FROM results WHERE expires_at <= ?", (now,))
+        except sqlite3.Error as e:
+            print(f"Build memo write failed: {e}")
+
+    async def run(self, user_prompt: str, use_cache: bool, deadline: Deadline, idempotency_key: str = None,
+                  on_change=None) -> dict:
+        """run_build, unless the same build already ran or is running.
+
+        The result's "memo" field says which: "miss" (this request ran it),
+        "joined" (attached to one in flight), "hit" (memoized) or "replayed"
+        (same Idempotency-Key). Raises IdempotencyConflict if the key was
+        used for a different prompt.
+
+        A joined build runs under its leader's deadline, so a joiner waits
+        for it only until its own deadline, and if the leader's ran out
+        first the joiner runs (or joins) the build again with the time it
+        has left.
+        """
+        key = build_key(user_prompt)
+        if idempotency_key:
+            stored = await asyncio.to_thread(self.get, f"idempotency:{idempotency_key}")
+            if stored is not None:
+                if stored[0] != key:
+                    raise IdempotencyConflict(f"Idempotency-Key {idempotency_key!r} was used for a different build")
+                if await asyncio.to_thread(_files_available, stored[1]):
+                    return await self._outcome(stored[1], "replayed")
+        if use_cache:
+            stored = await asyncio.to_thread(self.get, f"build:{key}")
+            if stored is not None and await asyncio.to_thread(_files_available, stored[1]):
+                return await self._outcome(stored[1], "hit", idempotency_key, key)
+
+        async def lead():
+            reuse = StageReuse(self) if use_cache else None
+            result = await run_build(user_prompt, use_cache, deadline, on_change, reuse)
+            if result["status"] in MEMO_STATUSES:
+                await asyncio.to_thread(self.set, f"build:{key}", key, result, BUILD_MEMO_TTL_SECONDS)
+            return result
+
+        # A use_cache=False request must not attach to a build that may be answering from cache
+        flight = f"{key}:{use_cache}"
+        while self._flights.in_flight(flight):
+            try:
+                result = await deadline.run("joined", self._flights.do(flight, lead))
+            except DeadlineExceeded:
+                result = {"status": "timeout", "deadline": deadline.report(), "pipeline": {}}
+                return await self._outcome(result, "joined", idempotency_key, key)
+            if result["status"] in MEMO_STATUSES or not result["deadline"]["exceeded"] or deadline.expired:
+                return await self._outcome(result, "joined", idempotency_key, key)
+        # run_build returns a timeout or partial result itself when this request's deadline runs out
+        result = await self._flights.do(flight, lead)
+        return await self._outcome(result, "miss", idempotency_key, key)
+
+    async def _outcome(self, result: dict, outcome: str, idempotency_key: str = None, key: str = None) -> dict:
+        """A private copy of result marked with how it was obtained, saved under idempotency_key if given"""
+        if idempotency_key and result["status"] in IDEMPOTENT_STATUSES:
+            await asyncio.to_thread(self.set, f"idempotency:{idempotency_key}", key, result, IDEMPOTENCY_TTL_SECONDS)
+        build_memo.inc(outcome=outcome)
+        copy = {**json.loads(json.dumps(result)), "memo": outcome}
+        if outcome != "miss" and "stages" in copy:
+            # Nothing ran for this request: every stage the build produced is reused
+            produced = copy["stages"]["reused"] + copy["stages"]["rebuilt"]
+            copy["stages"] = {"reused": [name for name in copy["pipeline"] if name in produced], "rebuilt": []}
+        return copy
+
+
+class StageReuse:
+    """Pipeline reuse store: one agent's files by its fingerprint, kept alongside the build results"""
+
+    def __init__(self, memo: BuildMemo):
+        self.memo = memo
+
+    def _key(self, node, fingerprint: str) -> str:
+        digest = hashlib.sha256(f"{_config()}\n{node.name}\n{fingerprint}".encode("utf-8")).hexdigest()
+        return f"stage:{digest}"
+
+    def get(self, node, fingerprint: str):
+        stored = self.memo.get(self._key(node, fingerprint))
+        if stored is None:
+            return None
+        outputs = stored[1]
+        # Only reuse files that are still in the artifact store
+        if not all(artifact_store.has_files(files or {}) for files in outputs.values()):
+            return None
+        return outputs
+
+    def put(self, node, fingerprint: str, outputs: dict) -> None:
+        self.memo.set(self._key(node, fingerprint), node.name, outputs, BUILD_MEMO_TTL_SECONDS)
+
+
+build_memo_store = BuildMemo(BUILD_MEMO_PATH)
@@ -0,0 +1,89 @@
+"""Request metrics, tracing and Server-Timing for the orchestrator, and /metrics views of provider state"""
+
+import time
+from providers.breaker import breakers
+from providers.cache import cache_stats
+from providers.limiter import outbound
+from providers.prompts import token_usage
+from providers.telemetry import (
+    Counter, Gauge, http_duration, http_errors, http_in_flight, registry, request_scope, server_timing,
+)
+
+
+class TelemetryMiddleware:
+    """ASGI middleware: one root span per request (continuing an incoming traceparent),
+    route latency and in-flight metrics, and Server-Timing / traceresponse headers.
+
+    Latency runs to the end of the response body, so streamed builds are
+    measured in full; their Server-Timing only covers what ran before the
+    first byte.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        traceparent = dict(scope["headers"]).get(b"traceparent", b"").decode("latin-1")
+        started = time.monotonic()
+        status = 500
+        http_in_flight.inc()
+        with request_scope(f"{method} {scope['path']}", traceparent, method=method) as (span, timings):
+            async def send_with_headers(message):
+                nonlocal status
+                if message["type"] == "http.response.start":
+                    status = message["status"]
+                    headers = list(message.get("headers", [])) + [
+                        (b"server-timing", server_timing(timings, time.monotonic() - started).encode("latin-1")),
+                        (b"traceresponse", span.traceparent().encode("latin-1")),
+                    ]
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_headers)
+            finally:
+                http_in_flight.dec()
+                # The route template, not the raw path, keeps label cardinality bounded
+                route = getattr(scope.get("route"), "path", "unmatched")
+                span.name = f"{method} {route}"
+                span.attributes["status"] = status
+                http_duration.observe(time.monotonic() - started, method=method, route=route, status=status)
+                if status >= 500:
+                    http_errors.inc(route=route, status=status)
+
+
+def provider_metrics() -> list:
+    """Token, cache, limiter and breaker state as metrics, read at scrape time"""
+    tokens = Counter("kitchen_llm_tokens_total", "LLM tokens by call site", ("call_site", "kind"))
+    calls = Counter("kitchen_llm_calls_total", "Upstream LLM calls by call site", ("call_site",))
+    for site, counts in token_usage.snapshot().items():
+        calls.inc(counts["calls"], call_site=site)
+        for kind in ("prompt", "output", "cached"):
+            tokens.inc(counts[f"{kind}_tokens"], call_site=site, kind=kind)
+
+    lookups = Counter("kitchen_llm_cache_lookups_total", "Response cache lookups", ("call_site", "outcome"))
+    for site, counts in cache_stats.snapshot().items():
+        for outcome, count in counts.items():
+            lookups.inc(count, call_site=site, outcome=outcome)
+
+    limiter = outbound.snapshot()
+    limit = Gauge("kitchen_llm_concurrency_limit", "Current adaptive concurrency limit")
+    limit.set(limiter["limit"])
+    in_flight = Gauge("kitchen_llm_in_flight", "Upstream LLM calls in flight", ("priority",))
+    queued = Gauge("kitchen_llm_queue_depth", "LLM calls waiting for a slot", ("priority",))
+    for cls, state in limiter["classes"].items():
+        in_flight.set(state["in_flight"], priority=cls)
+        queued.set(state["queue_depth"], priority=cls)
+
+    circuits = Gauge("kitchen_llm_breaker_open", "1 while a circuit breaker is open or half-open", ("breaker",))
+    for name, state in breakers.snapshot().items():
+        circuits.set(0 if state["state"] == "closed" else 1, breaker=name)
+    return [tokens, calls, lookups, limit, in_flight, queued, circuits]
+
+
+registry.add_collector(provider_metrics)
@@ -1,6 +1,6 @@
 """Core models"""
 
-from typing import Dict, List
+from typing import Dict, List, Optional
 from pydantic import BaseModel
 
 
@@ -33,4 +33,6 @@ class ManagerOutput(BaseModel):
 
 
 class BuildRequest(BaseModel):
-    user_prompt: str
\ No newline at end of file
+    user_prompt: str
+    use_cache: bool = True  # False forces fresh LLM calls for every stage
+    timeout_seconds: Optional[float] = None  # overall budget; server default if unset
@@ -0,0 +1,132 @@
+"""Dependency-driven scheduler for the build agents
+
+Each agent declares the values it reads and the values it produces. A node
+starts as soon as all of its inputs exist, so independent agents run
+concurrently, and a new agent only lengthens a build if something waits on
+its outputs.
+"""
+
+import asyncio
+import time
+
+
+class Node:
+    """One agent step: run(**inputs, **shared) returns its outputs.
+
+    With one output, run returns that value; otherwise it returns a dict
+    keyed by output name. A node whose input came out as None (e.g. no
+    backend prompt for a frontend-only project) is skipped, and its own
+    outputs are None.
+
+    fingerprint(**inputs), if given, returns the text that fully determines
+    the node's outputs (e.g. its rendered LLM prompt); nodes with one can be
+    reused from an earlier run instead of running again.
+    """
+
+    def __init__(self, name: str, run, inputs: tuple = (), outputs: tuple = (), fingerprint=None):
+        self.name = name
+        self.run = run
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self.fingerprint = fingerprint
+
+    def results(self, returned) -> dict:
+        if len(self.outputs) == 1:
+            return {self.outputs[0]: returned}
+        returned = returned or {}
+        return {name: returned.get(name) for name in self.outputs}
+
+
+class Pipeline:
+    def __init__(self, nodes: list):
+        self.nodes = list(nodes)
+        producers = {}
+        for node in self.nodes:
+            for output in node.outputs:
+                if output in producers:
+                    raise ValueError(f"{output!r} is produced by both {producers[output]} and {node.name}")
+                producers[output] = node.name
+        self.producers = producers
+
+    async def run(self, values: dict, timings: dict = None, on_change=None, reuse=None, **shared) -> dict:
+        """Run every node, filling values with their outputs; returns values.
+
+        shared keyword arguments (use_cache, deadline, ...) go to every node.
+        timings, if given, is filled with {node: {"state", "start", "seconds"}}
+        as nodes start and finish, so it is complete even when run() raises;
+        on_change(timings) is called after each update.
+
+        reuse, if given, stores outputs by fingerprint: reuse.get(node,
+        fingerprint) returns a fingerprinted node's outputs from an earlier
+        run (or None), and reuse.put(node, fingerprint, outputs) saves them.
+        Both are called in a worker thread, as reuse stores do I/O. A reused
+        node is marked "reused" and does not run.
+
+        The first node to fail cancels every other running node, and its
+        exception is re-raised once they have all stopped.
+        """
+        timings = {} if timings is None else timings
+        started = time.monotonic()
+        pending = list(self.nodes)
+        running = {}
+        fingerprints = {}
+
+        def mark(node: Node, state: str, node_started: float = None) -> None:
+            timings[node.name] = {
+                "state": state,
+                "start": round((node_started or time.monotonic()) - started, 3),
+                "seconds": round(time.monotonic() - node_started, 3) if node_started else 0.0,
+            }
+            if on_change is not None:
+                on_change(timings)
+
+        async def call(node: Node):
+            return node.results(await node.run(**{name: values[name] for name in node.inputs}, **shared))
+
+        try:
+            while pending or running:
+                ready = [node for node in pending if all(name in values for name in node.inputs)]
+                for node in ready:
+                    pending.remove(node)
+                    inputs = {name: values[name] for name in node.inputs}
+                    if any(value is None for value in inputs.values()):
+                        values.update({name: None for name in node.outputs})
+                        mark(node, "skipped")
+                        continue
+                    if reuse is not None and node.fingerprint is not None:
+                        fingerprints[node.name] = node.fingerprint(**inputs)
+                        outputs = await asyncio.to_thread(reuse.get, node, fingerprints[node.name])
+                        if outputs is not None:
+                            values.update(outputs)
+                            mark(node, "reused")
+                            continue
+                    node_started = time.monotonic()
+                    running[asyncio.ensure_future(call(node))] = (node, node_started)
+                    mark(node, "running", node_started)
+                if ready and not running:
+                    continue  # skipped or reused nodes may have unblocked others
+                if not running:
+                    missing = sorted({name for node in pending for name in node.inputs if name not in values})
+                    raise ValueError(f"No node produces {', '.join(missing)}")
+
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                error = None
+                for task in done:
+                    node, node_started = running.pop(task)
+                    if task.exception() is not None:
+                        mark(node, "failed", node_started)
+                        error = error or task.exception()
+                        continue
+                    values.update(task.result())
+                    if node.name in fingerprints:
+                        await asyncio.to_thread(reuse.put, node, fingerprints[node.name], task.result())
+                    mark(node, "done", node_started)
+                if error is not None:
+                    raise error
+            return values
+        finally:
+            for task, (node, node_started) in running.items():
+                task.cancel()
+                mark(node, "cancelled", node_started)
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
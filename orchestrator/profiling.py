@@ -0,0 +1,255 @@
+"""Opt-in profiling: per-request stack sampling and tracemalloc snapshots
+
+Off unless PROFILE_TOKEN is set. A request sent with "X-Profile: <token>"
+is sampled while it runs, and the profile is written to PROFILE_DIR in
+folded-stack format (one "frame;frame;frame count" line per stack). That
+file is the input to flamegraph.pl, speedscope and inferno. The file name
+comes back in the X-Profile response header.
+
+Every task the request starts (streaming bodies, hedged attempts, gathered
+agents) is sampled along with the request's own: a task factory on the
+event loop adds tasks created under a profiled request to its sampler.
+Each sample is filed under [cpu] when the task is the one running on the
+event loop, or [await] with the task's suspended stack otherwise (upstream
+calls, sleeps, work handed to the thread pool).
+"""
+
+import asyncio
+import contextvars
+import hmac
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_DIR = os.getenv("PROFILE_DIR", ".cache/profiles")
+PROFILE_INTERVAL_SECONDS = float(os.getenv("PROFILE_INTERVAL_MS", 5)) / 1000
+TRACEMALLOC_FRAMES = 25
+
+
+def _stamp() -> str:
+    """Time-ordered, unique-enough file name prefix"""
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{time.monotonic_ns() % 1000000}"
+
+
+def authorized(token: str) -> bool:
+    return bool(PROFILE_TOKEN) and hmac.compare_digest((token or "").encode(), PROFILE_TOKEN.encode())
+
+
+def _label(frame) -> str:
+    code = frame.f_code
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _thread_stack(frame) -> list:
+    stack = []
+    while frame is not None:
+        stack.append(_label(frame))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def _await_stack(task: asyncio.Task) -> list:
+    """A suspended task's stack, outermost first, following what each coroutine is awaiting
+
+    (Task.get_stack() stops at the outermost coroutine's frame.)
+    """
+    stack = []
+    awaiting = task.get_coro()
+    while awaiting is not None:
+        frame = getattr(awaiting, "cr_frame", None) or getattr(awaiting, "gi_frame", None) \
+            or getattr(awaiting, "ag_frame", None)
+        if frame is not None:
+            stack.append(_label(frame))
+        awaiting = getattr(awaiting, "cr_await", None) or getattr(awaiting, "gi_yieldfrom", None) \
+            or getattr(awaiting, "ag_await", None)
+    return stack
+
+
+# The sampler of the profiled request whose context this is
+_sampler = contextvars.ContextVar("profile_sampler", default=None)
+
+
+def _install_task_factory(loop) -> None:
+    """Have loop hand tasks created under a profiled request to that request's sampler (once per loop)"""
+    previous = loop.get_task_factory()
+    if getattr(previous, "profiling", False):
+        return
+
+    def factory(loop, coro, **kwargs):
+        if previous is not None:
+            task = previous(loop, coro, **kwargs)
+        else:
+            task = asyncio.Task(coro, loop=loop, **kwargs)
+        context = kwargs.get("context")
+        sampler = context.get(_sampler) if context is not None else _sampler.get()
+        if sampler is not None:
+            sampler.tasks.append(task)
+        return task
+
+    factory.profiling = True
+    loop.set_task_factory(factory)
+
+
+class TaskSampler:
+    """Samples an asyncio task, and the tasks started under it, from a background thread every interval"""
+
+    def __init__(self, task: asyncio.Task, interval: float):
+        self.task = task
+        # Appended to from the event loop by the task factory, read by the sampler thread
+        self.tasks = [task]
+        self.loop = task.get_loop()
+        self.loop_thread = threading.get_ident()
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _sample(self) -> None:
+        running = asyncio.current_task(self.loop)
+        for task in tuple(self.tasks):
+            if task.done():
+                continue
+            if task is running:
+                frame = sys._current_frames().get(self.loop_thread)
+                stack = ["[cpu]"] + _thread_stack(frame)
+            else:
+                try:
+                    stack = ["[await]"] + _await_stack(task)
+                except (AttributeError, RuntimeError):
+                    continue  # the task moved on while its stack was being read
+            self.samples[";".join(stack)] += 1
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def write(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class ProfilingMiddleware:
+    """ASGI middleware: profiles requests that carry a valid X-Profile header"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not PROFILE_TOKEN:
+            await self.app(scope, receive, send)
+            return
+        token = dict(scope["headers"]).get(b"x-profile", b"").decode("latin-1")
+        if not token:
+            await self.app(scope, receive, send)
+            return
+        if not authorized(token):
+            await send({"type": "http.response.start", "status": 403, "headers": []})
+            await send({"type": "http.response.body", "body": b"Invalid X-Profile token"})
+            return
+
+        name = re.sub(r"[^A-Za-z0-9_-]+", "_", f"{scope['method']}{scope['path']}").strip("_")
+        # Named before the response starts, written once the whole body has been sent
+        path = os.path.join(PROFILE_DIR, f"{_stamp()}-{name}.folded")
+        sampler = TaskSampler(asyncio.current_task(), PROFILE_INTERVAL_SECONDS)
+
+        async def send_with_header(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", [])) + [(b"x-profile", os.path.basename(path).encode())]
+                message = {**message, "headers": headers}
+            await send(message)
+
+        _install_task_factory(asyncio.get_running_loop())
+        with sampler:
+            profiled = _sampler.set(sampler)
+            try:
+                await self.app(scope, receive, send_with_header)
+            finally:
+                _sampler.reset(profiled)
+        sampler.write(path)
+
+
+# --- Memory snapshots ---
+
+_snapshot_lock = threading.Lock()
+
+
+def _snapshot_path(snapshot_id: str) -> str:
+    if not re.fullmatch(r"[0-9]{8}-[0-9]{6}-[0-9]+", snapshot_id):
+        raise ValueError(f"Unknown snapshot id: {snapshot_id}")
+    return os.path.join(PROFILE_DIR, f"memory-{snapshot_id}.tracemalloc")
+
+
+def _take_snapshot() -> tracemalloc.Snapshot:
+    return tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ])
+
+
+def _top(stats, limit: int) -> list:
+    return [
+        {
+            "where": str(stat.traceback[0]),
+            "size_kb": round(stat.size / 1024, 1),
+            "count": stat.count,
+            **({"size_diff_kb": round(stat.size_diff / 1024, 1), "count_diff": stat.count_diff}
+               if hasattr(stat, "size_diff") else {}),
+        }
+        for stat in stats[:limit]
+    ]
+
+
+def memory_snapshot(limit: int = 20) -> dict:
+    """Start tracing if needed, then save a snapshot (tracemalloc.Snapshot.dump) to PROFILE_DIR"""
+    with _snapshot_lock:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            return {"tracing": True, "snapshot": None,
+                    "message": "tracemalloc started; allocations from now on will be in the next snapshot"}
+        snapshot = _take_snapshot()
+        snapshot_id = _stamp()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        snapshot.dump(_snapshot_path(snapshot_id))
+    current, peak = tracemalloc.get_traced_memory()
+    return {
+        "tracing": True,
+        "snapshot": snapshot_id,
+        "traced_kb": round(current / 1024, 1),
+        "peak_kb": round(peak / 1024, 1),
+        "top": _top(snapshot.statistics("lineno"), limit),
+    }
+
+
+def memory_diff(base: str, against: str = None, limit: int = 20) -> dict:
+    """Allocation growth from snapshot base to snapshot against (or to now)"""
+    old = tracemalloc.Snapshot.load(_snapshot_path(base))
+    if against:
+        new = tracemalloc.Snapshot.load(_snapshot_path(against))
+    elif tracemalloc.is_tracing():
+        new = _take_snapshot()
+    else:
+        raise ValueError("tracemalloc is not running; pass a second snapshot id")
+    return {"base": base, "against": against or "now", "top": _top(new.compare_to(old, "lineno"), limit)}
+
+
+def memory_stop() -> dict:
+    was_tracing = tracemalloc.is_tracing()
+    tracemalloc.stop()
+    return {"tracing": False, "stopped": was_tracing}
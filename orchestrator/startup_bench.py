@@ -0,0 +1,56 @@
+"""Startup benchmark: how long a fresh worker takes to import the app and answer its first request
+
+Each run is a new interpreter, as after a deploy or a --reload:
+
+    python -m orchestrator.startup_bench --runs 5
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+# Modules that should only load once an endpoint actually needs them
+HEAVY_MODULES = ["google.generativeai", "google.cloud.speech", "google.cloud.texttospeech", "grpc"]
+
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+from orchestrator.main import app
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(app) as client:
+    client.get("/")
+served = time.perf_counter()
+print(json.dumps({
+    "import_s": imported - started,
+    "first_response_s": served - started,
+    "modules": len(sys.modules),
+    "heavy_loaded": [name for name in %r if name in sys.modules],
+}))
+"""
+
+
+def run_once() -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", _PROBE % (HEAVY_MODULES,)], capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    runs = [run_once() for _ in range(args.runs)]
+    for metric in ("import_s", "first_response_s"):
+        values = [run[metric] for run in runs]
+        print(f"{metric:<18} median {statistics.median(values):.3f}s  max {max(values):.3f}s")
+    print(f"{'modules loaded':<18} {runs[-1]['modules']}")
+    print(f"{'heavy modules':<18} {', '.join(runs[-1]['heavy_loaded']) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
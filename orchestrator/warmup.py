@@ -0,0 +1,55 @@
+"""Startup warm-up of upstream connections, and the readiness it gates"""
+
+import asyncio
+import time
+from providers.config import WARMUP_ENABLED, WARMUP_RETRY_SECONDS
+
+
+class Readiness:
+    """Not ready until every warm-up step has succeeded once (always ready when warm-up is off)"""
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self.ready = not enabled
+        self.timings = {}
+        self.errors = {}
+        self.attempts = 0
+
+    def snapshot(self) -> dict:
+        return {
+            "status": "ready" if self.ready else "warming",
+            "warmup": self.enabled,
+            "attempts": self.attempts,
+            "timings": self.timings,
+            "errors": self.errors,
+        }
+
+
+readiness = Readiness(WARMUP_ENABLED)
+
+
+async def warm_up(steps: dict) -> None:
+    """Run each named warm-up step until all have succeeded, then flip readiness.
+
+    steps maps a name to a coroutine function returning {step: seconds}.
+    Failed steps are retried every WARMUP_RETRY_SECONDS; the server keeps
+    answering liveness checks meanwhile.
+    """
+    pending = dict(steps)
+    while pending:
+        readiness.attempts += 1
+        for name, step in list(pending.items()):
+            started = time.monotonic()
+            try:
+                readiness.timings.update(await step())
+            except Exception as e:
+                readiness.errors[name] = str(e)
+                print(f"Warm-up step {name} failed (attempt {readiness.attempts}): {e}")
+                continue
+            readiness.timings[f"{name}:total"] = round(time.monotonic() - started, 3)
+            readiness.errors.pop(name, None)
+            del pending[name]
+        if pending:
+            await asyncio.sleep(WARMUP_RETRY_SECONDS)
+    readiness.ready = True
+    print(f"Warm-up complete: {readiness.timings}")
@@ -0,0 +1,82 @@
+"""Micro-batching: gather small independent requests into one upstream call"""
+
+import contextvars
+import threading
+from collections import Counter
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """Collects tasks per group (e.g. model) for up to `window` seconds or
+    `max_tasks` tasks, then hands the batch to run_batch(group, tasks).
+
+    run_batch returns one result per task, None for tasks it could not
+    answer; callers fall back to an individual call for those. A batch of
+    one is not sent at all: it resolves to None straight away, so a lone
+    request only pays the window, never a multi-task prompt.
+    """
+
+    def __init__(self, window: float, max_tasks: int, run_batch):
+        self.window = window
+        self.max_tasks = max_tasks
+        self.run_batch = run_batch
+        self.enabled = window > 0 and max_tasks > 1
+        self.stats = Counter()
+        self._pending = {}
+        self._timers = {}
+        self._lock = threading.Lock()
+
+    def submit(self, group: str, task) -> Future:
+        future = Future()
+        with self._lock:
+            pending = self._pending.setdefault(group, [])
+            pending.append((task, future))
+            batch = None
+            if len(pending) >= self.max_tasks:
+                batch = self._take(group)
+            elif group not in self._timers:
+                timer = threading.Timer(self.window, self._on_timer, (group,))
+                timer.daemon = True
+                self._timers[group] = timer
+                timer.start()
+        if batch:
+            # In a fresh context, like the timer thread: the batch is no one caller's ledger record
+            contextvars.Context().run(self._run, group, batch)
+        return future
+
+    def _take(self, group: str) -> list:
+        timer = self._timers.pop(group, None)
+        if timer is not None:
+            timer.cancel()
+        return self._pending.pop(group, [])
+
+    def _on_timer(self, group: str) -> None:
+        with self._lock:
+            if self._timers.get(group) is not threading.current_thread():
+                return  # the batch was already sent by a full queue
+            batch = self._take(group)
+        self._run(group, batch)
+
+    def _run(self, group: str, batch: list) -> None:
+        if len(batch) < 2:
+            for _, future in batch:
+                future.set_result(None)
+            return
+        tasks = [task for task, _ in batch]
+        try:
+            results = self.run_batch(group, tasks)
+        except Exception as e:
+            print(f"Batched call for {len(tasks)} tasks failed, falling back to single calls: {e}")
+            results = [None] * len(tasks)
+        if len(results) != len(tasks):
+            results = [None] * len(tasks)
+        with self._lock:
+            self.stats["batches"] += 1
+            self.stats["tasks"] += len(tasks)
+            self.stats["fallbacks"] += sum(1 for result in results if result is None)
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {**self.stats, "window_ms": round(self.window * 1000), "max_tasks": self.max_tasks}
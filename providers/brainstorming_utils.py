@@ -1,62 +1,230 @@
 """Simplified brainstorming utilities for API use"""
 
-import os
-from dotenv import load_dotenv
-import google.generativeai as genai
+import json
+import threading
+import time
+from providers import cache
+from providers.batching import MicroBatcher
+from providers.breaker import breakers
+from providers.config import (
+    GEMINI_API_KEY, GEMINI_API_ENDPOINT, MISSING_KEY_MESSAGE, LIST_BATCH_WINDOW_SECONDS, LIST_BATCH_MAX_TASKS,
+)
+from providers.errors import CircuitOpenError, ProviderError
+from providers.fixtures import fixtures
+from providers.hedging import hedging
+from providers.ledger import ledger, note
+from providers.limiter import outbound
+from providers.prompts import token_usage
+from providers.router import model_router, passes
+from providers.singleflight import SingleFlight
 
-# Load environment variables
-load_dotenv()
+# Concurrent identical prompts (e.g. many tabs loading categories) share one call
+_flights = SingleFlight()
 
-# Gemini API Configuration
-gemini_key = os.getenv("GEMINI_API_KEY")
-if not gemini_key:
-    raise RuntimeError("GEMINI_API_KEY not found in environment variables")
+# google.generativeai takes most of a second to import; it is loaded and
+# configured on the first call, not when the API server starts
+_genai = None
+_genai_lock = threading.Lock()
 
-genai.configure(api_key=gemini_key)
 
-def gemini_list_items(prompt: str, n=3, exclude=None) -> list:
-    """Get n short unique items from Gemini, avoiding exclude list."""
-    if exclude is None:
-        exclude = []
+def _genai_module():
+    global _genai
+    with _genai_lock:
+        if _genai is None:
+            if not GEMINI_API_KEY:
+                raise ProviderError(MISSING_KEY_MESSAGE)
+            import google.generativeai as genai
+            if GEMINI_API_ENDPOINT == "https://generativelanguage.googleapis.com":
+                genai.configure(api_key=GEMINI_API_KEY)
+            else:
+                # Only the REST transport can be pointed at a plain-HTTP stub
+                genai.configure(
+                    api_key=GEMINI_API_KEY, transport="rest", client_options={"api_endpoint": GEMINI_API_ENDPOINT}
+                )
+            _genai = genai
+        return _genai
+
+
+def warm(models: list, probe: bool = False) -> dict:
+    """Load and configure genai and open its channel before the first request; returns seconds per step"""
+    timings = {}
+    started = time.monotonic()
+    genai = _genai_module()
+    timings["genai:configure"] = round(time.monotonic() - started, 3)
+    from google.api_core import exceptions as google_exceptions
+    for model_name in models:
+        started = time.monotonic()
+        try:
+            genai.get_model(f"models/{model_name}")
+            if probe:
+                genai.GenerativeModel(model_name).generate_content("ping", generation_config={"max_output_tokens": 1})
+        except google_exceptions.GoogleAPICallError as e:
+            raise ProviderError(f"Gemini warm-up for {model_name} failed: {e}", status=e.code) from e
+        timings[f"genai:{model_name}"] = round(time.monotonic() - started, 3)
+    return timings
+
 
-    model = genai.GenerativeModel("gemini-1.5-flash")
-    sys_prompt = (
-        "Return exactly the requested number of short items.\n"
-        "Number them 1..N. Keep each under 12 words.\n"
-        "No extra commentary."
+def _call_genai(model_name: str, prompt: str, call_site: str, generation_config: dict = None) -> str:
+    genai = _genai_module()
+    from google.api_core import exceptions as google_exceptions
+    try:
+        response = genai.GenerativeModel(model_name).generate_content(prompt, generation_config=generation_config)
+    except google_exceptions.GoogleAPICallError as e:
+        raise ProviderError(f"Gemini {call_site} call failed: {e}", status=e.code) from e
+    usage = response.usage_metadata
+    token_usage.record(
+        call_site, usage.prompt_token_count, usage.candidates_token_count, usage.cached_content_token_count
     )
+    return response.text
+
+
+def _generate_on(model_name: str, prompt: str, call_site: str, use_cache: bool, fingerprint: str, validate,
+                 batch_task=None):
+    """One model's answer via cache, single-flight, hedging and the limiter; None if it fails validate
+
+    With batch_task, a cache miss is first offered to the list batcher and
+    only sent on its own if the batch could not answer it.
+    """
+    if use_cache:
+        key, cached = cache.lookup(call_site, model_name, {}, prompt, fingerprint)
+        if cached is not None:
+            return cached
+    else:
+        key = cache.cache_key(model_name, {}, prompt)
+
+    breaker = breakers.get(model_name)
+    note(model=model_name)
 
+    def fetch():
+        text = None
+        # Batch composition varies run to run, so recorded/replayed sessions use single calls only
+        if batch_task is not None and list_batcher.enabled and fixtures.mode == "live":
+            text = list_batcher.submit(model_name, batch_task).result()
+            if text is not None:
+                note(cache="batched")
+        if text is None:
+            text = fixtures.call(model_name, {}, prompt, lambda: hedging.call(call_site, lambda: outbound.call(
+                lambda: breaker.call(lambda: _call_genai(model_name, prompt, call_site)), call_site
+            )))
+        if validate is not None and not passes(validate, text):
+            return None
+        if use_cache:
+            cache.store(call_site, key, model_name, {}, prompt, text, fingerprint)
+        return text
+
+    try:
+        if not fixtures.replaying:
+            breaker.check()
+        return _flights.do(key, fetch)
+    except CircuitOpenError:
+        # While Gemini is known to be failing, the last good answer beats waiting for another failure
+        stale = cache.stale(call_site, key) if use_cache else None
+        if stale is None:
+            raise
+        return stale
+
+
+def _generate_content(prompt: str, call_site: str, use_cache: bool, fingerprint: str = None, validate=None,
+                      batch_task=None) -> str:
+    """Call Gemini on the routed model, escalating once if validate rejects the answer; raises on upstream failure"""
+    with ledger.track(call_site, prompt):
+        model_name = model_router.route(call_site, prompt)
+        check = validate if model_router.can_escalate(model_name) else None
+        text = _generate_on(model_name, prompt, call_site, use_cache, fingerprint, check, batch_task)
+        if text is None:
+            model_router.escalated(call_site)
+            text = _generate_on(model_router.strong, prompt, call_site, use_cache, fingerprint, None, batch_task)
+        return text
+
+
+LIST_ITEMS_SYSTEM_PROMPT = (
+    "Return exactly the requested number of short items.\n"
+    "Number them 1..N. Keep each under 12 words.\n"
+    "No extra commentary."
+)
+
+
+def build_list_items_prompt(prompt: str, n: int, exclude: list) -> str:
     # Add exclusion note to prompt
     exclude_text = ""
     if exclude:
         exclude_text = " Avoid repeating any of these: " + "; ".join(exclude)
+    return f"{LIST_ITEMS_SYSTEM_PROMPT}\n\nTask: {prompt}{exclude_text}\nReturn {n} items."
+
+
+BATCH_LIST_PROMPT = (
+    "Complete every task below independently. For each task return exactly \"count\" short items,\n"
+    "each under 12 words, not numbered, none of them in that task's \"avoid\" list.\n"
+    "Respond with JSON only: {\"results\": [{\"id\": <task id>, \"items\": [\"...\"]}]}"
+)
+
+
+def _run_list_batch(model_name: str, tasks: list) -> list:
+    """Answer several (prompt, n, exclude) list tasks with one call.
+
+    Returns each task's items as the numbered text a single call would
+    produce, or None for a task the batch answer doesn't cover properly.
+    """
+    spec = [{"id": i, "task": prompt, "count": n, "avoid": exclude} for i, (prompt, n, exclude) in enumerate(tasks)]
+    batch_prompt = f"{BATCH_LIST_PROMPT}\n\nTasks:\n{json.dumps(spec, ensure_ascii=False)}"
+    config = {"response_mime_type": "application/json"}
+    breaker = breakers.get(model_name)
+    text = fixtures.call(model_name, config, batch_prompt, lambda: outbound.call(
+        lambda: breaker.call(lambda: _call_genai(model_name, batch_prompt, "list_items", config)), "list_items"
+    ))
 
     try:
-        r = model.generate_content(f"{sys_prompt}\n\nTask: {prompt}{exclude_text}\nReturn {n} items.")
-        lines = [ln.strip("-• ").strip() for ln in r.text.strip().splitlines() if ln.strip()]
-
-        items = []
-        for ln in lines:
-            if ln[0].isdigit():
-                ln = ln.split(".", 1)[-1].strip() if "." in ln[:3] else ln
-            items.append(ln)
-
-        # Deduplicate against history
-        unique_items = [it for it in items if it not in exclude]
-
-        return unique_items[:n]
-    except Exception as e:
-        print(f"Error generating content with Gemini: {e}")
-        # Return fallback items
-        return [f"AI-Generated Idea {i+1}" for i in range(min(n, 3))]
-
-def gemini_generate_text(prompt: str) -> str:
-    """Generate a single text response from Gemini"""
-    model = genai.GenerativeModel("gemini-1.5-flash")
-    
-    try:
-        response = model.generate_content(prompt)
-        return response.text.strip()
-    except Exception as e:
-        print(f"Error generating text with Gemini: {e}")
-        return "AI-generated content unavailable"
+        answers = {entry["id"]: entry["items"] for entry in json.loads(text)["results"]}
+    except (ValueError, KeyError, TypeError) as e:
+        print(f"Malformed batched list answer, falling back to single calls: {e}")
+        return [None] * len(tasks)
+
+    results = []
+    for i, (_, n, _) in enumerate(tasks):
+        items = answers.get(i)
+        if not isinstance(items, list) or len(items) < n or not all(isinstance(item, str) and item for item in items):
+            results.append(None)
+            continue
+        results.append("\n".join(f"{number}. {item}" for number, item in enumerate(items, 1)))
+    return results
+
+
+list_batcher = MicroBatcher(LIST_BATCH_WINDOW_SECONDS, LIST_BATCH_MAX_TASKS, _run_list_batch)
+
+
+def gemini_list_items(prompt: str, n=3, exclude=None, use_cache=True, fingerprint=None) -> list:
+    """Get n short unique items from Gemini, avoiding exclude list.
+
+    fingerprint: the values filled into prompt (e.g. (area, category,
+    industry)); with it, a request for nearly the same values may be served
+    from the near-duplicate cache.
+
+    Raises ProviderError when Gemini can't answer, including CircuitOpenError
+    when its circuit is open and there is no stale answer; callers report
+    it (the APIs as a 503) rather than showing placeholder items.
+    """
+    if exclude is None:
+        exclude = []
+
+    text = _generate_content(
+        build_list_items_prompt(prompt, n, exclude), "list_items", use_cache,
+        fingerprint=fingerprint,
+        validate=lambda answer: len([ln for ln in answer.splitlines() if ln.strip()]) >= n,
+        batch_task=(prompt, n, exclude),
+    )
+    lines = [ln.strip("-• ").strip() for ln in text.strip().splitlines() if ln.strip()]
+
+    items = []
+    for ln in lines:
+        if ln[0].isdigit():
+            ln = ln.split(".", 1)[-1].strip() if "." in ln[:3] else ln
+        items.append(ln)
+
+    # Deduplicate against history
+    unique_items = [it for it in items if it not in exclude]
+
+    return unique_items[:n]
+
+def gemini_generate_text(prompt: str, use_cache=True) -> str:
+    """Generate a single text response from Gemini; raises ProviderError like gemini_list_items"""
+    return _generate_content(prompt, "generate_text", use_cache).strip()
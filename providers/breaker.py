@@ -0,0 +1,159 @@
+"""Circuit breakers for Gemini calls, one per model and endpoint"""
+
+import threading
+import time
+from collections import deque
+from providers.config import (
+    BREAKER_WINDOW_SECONDS, BREAKER_MIN_CALLS, BREAKER_ERROR_RATE, BREAKER_SLOW_CALL_SECONDS,
+    BREAKER_SLOW_RATE, BREAKER_OPEN_SECONDS, BREAKER_HALF_OPEN_PROBES,
+)
+from providers.errors import CircuitOpenError, ProviderError
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitBreaker:
+    """closed -> open when recent calls fail or run slow too often;
+    open -> half_open after open_seconds; half_open -> closed on a good
+    probe, back to open on a failed one.
+
+    Only upstream trouble counts as failure (retryable ProviderErrors:
+    429, 5xx, transport errors). A 400 still proves the provider is up.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.trips = 0
+        self._outcomes = deque()  # (finished_at, failed, slow)
+        self._probes = 0
+        self._lock = threading.Lock()
+
+    def _retry_after(self, now: float) -> float:
+        return max(0.0, self.opened_at + BREAKER_OPEN_SECONDS - now)
+
+    def check(self) -> None:
+        """Fail fast, without taking a probe slot, while the circuit is open"""
+        with self._lock:
+            if self.state == OPEN:
+                retry_after = self._retry_after(time.monotonic())
+                if retry_after > 0:
+                    raise CircuitOpenError(self.name, retry_after)
+
+    def admit(self) -> None:
+        """Claim permission for one upstream call; raises CircuitOpenError if refused"""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == OPEN:
+                retry_after = self._retry_after(now)
+                if retry_after > 0:
+                    raise CircuitOpenError(self.name, retry_after)
+                self.state = HALF_OPEN
+                self._probes = 0
+            if self.state == HALF_OPEN:
+                if self._probes >= BREAKER_HALF_OPEN_PROBES:
+                    raise CircuitOpenError(self.name, 1.0)
+                self._probes += 1
+
+    def _open(self, now: float) -> None:
+        self.state = OPEN
+        self.opened_at = now
+        self.trips += 1
+        self._outcomes.clear()
+        print(f"Gemini circuit {self.name} opened for {BREAKER_OPEN_SECONDS:.0f}s")
+
+    def record(self, seconds: float, failed: bool) -> None:
+        """Outcome of an admitted call"""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+                if failed:
+                    self._open(now)
+                else:
+                    self.state = CLOSED
+                    self._outcomes.clear()
+                return
+            if self.state == OPEN:
+                return
+
+            self._outcomes.append((now, failed, seconds >= BREAKER_SLOW_CALL_SECONDS))
+            while self._outcomes and self._outcomes[0][0] < now - BREAKER_WINDOW_SECONDS:
+                self._outcomes.popleft()
+            calls = len(self._outcomes)
+            if calls < BREAKER_MIN_CALLS:
+                return
+            failures = sum(1 for _, failed_call, _ in self._outcomes if failed_call)
+            slow = sum(1 for _, _, slow_call in self._outcomes if slow_call)
+            if failures / calls >= BREAKER_ERROR_RATE or slow / calls >= BREAKER_SLOW_RATE:
+                self._open(now)
+
+    def abandon(self) -> None:
+        """An admitted call ended without an outcome (cancelled); give back its probe slot"""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+
+    def call(self, fn):
+        self.admit()
+        started = time.monotonic()
+        try:
+            result = fn()
+        except ProviderError as e:
+            self.record(time.monotonic() - started, failed=e.retryable)
+            raise
+        except BaseException:
+            self.abandon()
+            raise
+        self.record(time.monotonic() - started, failed=False)
+        return result
+
+    async def acall(self, fn):
+        self.admit()
+        started = time.monotonic()
+        try:
+            result = await fn()
+        except ProviderError as e:
+            self.record(time.monotonic() - started, failed=e.retryable)
+            raise
+        except BaseException:
+            self.abandon()
+            raise
+        self.record(time.monotonic() - started, failed=False)
+        return result
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            recent = [outcome for outcome in self._outcomes if outcome[0] >= now - BREAKER_WINDOW_SECONDS]
+            return {
+                "state": self.state,
+                "trips": self.trips,
+                "recent_calls": len(recent),
+                "recent_failures": sum(1 for _, failed, _ in recent if failed),
+                "retry_after": round(self._retry_after(now), 1) if self.state == OPEN else 0,
+            }
+
+
+class Breakers:
+    """Registry: one breaker per "model:endpoint", created on first use"""
+
+    def __init__(self):
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, model: str, endpoint: str = "generateContent") -> CircuitBreaker:
+        name = f"{model}:{endpoint}"
+        with self._lock:
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                breaker = self._breakers[name] = CircuitBreaker(name)
+            return breaker
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {name: breaker.snapshot() for name, breaker in self._breakers.items()}
+
+
+breakers = Breakers()
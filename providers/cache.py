@@ -0,0 +1,199 @@
+"""Persistent, content-addressed cache for LLM responses"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, defaultdict
+from providers.config import (
+    CACHE_ENABLED, CACHE_PATH, CACHE_MAX_BYTES, CACHE_STALE_SECONDS, CACHE_TTLS, CACHE_DEFAULT_TTL,
+    NEAR_CACHE_THRESHOLDS, NEAR_CACHE_MAX_ENTRIES,
+)
+from providers.ledger import note
+from providers.similarity import NEAR_SCHEMA, SIGNATURE_VERSION, NearDuplicateCache, fingerprint_parts
+
+
+def cache_key(model: str, generation_config: dict, prompt: str) -> str:
+    """Hash of everything that determines the response"""
+    header = json.dumps({"model": model, "generationConfig": generation_config or {}}, sort_keys=True)
+    return hashlib.sha256(f"{header}\n{prompt}".encode("utf-8")).hexdigest()
+
+
+def cache_ttl(call_site: str) -> int:
+    return CACHE_TTLS.get(call_site, CACHE_DEFAULT_TTL)
+
+
+class ResponseCache:
+    """SQLite (WAL) store with TTL expiry and size-bounded LRU eviction.
+
+    WAL mode lets every uvicorn/flask worker on the host read and write the
+    same file concurrently; each thread keeps its own connection. Expired
+    rows linger for stale_seconds so get(allow_stale=True) can still serve
+    them while the provider is unavailable.
+    """
+
+    def __init__(self, path: str, max_bytes: int, enabled: bool = True, stale_seconds: int = 0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.stale_seconds = stale_seconds
+        self.enabled = enabled
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, call_site TEXT, response TEXT, size INTEGER,"
+                " created_at REAL, expires_at REAL, accessed_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses (accessed_at)")
+            for statement in NEAR_SCHEMA:
+                conn.execute(statement)
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str, allow_stale: bool = False):
+        """Cached response for key, or None if missing/expired"""
+        if not self.enabled:
+            return None
+        try:
+            conn = self._conn()
+            now = time.time()
+            fresh_after = now - self.stale_seconds if allow_stale else now
+            row = conn.execute(
+                "SELECT response FROM responses WHERE key = ? AND expires_at > ?", (key, fresh_after)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            return row[0]
+        except sqlite3.Error as e:
+            print(f"LLM cache read failed: {e}")
+            return None
+
+    def set(self, key: str, response: str, call_site: str, ttl: int = None) -> None:
+        if not self.enabled:
+            return
+        if ttl is None:
+            ttl = cache_ttl(call_site)
+        try:
+            conn = self._conn()
+            now = time.time()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, call_site, response, len(response.encode("utf-8")), now, now + ttl, now),
+            )
+            self._evict(conn, now)
+        except sqlite3.Error as e:
+            print(f"LLM cache write failed: {e}")
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        """Drop entries past their stale window, then least recently used ones until under max_bytes"""
+        conn.execute("DELETE FROM responses WHERE expires_at <= ?", (now - self.stale_seconds,))
+        total, count = conn.execute("SELECT COALESCE(SUM(size), 0), COUNT(*) FROM responses").fetchone()
+        while total > self.max_bytes and count > 0:
+            batch = max(1, count // 10)
+            conn.execute(
+                "DELETE FROM responses WHERE key IN"
+                " (SELECT key FROM responses ORDER BY accessed_at ASC LIMIT ?)",
+                (batch,),
+            )
+            total, count = conn.execute("SELECT COALESCE(SUM(size), 0), COUNT(*) FROM responses").fetchone()
+
+    def clear(self) -> None:
+        self._conn().execute("DELETE FROM responses")
+        self._conn().execute("DELETE FROM near_responses")
+
+
+class CacheStats:
+    """Per-call-site hit / near_hit / stale_hit / miss counters for this process"""
+
+    def __init__(self):
+        self._counts = defaultdict(Counter)
+        self._lock = threading.Lock()
+
+    def record(self, call_site: str, outcome: str) -> None:
+        with self._lock:
+            self._counts[call_site][outcome] += 1
+        note(cache=outcome)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {site: dict(counts) for site, counts in self._counts.items()}
+
+
+response_cache = ResponseCache(CACHE_PATH, CACHE_MAX_BYTES, enabled=CACHE_ENABLED, stale_seconds=CACHE_STALE_SECONDS)
+near_cache = NearDuplicateCache(response_cache._conn, NEAR_CACHE_MAX_ENTRIES)
+cache_stats = CacheStats()
+
+
+def _near_context(model: str, generation_config: dict, prompt: str, fingerprint) -> str:
+    """Exact part of a near-duplicate key: the prompt with the fingerprinted text cut out"""
+    for part in sorted(fingerprint_parts(fingerprint), key=len, reverse=True):
+        prompt = prompt.replace(part, "\0")
+    return cache_key(model, generation_config, f"{SIGNATURE_VERSION}\0{prompt}")
+
+
+def lookup(call_site: str, model: str, generation_config: dict, prompt: str, fingerprint=None):
+    """Return (key, cached response or None), trying exact then near-duplicate matches.
+
+    fingerprint is the part of the prompt that varies between requests (the
+    user request after a fixed system prompt), or a tuple of such parts
+    (the fields filled into a template). Only these parts are compared, so
+    the fixed template words cannot make different requests look alike. It
+    enables the similarity lookup for call sites in NEAR_CACHE_THRESHOLDS.
+    """
+    key = cache_key(model, generation_config, prompt)
+    if not response_cache.enabled:
+        return key, None
+    cached = response_cache.get(key)
+    if cached is not None:
+        cache_stats.record(call_site, "hit")
+        return key, cached
+
+    threshold = NEAR_CACHE_THRESHOLDS.get(call_site)
+    if fingerprint_parts(fingerprint or ()) and threshold is not None:
+        try:
+            context = _near_context(model, generation_config, prompt, fingerprint)
+            cached = near_cache.get(call_site, context, fingerprint, threshold)
+        except sqlite3.Error as e:
+            print(f"LLM near-duplicate cache read failed: {e}")
+        if cached is not None:
+            cache_stats.record(call_site, "near_hit")
+            return key, cached
+
+    cache_stats.record(call_site, "miss")
+    return key, None
+
+
+def store(call_site: str, key: str, model: str, generation_config: dict, prompt: str,
+          response: str, fingerprint=None) -> None:
+    """Save a fresh upstream response under its exact key (and fingerprint, if any)"""
+    if not response_cache.enabled:
+        return
+    response_cache.set(key, response, call_site)
+    if fingerprint_parts(fingerprint or ()) and call_site in NEAR_CACHE_THRESHOLDS:
+        try:
+            context = _near_context(model, generation_config, prompt, fingerprint)
+            near_cache.set(call_site, context, fingerprint, response, cache_ttl(call_site))
+        except sqlite3.Error as e:
+            print(f"LLM near-duplicate cache write failed: {e}")
+
+
+def stale(call_site: str, key: str):
+    """Last good response for key even if past its TTL, for when the provider can't be called"""
+    if not response_cache.enabled:
+        return None
+    cached = response_cache.get(key, allow_stale=True)
+    if cached is not None:
+        cache_stats.record(call_site, "stale_hit")
+    return cached
@@ -8,6 +8,153 @@ load_dotenv()
 
 # Gemini API Configuration
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+# Point at a local stub (python -m providers.stub_server) for offline load/fault testing
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT", "https://generativelanguage.googleapis.com").rstrip("/")
 
-if not GEMINI_API_KEY:
-    raise RuntimeError("GEMINI_API_KEY not found in environment variables. Please set it in your .env file.")
+# "live" calls Gemini, "record" also saves each response to FIXTURES_DIR,
+# "replay" answers only from FIXTURES_DIR and needs no API key
+PROVIDER_MODE = os.getenv("LLM_PROVIDER_MODE", "live")
+FIXTURES_DIR = os.getenv("LLM_FIXTURES_DIR", "fixtures/llm")
+
+# Checked when a client first needs it, so a missing key fails the Gemini-backed
+# endpoints (as a ProviderError) instead of the whole app at import
+MISSING_KEY_MESSAGE = "GEMINI_API_KEY not found in environment variables. Please set it in your .env file."
+
+# Upper bound for a single Gemini HTTP request; callers with a deadline cut it shorter
+REQUEST_TIMEOUT_SECONDS = float(os.getenv("LLM_REQUEST_TIMEOUT_SECONDS", 120))
+
+
+# LLM response cache (SQLite, shared by all workers on the host)
+CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() != "false"
+CACHE_PATH = os.getenv("LLM_CACHE_PATH", ".cache/llm_cache.sqlite3")
+CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+# Expired responses are kept this much longer to be served while a circuit breaker is open
+CACHE_STALE_SECONDS = int(os.getenv("LLM_CACHE_STALE_SECONDS", 7 * 24 * 3600))
+
+# Seconds a cached response stays fresh, per call site
+CACHE_TTLS = {
+    "manager": int(os.getenv("LLM_CACHE_TTL_MANAGER", 24 * 3600)),
+    "backend": int(os.getenv("LLM_CACHE_TTL_BACKEND", 24 * 3600)),
+    "frontend": int(os.getenv("LLM_CACHE_TTL_FRONTEND", 24 * 3600)),
+    "list_items": int(os.getenv("LLM_CACHE_TTL_LIST_ITEMS", 3600)),
+    "generate_text": int(os.getenv("LLM_CACHE_TTL_GENERATE_TEXT", 3600)),
+}
+CACHE_DEFAULT_TTL = int(os.getenv("LLM_CACHE_TTL_DEFAULT", 3600))
+
+# Near-duplicate prompt cache: minimum MinHash similarity per call site.
+# Call sites not listed only use exact matches.
+NEAR_CACHE_THRESHOLDS = {
+    "list_items": float(os.getenv("LLM_NEAR_CACHE_LIST_ITEMS", 0.9)),
+}
+# Off unless set: one changed word in a free-form request ("no backend") can change the whole plan
+if os.getenv("LLM_NEAR_CACHE_MANAGER"):
+    NEAR_CACHE_THRESHOLDS["manager"] = float(os.getenv("LLM_NEAR_CACHE_MANAGER"))
+NEAR_CACHE_MAX_ENTRIES = int(os.getenv("LLM_NEAR_CACHE_MAX_ENTRIES", 5000))
+
+# Outbound Gemini traffic shaping, shared by every provider call in the process
+RATE_LIMIT_PER_SEC = float(os.getenv("LLM_RATE_LIMIT_PER_SEC", 5))
+RATE_LIMIT_BURST = int(os.getenv("LLM_RATE_LIMIT_BURST", 10))
+CONCURRENCY_INITIAL = int(os.getenv("LLM_CONCURRENCY_INITIAL", 8))
+CONCURRENCY_MIN = int(os.getenv("LLM_CONCURRENCY_MIN", 1))
+CONCURRENCY_MAX = int(os.getenv("LLM_CONCURRENCY_MAX", 32))
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 4))
+RETRY_BUDGET_RATIO = float(os.getenv("LLM_RETRY_BUDGET_RATIO", 0.2))
+
+# Append-only ledger with one fixed-size record per LLM call (python -m providers.ledger
+# summarizes it). The file rotates to .1, .2, ... once it reaches LEDGER_MAX_BYTES.
+LEDGER_ENABLED = os.getenv("LLM_LEDGER_ENABLED", "true").lower() != "false"
+LEDGER_PATH = os.getenv("LLM_LEDGER_PATH", ".cache/llm_calls.ledger")
+LEDGER_MAX_BYTES = int(os.getenv("LLM_LEDGER_MAX_BYTES", 16 * 1024 * 1024))
+LEDGER_KEEP = int(os.getenv("LLM_LEDGER_KEEP", 4))
+
+# Finished trace spans are appended here as JSON lines (unset: spans only feed Server-Timing)
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", "")
+
+# Priority classes, highest first. Queued calls are granted strictly in this
+# order, and each class's reserved slots can't be taken by lower classes.
+PRIORITY_CLASSES = ["interactive", "build"]
+CALL_SITE_CLASSES = {
+    "list_items": "interactive",
+    "generate_text": "interactive",
+    "manager": "build",
+    "backend": "build",
+    "frontend": "build",
+}
+DEFAULT_PRIORITY_CLASS = os.getenv("LLM_DEFAULT_PRIORITY_CLASS", "build")
+RESERVED_SLOTS = {
+    "interactive": int(os.getenv("LLM_RESERVED_INTERACTIVE", 2)),
+}
+
+# Circuit breaker per model and endpoint. It opens when, over the last
+# BREAKER_WINDOW_SECONDS and at least BREAKER_MIN_CALLS calls, the share of
+# failed (429/5xx/transport) or slow calls reaches its threshold; after
+# BREAKER_OPEN_SECONDS a few probe calls decide whether it closes again.
+BREAKER_WINDOW_SECONDS = float(os.getenv("LLM_BREAKER_WINDOW_SECONDS", 60))
+BREAKER_MIN_CALLS = int(os.getenv("LLM_BREAKER_MIN_CALLS", 10))
+BREAKER_ERROR_RATE = float(os.getenv("LLM_BREAKER_ERROR_RATE", 0.5))
+BREAKER_SLOW_CALL_SECONDS = float(os.getenv("LLM_BREAKER_SLOW_CALL_SECONDS", 60))
+BREAKER_SLOW_RATE = float(os.getenv("LLM_BREAKER_SLOW_RATE", 0.8))
+BREAKER_OPEN_SECONDS = float(os.getenv("LLM_BREAKER_OPEN_SECONDS", 30))
+BREAKER_HALF_OPEN_PROBES = int(os.getenv("LLM_BREAKER_HALF_OPEN_PROBES", 2))
+
+# Hedged requests (opt-in): fraction of each call site's traffic that may be
+# duplicated when a call outlives the site's rolling latency percentile.
+# 0 disables hedging for that site.
+HEDGE_BUDGETS = {
+    "manager": float(os.getenv("LLM_HEDGE_MANAGER", 0)),
+    "backend": float(os.getenv("LLM_HEDGE_BACKEND", 0)),
+    "frontend": float(os.getenv("LLM_HEDGE_FRONTEND", 0)),
+    "list_items": float(os.getenv("LLM_HEDGE_LIST_ITEMS", 0)),
+}
+HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", 0.9))
+HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", 20))
+
+# Micro-batching of list_items calls: requests arriving within the window
+# (up to the task cap) share one multi-task prompt. Opt-in (window 0 = off): every
+# lone call waits out the window, which only pays off when many clients list at once.
+LIST_BATCH_WINDOW_SECONDS = float(os.getenv("LLM_LIST_BATCH_WINDOW_MS", 0)) / 1000
+LIST_BATCH_MAX_TASKS = int(os.getenv("LLM_LIST_BATCH_MAX_TASKS", 8))
+
+# Model tiers and per-task routing
+MODEL_FAST = os.getenv("LLM_MODEL_FAST", "gemini-1.5-flash")
+MODEL_STRONG = os.getenv("LLM_MODEL_STRONG", "gemini-1.5-pro")
+TASK_CLASSES = {
+    "manager": "plan",
+    "backend": "code",
+    "frontend": "code",
+    "list_items": "list",
+    "generate_text": "text",
+}
+TASK_TIERS = {
+    "list": os.getenv("LLM_TIER_LIST", "fast"),
+    "text": os.getenv("LLM_TIER_TEXT", "fast"),
+    "plan": os.getenv("LLM_TIER_PLAN", "fast"),
+    "code": os.getenv("LLM_TIER_CODE", "strong"),
+}
+# Prompts longer than this (characters) always go to the strong tier
+FAST_MAX_PROMPT_CHARS = int(os.getenv("LLM_FAST_MAX_PROMPT_CHARS", 30000))
+
+# Startup warm-up (opt-in): open pooled connections to Gemini before taking traffic.
+# With the probe on, also send one 1-token request per model tier.
+WARMUP_ENABLED = os.getenv("LLM_WARMUP", "false").lower() == "true"
+WARMUP_PROBE = os.getenv("LLM_WARMUP_PROBE", "false").lower() == "true"
+WARMUP_RETRY_SECONDS = float(os.getenv("LLM_WARMUP_RETRY_SECONDS", 10))
+
+# Provider-side context caching of long fixed prompt prefixes (manager SYSTEM_PROMPT).
+# "gemini" uses cachedContents, "local" is an in-memory stand-in for offline runs, "off" inlines.
+# Off by default: Gemini 1.5 refuses prefixes below its minimum size, which the
+# ~800-token manager prompt is far under.
+CONTEXT_CACHE_MODE = os.getenv("LLM_CONTEXT_CACHE", "off")
+# Provider minimum (estimated tokens); shorter prefixes are inlined without trying to create a cache
+CONTEXT_CACHE_MIN_TOKENS = int(os.getenv("LLM_CONTEXT_CACHE_MIN_TOKENS", 32768))
+CONTEXT_CACHE_TTL = int(os.getenv("LLM_CONTEXT_CACHE_TTL", 3600))
+CONTEXT_CACHE_REFRESH_MARGIN = int(os.getenv("LLM_CONTEXT_CACHE_REFRESH_MARGIN", 300))
+
+# Upper bound (estimated tokens) for each agent prompt template rendered with empty
+# fields; python -m agents.prompt_budget fails when a template outgrows it
+PROMPT_TOKEN_BUDGETS = {
+    "manager": int(os.getenv("LLM_PROMPT_BUDGET_MANAGER", 900)),
+    "backend": int(os.getenv("LLM_PROMPT_BUDGET_BACKEND", 280)),
+    "frontend": int(os.getenv("LLM_PROMPT_BUDGET_FRONTEND", 220)),
+    "list_items": int(os.getenv("LLM_PROMPT_BUDGET_LIST_ITEMS", 50)),
+}
@@ -0,0 +1,124 @@
+"""Provider-side prefix caching (Gemini cachedContents) with local lifecycle management"""
+
+import asyncio
+import hashlib
+import itertools
+import time
+from collections import Counter
+from providers.config import CONTEXT_CACHE_MIN_TOKENS, CONTEXT_CACHE_TTL, CONTEXT_CACHE_REFRESH_MARGIN
+from providers.errors import ProviderError
+from providers.prompts import estimate_tokens
+
+
+class LocalContextStore:
+    """Offline stand-in for cachedContents: same lifecycle, prefix text kept in memory.
+
+    Requests using a local handle get the stored text inlined, so the
+    create/refresh/invalidate paths run without a provider.
+    """
+
+    remote = False
+
+    def __init__(self):
+        self._texts = {}
+        self._ids = itertools.count(1)
+
+    async def create_cached_content(self, model: str, text: str, ttl: int) -> str:
+        name = f"cachedContents/local-{next(self._ids)}"
+        self._texts[name] = text
+        return name
+
+    async def refresh_cached_content(self, name: str, ttl: int) -> None:
+        if name not in self._texts:
+            raise ProviderError(f"{name} not found", status=404)
+
+    async def delete_cached_content(self, name: str) -> None:
+        self._texts.pop(name, None)
+
+    def text(self, name: str) -> str:
+        return self._texts[name]
+
+
+class _Entry:
+    def __init__(self, name: str, digest: str, expires_at: float):
+        self.name = name
+        self.digest = digest
+        self.expires_at = expires_at
+
+
+class PrefixCache:
+    """Tracks one provider cache per (call site, model) for a fixed prompt prefix.
+
+    handle() creates the cache on first use, refreshes its TTL when it is
+    within refresh_margin of expiring, and deletes/recreates it when the
+    prefix text (by hash) changes. Returns None when the provider won't
+    cache the prefix; callers then inline it. Prefixes below min_tokens are
+    known to be refused, so a remote backend is not even asked.
+    """
+
+    def __init__(self, ttl: int, refresh_margin: int, min_tokens: int = 0):
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+        self.min_tokens = min_tokens
+        self.stats = Counter()
+        self._entries = {}
+        self._unsupported = set()
+        self._lock = None
+
+    async def handle(self, backend, call_site: str, model: str, prefix: str):
+        if backend.remote and estimate_tokens(prefix) < self.min_tokens:
+            self.stats["below_minimum"] += 1
+            return None
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        digest = hashlib.sha256(prefix.encode("utf-8")).hexdigest()
+        slot = (call_site, model)
+        async with self._lock:
+            entry = self._entries.get(slot)
+            if entry is not None and entry.digest != digest:
+                # Prompt text changed: the provider copy is stale
+                del self._entries[slot]
+                await self._delete(backend, entry.name)
+                self.stats["invalidations"] += 1
+                entry = None
+            if (slot, digest) in self._unsupported:
+                return None
+
+            now = time.time()
+            if entry is not None:
+                if now < entry.expires_at - self.refresh_margin:
+                    self.stats["hits"] += 1
+                    return entry.name
+                if now < entry.expires_at:
+                    try:
+                        await backend.refresh_cached_content(entry.name, self.ttl)
+                        entry.expires_at = now + self.ttl
+                        self.stats["refreshes"] += 1
+                        return entry.name
+                    except ProviderError as e:
+                        print(f"Context cache refresh failed, recreating: {e}")
+                del self._entries[slot]
+
+            try:
+                name = await backend.create_cached_content(model, prefix, self.ttl)
+            except ProviderError as e:
+                self.stats["failures"] += 1
+                print(f"Context cache create failed for {call_site}/{model}, sending prompt inline: {e}")
+                if not e.retryable:
+                    self._unsupported.add((slot, digest))
+                return None
+            self._entries[slot] = _Entry(name, digest, now + self.ttl)
+            self.stats["creates"] += 1
+            return name
+
+    async def _delete(self, backend, name: str) -> None:
+        try:
+            await backend.delete_cached_content(name)
+        except ProviderError as e:
+            print(f"Context cache delete failed (it will expire on its own): {e}")
+
+    def snapshot(self) -> dict:
+        return {**dict(self.stats), "active": len(self._entries)}
+
+
+prefix_cache = PrefixCache(CONTEXT_CACHE_TTL, CONTEXT_CACHE_REFRESH_MARGIN, CONTEXT_CACHE_MIN_TOKENS)
@@ -0,0 +1,48 @@
+"""Provider error types"""
+
+
+class ProviderError(RuntimeError):
+    """An upstream LLM call failed.
+
+    status is the HTTP status when there was one (429 for quota, 5xx for
+    server trouble); retry_after is the server's Retry-After in seconds;
+    transient marks failures without a status that are worth retrying
+    (connection resets, read timeouts).
+    """
+
+    circuit_open = False
+
+    def __init__(self, message: str, status: int = None, retry_after: float = None, transient: bool = False):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+        self.transient = transient
+
+    @property
+    def overloaded(self) -> bool:
+        return self.status == 429
+
+    @property
+    def retryable(self) -> bool:
+        return self.transient or self.status in (429, 500, 502, 503, 504)
+
+
+class CircuitOpenError(ProviderError):
+    """Refused without calling upstream: the circuit breaker for this model/endpoint is open.
+
+    Not retryable, so the outbound retry loop gives up at once; callers
+    may fall back to a stale cached answer instead.
+    """
+
+    circuit_open = True
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Gemini circuit {name} is open", retry_after=retry_after)
+
+
+def parse_retry_after(value: str):
+    """Retry-After header in seconds (only the delta-seconds form is used by Google APIs)"""
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,90 @@
+"""Record/replay of provider responses for offline, deterministic runs"""
+
+import json
+import os
+import threading
+from providers.cache import cache_key
+from providers.config import PROVIDER_MODE, FIXTURES_DIR
+from providers.errors import ProviderError
+
+
+class FixtureStore:
+    """One JSON file per (model, generation config, prompt), named by its cache key.
+
+    Files hold the prompt alongside the response so a recorded session can
+    be read and edited by hand.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, model: str, generation_config: dict, prompt: str):
+        try:
+            with open(self._path(cache_key(model, generation_config, prompt)), encoding="utf-8") as f:
+                return json.load(f)["response"]
+        except FileNotFoundError:
+            return None
+
+    def put(self, model: str, generation_config: dict, prompt: str, response: str) -> None:
+        key = cache_key(model, generation_config, prompt)
+        record = {"model": model, "generationConfig": generation_config or {}, "prompt": prompt, "response": response}
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp = f"{self._path(key)}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(record, f, indent=2, ensure_ascii=False)
+            os.replace(tmp, self._path(key))
+
+
+class FixtureProvider:
+    """Wraps the function that actually calls Gemini, per PROVIDER_MODE.
+
+    live passes calls through, record passes them through and saves the
+    text, replay never calls upstream and raises a non-retryable
+    ProviderError for prompts that were not recorded.
+    """
+
+    def __init__(self, mode: str, store: FixtureStore):
+        if mode not in ("live", "record", "replay"):
+            raise RuntimeError(f"Unknown LLM_PROVIDER_MODE {mode!r} (expected live, record or replay)")
+        self.mode = mode
+        self.store = store
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    def replay(self, model: str, generation_config: dict, prompt: str) -> str:
+        text = self.store.get(model, generation_config, prompt)
+        if text is None:
+            raise ProviderError(
+                f"No recorded {model} response for prompt {cache_key(model, generation_config, prompt)[:12]}"
+                f" in {self.store.directory}",
+                status=404,
+            )
+        return text
+
+    def record(self, model: str, generation_config: dict, prompt: str, text: str) -> None:
+        if self.mode == "record":
+            self.store.put(model, generation_config, prompt, text)
+
+    def call(self, model: str, generation_config: dict, prompt: str, fn) -> str:
+        if self.replaying:
+            return self.replay(model, generation_config, prompt)
+        text = fn()
+        self.record(model, generation_config, prompt, text)
+        return text
+
+    async def acall(self, model: str, generation_config: dict, prompt: str, fn) -> str:
+        if self.replaying:
+            return self.replay(model, generation_config, prompt)
+        text = await fn()
+        self.record(model, generation_config, prompt, text)
+        return text
+
+
+fixtures = FixtureProvider(PROVIDER_MODE, FixtureStore(FIXTURES_DIR))
@@ -1,28 +1,335 @@
 """Gemini client"""
 
-import requests
-from providers.config import GEMINI_API_KEY
+import asyncio
+import json
+import time
+import httpx
+from providers import cache
+from providers.breaker import breakers
+from providers.config import (
+    GEMINI_API_KEY, GEMINI_API_ENDPOINT, MISSING_KEY_MESSAGE, REQUEST_TIMEOUT_SECONDS, CONTEXT_CACHE_MODE,
+)
+from providers.context_cache import LocalContextStore, prefix_cache
+from providers.errors import CircuitOpenError, ProviderError, parse_retry_after
+from providers.fixtures import fixtures
+from providers.hedging import hedging
+from providers.ledger import ledger, note
+from providers.limiter import outbound
+from providers.prompts import token_usage
+from providers.router import model_router, passes
+from providers.singleflight import AsyncSingleFlight
 
 
 class GeminiClient:
+    # Also acts as the remote backend for prefix_cache (see create_cached_content)
+    remote = True
+
     def __init__(self):
         self.api_key = GEMINI_API_KEY
-        self.url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-pro:generateContent"
+        self.api_root = f"{GEMINI_API_ENDPOINT}/v1beta"
+        self.base_url = f"{self.api_root}/models"
+        self.generation_config = {"temperature": 0.1, "responseMimeType": "application/json"}
+        # Keep-alive pool, opened on first use and reused
+        self._async_session = None
+        # Identical prompts already in flight share one upstream call
+        self._async_flights = AsyncSingleFlight()
+        # Where fixed prompt prefixes are cached: Gemini itself, an offline stand-in, or nowhere
+        self._context_backend = {"gemini": self, "local": LocalContextStore()}.get(CONTEXT_CACHE_MODE)
+
+    def _url(self, model: str, method: str = "generateContent") -> str:
+        return f"{self.base_url}/{model}:{method}"
 
-    def generate(self, prompt: str) -> str:
-        """Generate content"""
+    def _payload(self, prompt: str, cached_content: str = None) -> dict:
         payload = {
             "contents": [{"parts": [{"text": prompt}]}],
-            "generationConfig": {"temperature": 0.1, "responseMimeType": "application/json"}
+            "generationConfig": self.generation_config
         }
+        if cached_content:
+            payload["cachedContent"] = cached_content
+        return payload
+
+    async def _apayload(self, model: str, prompt: str, call_site: str, cached_prefix: str = None) -> dict:
+        """Request body, referencing a provider-cached prefix instead of resending it when possible"""
+        backend = self._context_backend
+        if not cached_prefix or backend is None or not prompt.startswith(cached_prefix):
+            return self._payload(prompt)
+        name = await prefix_cache.handle(backend, call_site, model, cached_prefix)
+        if name is None:
+            return self._payload(prompt)
+        suffix = prompt[len(cached_prefix):]
+        if not backend.remote:
+            return self._payload(backend.text(name) + suffix)
+        return self._payload(suffix, cached_content=name)
+
+    # cachedContents lifecycle, used by prefix_cache when CONTEXT_CACHE_MODE is "gemini"
+    async def create_cached_content(self, model: str, text: str, ttl: int) -> str:
+        await self.start()
+        try:
+            response = await self._async_session.post(f"{self.api_root}/cachedContents", json={
+                "model": f"models/{model}",
+                "systemInstruction": {"parts": [{"text": text}]},
+                "ttl": f"{ttl}s",
+            })
+        except httpx.TransportError as e:
+            raise ProviderError(f"Gemini request failed: {e}", transient=True) from e
+        self._check(response.status_code, response.headers, response.text)
+        return response.json()["name"]
 
-        response = requests.post(
-            self.url,
-            headers={"x-goog-api-key": self.api_key},
-            json=payload
+    async def refresh_cached_content(self, name: str, ttl: int) -> None:
+        await self.start()
+        try:
+            response = await self._async_session.patch(
+                f"{self.api_root}/{name}", params={"updateMask": "ttl"}, json={"ttl": f"{ttl}s"}
+            )
+        except httpx.TransportError as e:
+            raise ProviderError(f"Gemini request failed: {e}", transient=True) from e
+        self._check(response.status_code, response.headers, response.text)
+
+    async def delete_cached_content(self, name: str) -> None:
+        await self.start()
+        try:
+            response = await self._async_session.delete(f"{self.api_root}/{name}")
+        except httpx.TransportError as e:
+            raise ProviderError(f"Gemini request failed: {e}", transient=True) from e
+        self._check(response.status_code, response.headers, response.text)
+
+    @staticmethod
+    def _text(data: dict) -> str:
+        try:
+            return data["candidates"][0]["content"]["parts"][0]["text"]
+        except (KeyError, IndexError):
+            reason = data.get("promptFeedback", {}).get("blockReason", "no candidates returned")
+            raise ProviderError(f"Gemini returned no text: {reason}")
+
+    @staticmethod
+    def _check(status: int, headers, body: str) -> None:
+        """Turn a non-200 Gemini response into a ProviderError"""
+        if status == 200:
+            return
+        raise ProviderError(
+            f"Gemini HTTP {status}: {body[:200]}",
+            status=status,
+            retry_after=parse_retry_after(headers.get("retry-after")),
         )
 
-        return response.json()["candidates"][0]["content"]["parts"][0]["text"]
+    @staticmethod
+    def _chunk_text(data: dict) -> str:
+        """Text carried by one streamed chunk (may be empty, e.g. the final usage chunk)"""
+        candidates = data.get("candidates") or [{}]
+        parts = candidates[0].get("content", {}).get("parts", [])
+        return "".join(part.get("text", "") for part in parts)
+
+    def _require_key(self) -> str:
+        if not self.api_key:
+            raise ProviderError(MISSING_KEY_MESSAGE)
+        return self.api_key
+
+    async def start(self) -> None:
+        """Open the pooled HTTP/2 session (called from the app lifespan)"""
+        if self._async_session is None:
+            self._async_session = httpx.AsyncClient(
+                http2=True,
+                headers={"x-goog-api-key": self._require_key()},
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+                timeout=httpx.Timeout(REQUEST_TIMEOUT_SECONDS, connect=10.0),
+            )
+
+    async def warm(self, models: list, probe: bool = False) -> dict:
+        """Open the keep-alive pool before the first user request; returns seconds per step.
+
+        models.get is metadata only (no tokens); probe adds a 1-token
+        generateContent per model so the serving path itself is exercised.
+        """
+        timings = {}
+        await self.start()
+        for model in models:
+            started = time.monotonic()
+            try:
+                response = await self._async_session.get(f"{self.base_url}/{model}")
+            except httpx.TransportError as e:
+                raise ProviderError(f"Gemini request failed: {e}", transient=True) from e
+            self._check(response.status_code, response.headers, response.text)
+            timings[f"http2:{model}"] = round(time.monotonic() - started, 3)
+
+            if probe:
+                started = time.monotonic()
+                try:
+                    response = await self._async_session.post(self._url(model), json={
+                        "contents": [{"parts": [{"text": "ping"}]}],
+                        "generationConfig": {"maxOutputTokens": 1},
+                    })
+                except httpx.TransportError as e:
+                    raise ProviderError(f"Gemini request failed: {e}", transient=True) from e
+                self._check(response.status_code, response.headers, response.text)
+                timings[f"probe:{model}"] = round(time.monotonic() - started, 3)
+        return timings
+
+    async def aclose(self) -> None:
+        """Close the pooled session"""
+        if self._async_session is not None:
+            await self._async_session.aclose()
+            self._async_session = None
+
+    def _lookup(self, model: str, prompt: str, call_site: str, use_cache: bool, fingerprint: str):
+        if not use_cache:
+            return cache.cache_key(model, self.generation_config, prompt), None
+        return cache.lookup(call_site, model, self.generation_config, prompt, fingerprint)
+
+    def _store(self, model: str, key: str, prompt: str, text: str, call_site: str, use_cache: bool,
+               fingerprint: str) -> None:
+        if use_cache:
+            cache.store(call_site, key, model, self.generation_config, prompt, text, fingerprint)
+
+    @staticmethod
+    def _stale(key: str, call_site: str, use_cache: bool, error: CircuitOpenError) -> str:
+        """Last good answer for key while the circuit is open, else re-raise"""
+        stale = cache.stale(call_site, key) if use_cache else None
+        if stale is None:
+            raise error
+        return stale
+
+    async def _apost(self, model: str, prompt: str, call_site: str = "default", cached_prefix: str = None) -> str:
+        # Outside the app lifespan (scripts, tests) open the session on demand
+        await self.start()
+        payload = await self._apayload(model, prompt, call_site, cached_prefix)
+        try:
+            response = await self._async_session.post(self._url(model), json=payload)
+        except httpx.TransportError as e:
+            raise ProviderError(f"Gemini request failed: {e}", transient=True) from e
+
+        self._check(response.status_code, response.headers, response.text)
+        data = response.json()
+        token_usage.record_metadata(call_site, data.get("usageMetadata"))
+        return self._text(data)
+
+    async def _agenerate_on(self, model, prompt, call_site, use_cache, fingerprint, validate, cached_prefix=None):
+        """One model's answer via cache, single-flight, hedging and the limiter; None if it fails validate"""
+        note(model=model)
+        # SQLite and the near-duplicate scan run in a thread, off the event loop
+        key, cached = await asyncio.to_thread(self._lookup, model, prompt, call_site, use_cache, fingerprint)
+        if cached is not None:
+            return cached
+
+        breaker = breakers.get(model)
+
+        async def fetch():
+            text = await fixtures.acall(model, self.generation_config, prompt, lambda: hedging.acall(
+                call_site, lambda: outbound.acall(lambda: breaker.acall(
+                    lambda: self._apost(model, prompt, call_site, cached_prefix)
+                ), call_site)
+            ))
+            if validate is not None and not passes(validate, text):
+                return None
+            await asyncio.to_thread(self._store, model, key, prompt, text, call_site, use_cache, fingerprint)
+            return text
+
+        try:
+            if not fixtures.replaying:
+                breaker.check()
+            return await self._async_flights.do(key, fetch)
+        except CircuitOpenError as e:
+            return await asyncio.to_thread(self._stale, key, call_site, use_cache, e)
+
+    async def agenerate(self, prompt: str, call_site: str = "default", use_cache: bool = True,
+                        fingerprint: str = None, model: str = None, validate=None,
+                        cached_prefix: str = None) -> str:
+        """Generate content without blocking the event loop
+
+        The model is picked by the router unless given. validate(text) may
+        reject a fast-tier answer (return False or raise); the call is then
+        repeated once on the strong tier.
+
+        cached_prefix is a fixed leading part of prompt (e.g. a system
+        prompt) that may be cached provider-side and referenced by name.
+        """
+        with ledger.track(call_site, prompt):
+            model = model or model_router.route(call_site, prompt)
+            check = validate if model_router.can_escalate(model) else None
+            text = await self._agenerate_on(model, prompt, call_site, use_cache, fingerprint, check, cached_prefix)
+            if text is None:
+                model_router.escalated(call_site)
+                text = await self._agenerate_on(
+                    model_router.strong, prompt, call_site, use_cache, fingerprint, None, cached_prefix
+                )
+            return text
+
+    async def astream(self, prompt: str, call_site: str = "default", use_cache: bool = True,
+                      fingerprint: str = None, model: str = None, cached_prefix: str = None):
+        """Yield text chunks as Gemini produces them (server-sent events)
+
+        Routed like agenerate, but without escalation: chunks already sent
+        can't be taken back.
+        """
+        with ledger.track(call_site, prompt) as record:
+            async for chunk in self._astream(prompt, call_site, use_cache, fingerprint, model, cached_prefix, record):
+                yield chunk
+
+    async def _astream(self, prompt, call_site, use_cache, fingerprint, model, cached_prefix, record):
+        # Chunks may be pulled from different tasks (deadline.run wraps __anext__ in wait_for),
+        # so the ledger record is filled in directly rather than through its ContextVar
+        model = model or model_router.route(call_site, prompt)
+        note(record, model=model)
+        key, cached = await asyncio.to_thread(self._lookup, model, prompt, call_site, use_cache, fingerprint)
+        if cached is not None:
+            yield cached
+            return
+        if fixtures.replaying:
+            text = fixtures.replay(model, self.generation_config, prompt)
+            await asyncio.to_thread(self._store, model, key, prompt, text, call_site, use_cache, fingerprint)
+            yield text
+            return
+
+        chunks = []
+        usage = None
+        await self.start()
+        payload = await self._apayload(model, prompt, call_site, cached_prefix)
+        breaker = breakers.get(model, "streamGenerateContent")
+        try:
+            breaker.admit()
+        except CircuitOpenError as e:
+            yield await asyncio.to_thread(self._stale, key, call_site, use_cache, e)
+            return
+
+        started = time.monotonic()
+        opened = False
+        try:
+            async with outbound.aslot(call_site, record):
+                async with self._async_session.stream(
+                    "POST", self._url(model, "streamGenerateContent"), params={"alt": "sse"}, json=payload
+                ) as response:
+                    if response.status_code != 200:
+                        body = (await response.aread()).decode("utf-8", "replace")
+                        self._check(response.status_code, response.headers, body)
+                    # Only opening the stream counts for the breaker; generation time is the model's
+                    breaker.record(time.monotonic() - started, failed=False)
+                    opened = True
+                    async for line in response.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        data = json.loads(line[len("data:"):])
+                        # Each chunk carries the running totals; the last one is final
+                        usage = data.get("usageMetadata") or usage
+                        text = self._chunk_text(data)
+                        if text:
+                            chunks.append(text)
+                            yield text
+        except ProviderError as e:
+            if not opened:
+                breaker.record(time.monotonic() - started, failed=e.retryable)
+            raise
+        except httpx.TransportError as e:
+            if not opened:
+                breaker.record(time.monotonic() - started, failed=True)
+            raise ProviderError(f"Gemini request failed: {e}", transient=True) from e
+        except BaseException:
+            if not opened:
+                breaker.abandon()
+            raise
 
+        token_usage.record_metadata(call_site, usage, record)
+        if chunks:
+            text = "".join(chunks)
+            fixtures.record(model, self.generation_config, prompt, text)
+            await asyncio.to_thread(self._store, model, key, prompt, text, call_site, use_cache, fingerprint)
 
-gemini_client = GeminiClient()
\ No newline at end of file
+gemini_client = GeminiClient()
@@ -0,0 +1,148 @@
+"""Hedged requests: duplicate a slow call after its call site's rolling p90"""
+
+import asyncio
+import contextvars
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from providers.config import HEDGE_BUDGETS, HEDGE_PERCENTILE, HEDGE_MIN_SAMPLES
+
+
+class LatencyWindow:
+    """Last N successful call latencies for one call site"""
+
+    def __init__(self, size: int = 200):
+        self.samples = deque(maxlen=size)
+
+    def add(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def percentile(self, q: float):
+        if len(self.samples) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class HedgePolicy:
+    """Per-call-site hedging, capped at HEDGE_BUDGETS[site] of that site's calls.
+
+    Until a site has HEDGE_MIN_SAMPLES latencies there is no learned delay
+    and calls are never hedged.
+    """
+
+    def __init__(self, budgets: dict, percentile: float):
+        self.budgets = budgets
+        self.percentile = percentile
+        self._windows = defaultdict(LatencyWindow)
+        self._counts = defaultdict(Counter)
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _delay(self, call_site: str):
+        """Seconds to wait before hedging this call, or None to not hedge it"""
+        if self.budgets.get(call_site, 0) <= 0:
+            return None
+        with self._lock:
+            self._counts[call_site]["calls"] += 1
+            return self._windows[call_site].percentile(self.percentile)
+
+    def _take_budget(self, call_site: str) -> bool:
+        with self._lock:
+            counts = self._counts[call_site]
+            if counts["hedges"] + 1 > self.budgets[call_site] * counts["calls"]:
+                return False
+            counts["hedges"] += 1
+            return True
+
+    def _observe(self, call_site: str, seconds: float, hedge_won: bool = False) -> None:
+        with self._lock:
+            self._windows[call_site].add(seconds)
+            if hedge_won:
+                self._counts[call_site]["hedge_wins"] += 1
+
+    async def acall(self, call_site: str, fn):
+        """Await fn(); if it is slower than the learned delay, race a second fn()"""
+        delay = self._delay(call_site)
+        started = time.monotonic()
+        if delay is None:
+            result = await fn()
+            self._observe(call_site, time.monotonic() - started)
+            return result
+
+        primary = asyncio.ensure_future(fn())
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done or not self._take_budget(call_site):
+            result = await primary
+            self._observe(call_site, time.monotonic() - started)
+            return result
+
+        hedge_started = time.monotonic()
+        hedge = asyncio.ensure_future(fn())
+        pending = {primary, hedge}
+        try:
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                succeeded = [task for task in done if task.exception() is None]
+                # A failed attempt only loses if the other one can still succeed
+                if not succeeded and pending:
+                    continue
+                winner = succeeded[0] if succeeded else done.pop()
+                result = winner.result()
+                hedge_won = winner is hedge
+                self._observe(call_site, time.monotonic() - (hedge_started if hedge_won else started), hedge_won)
+                return result
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def call(self, call_site: str, fn):
+        """Blocking variant for the genai helpers; a losing thread finishes in the background"""
+        delay = self._delay(call_site)
+        started = time.monotonic()
+        if delay is None:
+            result = fn()
+            self._observe(call_site, time.monotonic() - started)
+            return result
+
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="hedge")
+        # Attempts run in a copy of the caller's context so they add to its ledger record
+        primary = self._executor.submit(contextvars.copy_context().run, fn)
+        done, _ = wait([primary], timeout=delay)
+        if done or not self._take_budget(call_site):
+            result = primary.result()
+            self._observe(call_site, time.monotonic() - started)
+            return result
+
+        hedge_started = time.monotonic()
+        hedge = self._executor.submit(contextvars.copy_context().run, fn)
+        pending = {primary, hedge}
+        while True:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            succeeded = [future for future in done if future.exception() is None]
+            if not succeeded and pending:
+                continue
+            winner = succeeded[0] if succeeded else done.pop()
+            result = winner.result()
+            hedge_won = winner is hedge
+            self._observe(call_site, time.monotonic() - (hedge_started if hedge_won else started), hedge_won)
+            for future in pending:
+                future.cancel()
+            return result
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                site: {
+                    **dict(self._counts[site]),
+                    "budget": budget,
+                    "delay": self._windows[site].percentile(self.percentile),
+                }
+                for site, budget in self.budgets.items() if budget > 0
+            }
+
+
+hedging = HedgePolicy(HEDGE_BUDGETS, HEDGE_PERCENTILE)
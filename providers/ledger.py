@@ -0,0 +1,259 @@
+"""Append-only ledger of LLM calls, one fixed-size binary record per call
+
+Each client entry point (GeminiClient.agenerate / astream and the
+genai helpers behind gemini_list_items / gemini_generate_text) runs inside
+track(), which opens a record that the layers below fill in: the cache sets
+the outcome, the limiter the queue wait and upstream latency, token
+accounting the counts. The record is appended when the call returns or
+raises. A stream can be resumed from other tasks, which don't see the
+ContextVar, so astream hands its record to the layers explicitly.
+
+Summarize the ledger (and its rotated files) offline:
+
+    python -m providers.ledger --by call_site
+"""
+
+import argparse
+import contextvars
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from providers.config import LEDGER_ENABLED, LEDGER_PATH, LEDGER_MAX_BYTES, LEDGER_KEEP
+from providers.errors import ProviderError
+from providers.telemetry import llm_errors
+
+MAGIC = b"LLMCALL1"
+HEADER = struct.Struct("<8sI")  # magic, record size
+# time, call_site, model, prompt hash, prompt/output/cached tokens,
+# queue wait / upstream / total milliseconds, cache outcome, error class
+RECORD = struct.Struct("<d16s32s8sIIIfffBBxx")
+
+CACHE_OUTCOMES = ["bypass", "miss", "hit", "near_hit", "stale_hit", "batched"]
+ERROR_CLASSES = ["", "client", "overloaded", "server", "transport", "circuit_open", "cancelled", "other"]
+
+
+def error_class(error: BaseException) -> str:
+    if not isinstance(error, ProviderError):
+        return "other" if isinstance(error, Exception) else "cancelled"
+    if error.circuit_open:
+        return "circuit_open"
+    if error.overloaded:
+        return "overloaded"
+    if error.status and error.status >= 500:
+        return "server"
+    if error.status:
+        return "client"
+    return "transport" if error.transient else "other"
+
+
+class CallRecord:
+    """What one call cost, filled in as it passes through the provider layers"""
+
+    __slots__ = ("call_site", "model", "prompt_hash", "prompt_tokens", "output_tokens", "cached_tokens",
+                 "queue_wait", "upstream", "cache", "error")
+
+    def __init__(self, call_site: str, prompt: str):
+        self.call_site = call_site
+        self.model = ""
+        self.prompt_hash = hashlib.sha256(prompt.encode("utf-8")).digest()[:8]
+        self.prompt_tokens = self.output_tokens = self.cached_tokens = 0
+        self.queue_wait = self.upstream = 0.0
+        self.cache = "bypass"
+        self.error = ""
+
+    def pack(self, started: float, seconds: float) -> bytes:
+        return RECORD.pack(
+            started, self.call_site.encode("utf-8")[:16], self.model.encode("utf-8")[:32], self.prompt_hash,
+            self.prompt_tokens, self.output_tokens, self.cached_tokens,
+            self.queue_wait * 1000, self.upstream * 1000, seconds * 1000,
+            CACHE_OUTCOMES.index(self.cache), ERROR_CLASSES.index(self.error),
+        )
+
+
+_current = contextvars.ContextVar("llm_call", default=None)
+
+
+def note(record: CallRecord = None, **fields) -> None:
+    """Set fields on record, or on the current one (no-op outside track())"""
+    record = record or _current.get()
+    if record is not None:
+        for name, value in fields.items():
+            setattr(record, name, value)
+
+
+def add_tokens(prompt_tokens: int, output_tokens: int, cached_tokens: int = 0, record: CallRecord = None) -> None:
+    record = record or _current.get()
+    if record is not None:
+        record.prompt_tokens += prompt_tokens or 0
+        record.output_tokens += output_tokens or 0
+        record.cached_tokens += cached_tokens or 0
+
+
+def add_queue_wait(seconds: float, record: CallRecord = None) -> None:
+    record = record or _current.get()
+    if record is not None:
+        record.queue_wait += seconds
+
+
+class Ledger:
+    """Appends packed records to path, rotating to path.1 .. path.<keep> at max_bytes.
+
+    Each process appends whole records with O_APPEND, so workers sharing
+    the file don't interleave; rotation between processes is best-effort.
+    """
+
+    def __init__(self, path: str, max_bytes: int, keep: int, enabled: bool = True):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.keep = keep
+        self.enabled = enabled
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def track(self, call_site: str, prompt: str):
+        """Open a record for one call and append it when the call ends"""
+        record = CallRecord(call_site, prompt)
+        previous = _current.get()
+        # set() rather than a reset token: an async generator may be closed from another context
+        _current.set(record)
+        started, clock = time.time(), time.monotonic()
+        try:
+            yield record
+        except BaseException as e:
+            record.error = error_class(e)
+            llm_errors.inc(call_site=call_site, error=record.error)
+            raise
+        finally:
+            _current.set(previous)
+            if self.enabled:
+                self.append(record.pack(started, time.monotonic() - clock))
+
+    def _rotate(self) -> None:
+        for index in range(self.keep - 1, 0, -1):
+            older = f"{self.path}.{index}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{index + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+    def append(self, packed: bytes) -> None:
+        with self._lock:
+            try:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+                if size >= self.max_bytes:
+                    self._rotate()
+                    size = 0
+                fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    os.write(fd, packed if size else HEADER.pack(MAGIC, RECORD.size) + packed)
+                finally:
+                    os.close(fd)
+            except OSError as e:
+                print(f"LLM ledger write failed: {e}")
+
+
+ledger = Ledger(LEDGER_PATH, LEDGER_MAX_BYTES, LEDGER_KEEP, enabled=LEDGER_ENABLED)
+
+
+def read(path: str):
+    """Yield record dicts from one ledger file, memory-mapped"""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size <= HEADER.size:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            magic, record_size = HEADER.unpack_from(view)
+            if magic != MAGIC or record_size != RECORD.size:
+                raise ValueError(f"{path} is not a ledger in this format")
+            # A record being appended right now may be cut short; skip it
+            end = HEADER.size + (len(view) - HEADER.size) // RECORD.size * RECORD.size
+            with memoryview(view)[HEADER.size:end] as body:
+                for (started, call_site, model, prompt_hash, prompt_tokens, output_tokens, cached_tokens,
+                     queue_ms, upstream_ms, total_ms, cache, error) in RECORD.iter_unpack(body):
+                    yield {
+                        "time": started,
+                        "call_site": call_site.rstrip(b"\0").decode("utf-8", "replace"),
+                        "model": model.rstrip(b"\0").decode("utf-8", "replace"),
+                        "prompt_hash": prompt_hash.hex(),
+                        "prompt_tokens": prompt_tokens,
+                        "output_tokens": output_tokens,
+                        "cached_tokens": cached_tokens,
+                        "queue_ms": queue_ms,
+                        "upstream_ms": upstream_ms,
+                        "total_ms": total_ms,
+                        "cache": CACHE_OUTCOMES[cache],
+                        "error": ERROR_CLASSES[error],
+                    }
+
+
+def ledger_files(path: str, keep: int) -> list:
+    """The live file and its rotations, oldest first"""
+    candidates = [f"{path}.{index}" for index in range(keep, 0, -1)] + [path]
+    return [candidate for candidate in candidates if os.path.exists(candidate)]
+
+
+def _percentile(ordered: list, q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+def summarize(records, by: str) -> dict:
+    groups = {}
+    for record in records:
+        groups.setdefault(record[by] or "-", []).append(record)
+    summary = {}
+    for name, group in groups.items():
+        total = sorted(r["total_ms"] for r in group)
+        upstream = sorted(r["upstream_ms"] for r in group if r["cache"] in ("miss", "bypass", "batched"))
+        queue = sorted(r["queue_ms"] for r in group)
+        cached = sum(1 for r in group if r["cache"] in ("hit", "near_hit", "stale_hit"))
+        summary[name] = {
+            "calls": len(group),
+            "p50_ms": _percentile(total, 0.5),
+            "p95_ms": _percentile(total, 0.95),
+            "p99_ms": _percentile(total, 0.99),
+            "upstream_p95_ms": _percentile(upstream, 0.95),
+            "queue_p95_ms": _percentile(queue, 0.95),
+            "prompt_tokens": sum(r["prompt_tokens"] for r in group),
+            "output_tokens": sum(r["output_tokens"] for r in group),
+            "cached_tokens": sum(r["cached_tokens"] for r in group),
+            "cache_hit_rate": cached / len(group),
+            "errors": sum(1 for r in group if r["error"]),
+        }
+    return summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Summarize the LLM call ledger")
+    parser.add_argument("paths", nargs="*", help=f"ledger files (default: {LEDGER_PATH} and its rotations)")
+    parser.add_argument("--by", choices=["call_site", "model", "cache", "error"], default="call_site")
+    parser.add_argument("--since", type=float, help="only calls in the last N hours")
+    args = parser.parse_args()
+
+    paths = args.paths or ledger_files(LEDGER_PATH, LEDGER_KEEP)
+    if not paths:
+        print(f"No ledger at {LEDGER_PATH}")
+        return
+    records = (record for path in paths for record in read(path))
+    if args.since is not None:
+        cutoff = time.time() - args.since * 3600
+        records = (record for record in records if record["time"] >= cutoff)
+    summary = summarize(records, args.by)
+
+    print(f"{args.by:<18} {'calls':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'up p95':>8} {'queue p95':>9}"
+          f" {'in tok':>9} {'out tok':>9} {'cached':>8} {'hit %':>6} {'errors':>6}")
+    ordered = sorted(summary.items(), key=lambda item: item[1]["prompt_tokens"] + item[1]["output_tokens"],
+                     reverse=True)
+    for name, row in ordered:
+        print(f"{name[:18]:<18} {row['calls']:>6} {row['p50_ms']:>8.0f} {row['p95_ms']:>8.0f} {row['p99_ms']:>8.0f}"
+              f" {row['upstream_p95_ms']:>8.0f} {row['queue_p95_ms']:>9.0f} {row['prompt_tokens']:>9}"
+              f" {row['output_tokens']:>9} {row['cached_tokens']:>8} {row['cache_hit_rate'] * 100:>5.0f}%"
+              f" {row['errors']:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+"""Adaptive outbound limiter for Gemini: token bucket + AIMD concurrency + retries"""
+
+import asyncio
+import random
+import threading
+import time
+from collections import Counter, deque
+from contextlib import asynccontextmanager
+from providers.config import (
+    RATE_LIMIT_PER_SEC, RATE_LIMIT_BURST, CONCURRENCY_INITIAL, CONCURRENCY_MIN,
+    CONCURRENCY_MAX, MAX_RETRIES, RETRY_BUDGET_RATIO,
+    PRIORITY_CLASSES, CALL_SITE_CLASSES, DEFAULT_PRIORITY_CLASS, RESERVED_SLOTS,
+)
+from providers.errors import ProviderError
+from providers.ledger import add_queue_wait, note
+
+
+class TokenBucket:
+    """Request-rate limit. reserve() books the next token and says how long to wait for it."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            delay = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+            return max(delay, self.paused_until - now)
+
+    def pause(self, seconds: float) -> None:
+        """Hold every caller back, e.g. for a server-sent Retry-After"""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class RetryBudget:
+    """Retries may be at most `ratio` of first attempts, so retries can't amplify an overload"""
+
+    def __init__(self, ratio: float, cap: float = 10.0):
+        self.ratio = ratio
+        self.cap = cap
+        self.balance = cap
+        self._lock = threading.Lock()
+
+    def deposit(self) -> None:
+        with self._lock:
+            self.balance = min(self.cap, self.balance + self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            if self.balance < 1:
+                return False
+            self.balance -= 1
+            return True
+
+
+class _Waiter:
+    def __init__(self, loop=None):
+        self.granted = False
+        self.enqueued_at = time.monotonic()
+        self.loop = loop
+        if loop is None:
+            self.event = threading.Event()
+        else:
+            self.future = loop.create_future()
+
+    def wake(self) -> None:
+        self.granted = True
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self) -> None:
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class _QueueWaits:
+    """Recent queue waits for one priority class"""
+
+    def __init__(self, size: int = 500):
+        self.samples = deque(maxlen=size)
+        self.total = 0
+
+    def add(self, seconds: float) -> None:
+        self.samples.append(seconds)
+        self.total += 1
+
+    def snapshot(self) -> dict:
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {"calls": self.total}
+        return {
+            "calls": self.total,
+            "wait_p50": round(ordered[len(ordered) // 2], 3),
+            "wait_p95": round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))], 3),
+            "wait_max": round(ordered[-1], 3),
+        }
+
+
+class AdaptiveLimiter:
+    """Concurrency limit that grows additively on success and halves on 429 (AIMD).
+
+    Callers from worker threads (acquire) and the event loop (aacquire)
+    share per-class FIFO queues. Freed slots go to the highest-priority
+    class with waiters, and a class may not use the slots reserved for
+    classes above it, so a burst of low-priority calls can't take the
+    whole limit.
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int, classes: list, reserved: dict = None,
+                 decrease_cooldown: float = 1.0):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.classes = list(classes)
+        self.reserved = reserved or {}
+        self.decrease_cooldown = decrease_cooldown
+        self.in_flight = 0
+        self._in_flight_by = Counter()
+        self._last_decrease = 0.0
+        self._waiters = {cls: deque() for cls in self.classes}
+        self._waits = {cls: _QueueWaits() for cls in self.classes}
+        self._lock = threading.Lock()
+
+    def _capacity(self, cls: str) -> int:
+        """Slots cls may fill: the limit minus what is reserved for higher classes (never below one)"""
+        higher = self.classes[:self.classes.index(cls)]
+        return max(1, int(self.limit) - sum(self.reserved.get(c, 0) for c in higher))
+
+    def _take(self, cls: str, waited: float) -> None:
+        self.in_flight += 1
+        self._in_flight_by[cls] += 1
+        self._waits[cls].add(waited)
+
+    def _try_take(self, cls: str) -> bool:
+        ahead = self.classes[:self.classes.index(cls) + 1]
+        if any(self._waiters[c] for c in ahead) or self.in_flight >= self._capacity(cls):
+            return False
+        self._take(cls, 0.0)
+        return True
+
+    def _grant(self) -> None:
+        now = time.monotonic()
+        for cls in self.classes:
+            waiters = self._waiters[cls]
+            while waiters and self.in_flight < self._capacity(cls):
+                waiter = waiters.popleft()
+                self._take(cls, now - waiter.enqueued_at)
+                waiter.wake()
+            if waiters:
+                # Strict priority: nothing below a class that is still waiting gets a slot
+                return
+
+    def acquire(self, cls: str) -> None:
+        with self._lock:
+            if self._try_take(cls):
+                return
+            waiter = _Waiter()
+            self._waiters[cls].append(waiter)
+        waiter.event.wait()
+
+    async def aacquire(self, cls: str) -> None:
+        with self._lock:
+            if self._try_take(cls):
+                return
+            waiter = _Waiter(asyncio.get_running_loop())
+            self._waiters[cls].append(waiter)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter.granted:
+                    self.in_flight -= 1
+                    self._in_flight_by[cls] -= 1
+                    self._grant()
+                else:
+                    self._waiters[cls].remove(waiter)
+            raise
+
+    def release(self, cls: str, overloaded: bool = False) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self._in_flight_by[cls] -= 1
+            now = time.monotonic()
+            if overloaded:
+                # Multiplicative decrease, at most once per cooldown so one burst of 429s counts once
+                if now - self._last_decrease >= self.decrease_cooldown:
+                    self.limit = max(self.minimum, self.limit / 2)
+                    self._last_decrease = now
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._grant()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "queue_depth": sum(len(waiters) for waiters in self._waiters.values()),
+                "classes": {
+                    cls: {
+                        "in_flight": self._in_flight_by[cls],
+                        "queue_depth": len(self._waiters[cls]),
+                        "capacity": self._capacity(cls),
+                        **self._waits[cls].snapshot(),
+                    }
+                    for cls in self.classes
+                },
+            }
+
+
+def backoff(attempt: int, retry_after: float = None, base: float = 0.5, cap: float = 30.0) -> float:
+    """Full-jitter exponential backoff, never shorter than the server's Retry-After"""
+    delay = random.uniform(0, min(cap, base * 2 ** attempt))
+    return max(delay, retry_after or 0.0)
+
+
+def priority_class(call_site: str) -> str:
+    return CALL_SITE_CLASSES.get(call_site, DEFAULT_PRIORITY_CLASS)
+
+
+class OutboundPolicy:
+    """Everything an outbound Gemini call goes through: rate, concurrency and retries
+
+    Each call names its call site, which picks its priority class. The
+    concurrency slot is taken before the rate token, so when both are
+    scarce the higher class is also first in line for the rate.
+    """
+
+    def __init__(self):
+        self.bucket = TokenBucket(RATE_LIMIT_PER_SEC, RATE_LIMIT_BURST)
+        self.limiter = AdaptiveLimiter(
+            CONCURRENCY_INITIAL, CONCURRENCY_MIN, CONCURRENCY_MAX, PRIORITY_CLASSES, RESERVED_SLOTS
+        )
+        self.retry_budget = RetryBudget(RETRY_BUDGET_RATIO)
+        self.max_retries = MAX_RETRIES
+
+    def _on_error(self, e: ProviderError, attempt: int):
+        """Record a failed attempt; return the delay before retrying, or None to give up"""
+        if e.overloaded and e.retry_after:
+            self.bucket.pause(e.retry_after)
+        if not e.retryable or attempt >= self.max_retries or not self.retry_budget.withdraw():
+            return None
+        return backoff(attempt, e.retry_after)
+
+    def call(self, fn, call_site: str = "default"):
+        """Run fn() (blocking) under the limits, retrying retryable ProviderErrors"""
+        cls = priority_class(call_site)
+        self.retry_budget.deposit()
+        attempt = 0
+        while True:
+            queued = time.monotonic()
+            self.limiter.acquire(cls)
+            time.sleep(self.bucket.reserve())
+            started = time.monotonic()
+            add_queue_wait(started - queued)
+            try:
+                result = fn()
+            except ProviderError as e:
+                note(upstream=time.monotonic() - started)
+                self.limiter.release(cls, overloaded=e.overloaded)
+                delay = self._on_error(e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                self.limiter.release(cls)
+                raise
+            note(upstream=time.monotonic() - started)
+            self.limiter.release(cls)
+            return result
+
+    async def acall(self, fn, call_site: str = "default"):
+        """Await fn() under the limits, retrying retryable ProviderErrors"""
+        cls = priority_class(call_site)
+        self.retry_budget.deposit()
+        attempt = 0
+        while True:
+            queued = time.monotonic()
+            await self.limiter.aacquire(cls)
+            try:
+                await asyncio.sleep(self.bucket.reserve())
+                started = time.monotonic()
+                add_queue_wait(started - queued)
+                result = await fn()
+            except ProviderError as e:
+                note(upstream=time.monotonic() - started)
+                self.limiter.release(cls, overloaded=e.overloaded)
+                delay = self._on_error(e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                self.limiter.release(cls)
+                raise
+            note(upstream=time.monotonic() - started)
+            self.limiter.release(cls)
+            return result
+
+    @asynccontextmanager
+    async def aslot(self, call_site: str = "default", record=None):
+        """Hold one slot for a streamed call (no retries once output has started)
+
+        Timings go to record when given: the slot may be released from a
+        task that doesn't see the caller's ledger record.
+        """
+        cls = priority_class(call_site)
+        queued = time.monotonic()
+        await self.limiter.aacquire(cls)
+        overloaded = False
+        started = None
+        try:
+            await asyncio.sleep(self.bucket.reserve())
+            started = time.monotonic()
+            add_queue_wait(started - queued, record)
+            yield
+        except ProviderError as e:
+            overloaded = e.overloaded
+            if overloaded and e.retry_after:
+                self.bucket.pause(e.retry_after)
+            raise
+        finally:
+            if started is not None:
+                note(record, upstream=time.monotonic() - started)
+            self.limiter.release(cls, overloaded=overloaded)
+
+    def snapshot(self) -> dict:
+        return {
+            **self.limiter.snapshot(),
+            "rate_per_sec": self.bucket.rate,
+            "paused_for": round(max(0.0, self.bucket.paused_until - time.monotonic()), 2),
+            "retry_budget": round(self.retry_budget.balance, 2),
+        }
+
+
+outbound = OutboundPolicy()
@@ -0,0 +1,83 @@
+"""Prompt building: whitespace compaction, template size budgets and token accounting"""
+
+import textwrap
+import threading
+from collections import Counter, defaultdict
+from providers.config import PROMPT_TOKEN_BUDGETS
+from providers.ledger import add_tokens
+
+# Paragraphs shorter than this are kept even when repeated (closing braces, "---", ...)
+MIN_DEDUP_CHARS = 40
+
+
+def compact(text: str) -> str:
+    """Normalize a prompt before it is sent.
+
+    Removes the indentation f-string templates inherit from the code,
+    trailing whitespace and runs of blank lines, and drops paragraphs
+    that repeat one already in the prompt.
+    """
+    lines = [line.rstrip() for line in textwrap.dedent(text).strip().splitlines()]
+    paragraphs, seen = [], set()
+    for block in "\n".join(lines).split("\n\n"):
+        block = block.strip("\n")
+        if not block or (len(block) >= MIN_DEDUP_CHARS and block in seen):
+            continue
+        seen.add(block)
+        paragraphs.append(block)
+    return "\n\n".join(paragraphs)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough Gemini token count (about 4 characters per token for English prose and code)"""
+    return (len(text) + 3) // 4
+
+
+def over_budget(templates: dict) -> dict:
+    """{name: (estimated tokens, budget)} for each rendered template above its budget"""
+    over = {}
+    for name, text in templates.items():
+        budget = PROMPT_TOKEN_BUDGETS.get(name)
+        tokens = estimate_tokens(text)
+        if budget is not None and tokens > budget:
+            over[name] = (tokens, budget)
+    return over
+
+
+class TokenUsage:
+    """Per-call-site input/output token totals from Gemini's usageMetadata"""
+
+    def __init__(self):
+        self._counts = defaultdict(Counter)
+        self._lock = threading.Lock()
+
+    def record(self, call_site: str, prompt_tokens: int, output_tokens: int, cached_tokens: int = 0,
+               record=None) -> None:
+        with self._lock:
+            counts = self._counts[call_site]
+            counts["calls"] += 1
+            counts["prompt_tokens"] += prompt_tokens or 0
+            counts["output_tokens"] += output_tokens or 0
+            counts["cached_tokens"] += cached_tokens or 0
+        add_tokens(prompt_tokens, output_tokens, cached_tokens, record)
+
+    def record_metadata(self, call_site: str, usage: dict, record=None) -> None:
+        """Record a REST usageMetadata object (no-op when the response has none)"""
+        if usage:
+            self.record(
+                call_site,
+                usage.get("promptTokenCount", 0),
+                usage.get("candidatesTokenCount", 0),
+                usage.get("cachedContentTokenCount", 0),
+                record,
+            )
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                site: {**counts, "avg_prompt_tokens": round(counts["prompt_tokens"] / counts["calls"])}
+                for site, counts in self._counts.items()
+            }
+
+
+token_usage = TokenUsage()
@@ -0,0 +1,55 @@
+"""Model-tier routing for provider calls"""
+
+import threading
+from collections import Counter, defaultdict
+from providers.config import MODEL_FAST, MODEL_STRONG, TASK_CLASSES, TASK_TIERS, FAST_MAX_PROMPT_CHARS
+
+
+class ModelRouter:
+    """Pick the model for a call from its task class and prompt size.
+
+    Call sites map to task classes (list, text, plan, code); each class
+    has a default tier. A call routed to the fast tier whose output fails
+    the caller's validation is re-run once on the strong tier.
+    """
+
+    def __init__(self, fast: str, strong: str, task_classes: dict, task_tiers: dict, fast_max_prompt_chars: int):
+        self.fast = fast
+        self.strong = strong
+        self.task_classes = task_classes
+        self.task_tiers = task_tiers
+        self.fast_max_prompt_chars = fast_max_prompt_chars
+        self._counts = defaultdict(Counter)
+        self._lock = threading.Lock()
+
+    def route(self, call_site: str, prompt: str) -> str:
+        task = self.task_classes.get(call_site, "code")
+        tier = self.task_tiers.get(task, "strong")
+        if tier == "fast" and len(prompt) > self.fast_max_prompt_chars:
+            tier = "strong"
+        model = self.fast if tier == "fast" else self.strong
+        with self._lock:
+            self._counts[call_site][model] += 1
+        return model
+
+    def can_escalate(self, model: str) -> bool:
+        return model != self.strong
+
+    def escalated(self, call_site: str) -> None:
+        with self._lock:
+            self._counts[call_site]["escalations"] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {site: dict(counts) for site, counts in self._counts.items()}
+
+
+def passes(validate, text: str) -> bool:
+    """Run a caller's output validator; raising counts as failing"""
+    try:
+        return validate(text) is not False
+    except Exception:
+        return False
+
+
+model_router = ModelRouter(MODEL_FAST, MODEL_STRONG, TASK_CLASSES, TASK_TIERS, FAST_MAX_PROMPT_CHARS)
@@ -0,0 +1,114 @@
+"""Near-duplicate prompt matching with local MinHash signatures"""
+
+import array
+import hashlib
+import random
+import re
+import time
+
+NUM_PERM = 64
+# Part of every near-duplicate context hash; bump when signature() changes so old rows stop matching
+SIGNATURE_VERSION = 3
+_PRIME = (1 << 61) - 1
+_rng = random.Random(0x5EED)
+_PERMS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+
+def normalize(text: str) -> list:
+    """Lowercase word tokens; drops whitespace and punctuation differences"""
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+
+def _token_hash(token: str) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def fingerprint_parts(fingerprint) -> list:
+    """A fingerprint is one varying string or a sequence of them (e.g. area, category, industry)"""
+    parts = [fingerprint] if isinstance(fingerprint, str) else list(fingerprint)
+    return [part for part in parts if part]
+
+
+def shingles(fingerprint) -> set:
+    """Words and adjacent word pairs of each part, tagged with the part's position.
+
+    Pairs are sorted, so reordering words within a part ("retail clothing",
+    "clothing retail") doesn't change the set, while pairs still separate
+    values that share words but combine them differently.
+    """
+    result = set()
+    for index, part in enumerate(fingerprint_parts(fingerprint)):
+        tokens = normalize(part)
+        result.update(f"{index}:{token}" for token in tokens)
+        result.update(f"{index}:" + " ".join(sorted(pair)) for pair in zip(tokens, tokens[1:]))
+    return result
+
+
+def signature(fingerprint) -> list:
+    """MinHash over the fingerprint's word shingles"""
+    hashes = [_token_hash(shingle) for shingle in shingles(fingerprint)] or [0]
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMS]
+
+
+def similarity(sig_a: list, sig_b: list) -> float:
+    """Estimated Jaccard similarity of the two shingle sets"""
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / NUM_PERM
+
+
+NEAR_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS near_responses ("
+    " id INTEGER PRIMARY KEY, call_site TEXT, context TEXT, signature BLOB,"
+    " response TEXT, expires_at REAL, accessed_at REAL)",
+    "CREATE INDEX IF NOT EXISTS near_responses_context ON near_responses (call_site, context)",
+)
+
+
+class NearDuplicateCache:
+    """Responses indexed by (call site, exact context) plus a MinHash of the varying text.
+
+    The context hash covers everything that must match exactly (model,
+    config, prompt template); only the fingerprinted text may differ.
+    Lives in the same SQLite file as the exact-match cache.
+    """
+
+    def __init__(self, conn_factory, max_entries: int):
+        # conn_factory returns a per-thread connection with NEAR_SCHEMA applied
+        self._conn = conn_factory
+        self.max_entries = max_entries
+
+    def get(self, call_site: str, context: str, text: str, threshold: float):
+        """Best stored response whose fingerprint is at least threshold similar, or None"""
+        conn = self._conn()
+        now = time.time()
+        rows = conn.execute(
+            "SELECT id, signature, response FROM near_responses"
+            " WHERE call_site = ? AND context = ? AND expires_at > ?",
+            (call_site, context, now),
+        ).fetchall()
+        if not rows:
+            return None
+        sig = signature(text)
+        best_id, best_response, best_score = None, None, threshold
+        for row_id, blob, response in rows:
+            score = similarity(sig, array.array("Q", blob))
+            if score >= best_score:
+                best_id, best_response, best_score = row_id, response, score
+        if best_id is not None:
+            conn.execute("UPDATE near_responses SET accessed_at = ? WHERE id = ?", (now, best_id))
+        return best_response
+
+    def set(self, call_site: str, context: str, text: str, response: str, ttl: int) -> None:
+        conn = self._conn()
+        now = time.time()
+        blob = array.array("Q", signature(text)).tobytes()
+        conn.execute(
+            "INSERT INTO near_responses (call_site, context, signature, response, expires_at, accessed_at)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (call_site, context, blob, response, now + ttl, now),
+        )
+        conn.execute("DELETE FROM near_responses WHERE expires_at <= ?", (now,))
+        conn.execute(
+            "DELETE FROM near_responses WHERE id IN (SELECT id FROM near_responses"
+            " ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
@@ -0,0 +1,220 @@
+"""Offline stand-in for the Gemini REST API, with latency, error and 429 injection
+
+Speaks enough of models.get, generateContent, streamGenerateContent
+(alt=sse) and cachedContents for the orchestrator and the genai REST transport. Answers
+are canned but shaped like what each agent expects, so /build runs end to
+end. Point the services at it with GEMINI_API_ENDPOINT:
+
+    python -m providers.stub_server --port 8089 --latency lognormal:0.2,0.6 --error-rate 0.02 \\
+        --burst-every 60 --burst-length 5
+    GEMINI_API_ENDPOINT=http://localhost:8089 GEMINI_API_KEY=stub python main.py
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import re
+import time
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+def latency_sampler(spec: str, rng: random.Random):
+    """Seconds-per-call sampler from "fixed:S", "uniform:LO,HI" or "lognormal:MEDIAN,SIGMA" """
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v]
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: rng.uniform(values[0], values[1])
+    if kind == "lognormal":
+        median, sigma = values
+        return lambda: median * rng.lognormvariate(0, sigma)
+    raise ValueError(f"Unknown latency distribution {spec!r}")
+
+
+class FaultPlan:
+    """Decides, per request, whether to delay, fail with 5xx or refuse with 429.
+
+    429s come in bursts: for burst_length seconds out of every burst_every
+    every request is refused with Retry-After, as a quota window would.
+    Outside bursts rate_429 and error_rate apply independently.
+    """
+
+    def __init__(self, latency: str, error_rate: float, rate_429: float, burst_every: float,
+                 burst_length: float, retry_after: float, seed: int = None):
+        self.rng = random.Random(seed)
+        self.latency = latency_sampler(latency, self.rng)
+        self.error_rate = error_rate
+        self.rate_429 = rate_429
+        self.burst_every = burst_every
+        self.burst_length = burst_length
+        self.retry_after = retry_after
+        self.started = time.monotonic()
+
+    def in_burst(self) -> bool:
+        if self.burst_every <= 0:
+            return False
+        return (time.monotonic() - self.started) % self.burst_every < self.burst_length
+
+    def fault(self):
+        """(status, headers) to fail this request with, or None to answer it"""
+        if self.in_burst() or self.rng.random() < self.rate_429:
+            return 429, {"Retry-After": str(int(self.retry_after))}
+        if self.rng.random() < self.error_rate:
+            return self.rng.choice((500, 503)), {}
+        return None
+
+
+def _numbered_items(prompt: str) -> str:
+    match = re.search(r"Return (\d+) items", prompt)
+    count = int(match.group(1)) if match else 3
+    return "\n".join(f"{i}. Stub idea number {i}" for i in range(1, count + 1))
+
+
+def canned_response(prompt: str) -> str:
+    """An answer of the shape the calling agent parses"""
+    if "Project Manager Agent" in prompt:
+        plan = {
+            "project_type": "frontend_only",
+            "frontend_engineer_prompt": {
+                "role": "Frontend Engineer",
+                "domain_description": "Stub project",
+                "project_context": "Generated by the offline Gemini stub",
+                "required_technologies": {"markup": "HTML5", "styling": "CSS3", "scripting": "JavaScript"},
+                "code_requirements": ["Single file"],
+                "core_deliverables": ["index.html"],
+                "api_integration_requirements": [],
+                "constraints": ["No external dependencies"],
+            },
+        }
+        # Requests that mention a server side get a full-stack plan, so both engineer agents run
+        if re.search(r"User Request:.*\b(api|backend|database|server)\b", prompt, re.IGNORECASE | re.DOTALL):
+            plan["project_type"] = "full_stack"
+            plan["backend_engineer_prompt"] = {
+                "role": "Backend Engineer",
+                "domain_description": "Stub project",
+                "project_context": "Generated by the offline Gemini stub",
+                "required_technologies": {"programming_language": "Python", "web_framework": "FastAPI"},
+                "code_requirements": ["REST API"],
+                "core_deliverables": ["main.py", "models.py"],
+                "integration_requirements": [],
+                "constraints": ["SQLite only"],
+            }
+        return json.dumps(plan)
+    if "You are a Backend Engineer" in prompt:
+        return "=== MAIN.PY ===\nfrom fastapi import FastAPI\n\napp = FastAPI()\n=== MODELS.PY ===\n"
+    if "You are a Frontend Engineer" in prompt:
+        return "<!DOCTYPE html>\n<html><head><title>Stub</title></head><body><h1>Stub</h1></body></html>"
+    if "Complete every task below independently" in prompt:
+        tasks = json.loads(prompt.split("Tasks:\n", 1)[1])
+        return json.dumps({"results": [
+            {"id": task["id"], "items": [f"Stub idea {i} for task {task['id']}" for i in range(1, task["count"] + 1)]}
+            for task in tasks
+        ]})
+    if "Return exactly the requested number of short items" in prompt:
+        return _numbered_items(prompt)
+    return "Stub response."
+
+
+def create_app(plan: FaultPlan) -> FastAPI:
+    app = FastAPI(title="Gemini stub")
+    cached_contents = {}
+    ids = itertools.count(1)
+    stats = {"requests": 0, "faults": 0}
+
+    def prompt_of(body: dict) -> str:
+        parts = [part.get("text", "") for content in body.get("contents", []) for part in content.get("parts", [])]
+        prefix = cached_contents.get(body.get("cachedContent"), "")
+        return prefix + "".join(parts)
+
+    @app.get("/v1beta/models/{model}")
+    async def get_model(model: str):
+        return {"name": f"models/{model}", "displayName": f"{model} (stub)", "inputTokenLimit": 1048576}
+
+    @app.post("/v1beta/models/{model_method}")
+    async def generate(model_method: str, request: Request):
+        model, _, method = model_method.partition(":")
+        stats["requests"] += 1
+        await asyncio.sleep(plan.latency())
+        fault = plan.fault()
+        if fault is not None:
+            stats["faults"] += 1
+            status, headers = fault
+            return JSONResponse(
+                {"error": {"code": status, "message": f"stub fault for {model}"}}, status_code=status, headers=headers
+            )
+
+        prompt = prompt_of(await request.json())
+        text = canned_response(prompt)
+        # Rough counts (4 characters per token) so token accounting has something to add up
+        usage = {"promptTokenCount": len(prompt) // 4, "candidatesTokenCount": len(text) // 4}
+        if method != "streamGenerateContent":
+            return {
+                "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP"}],
+                "usageMetadata": usage,
+            }
+
+        async def events():
+            pieces = [text[i:i + 64] for i in range(0, len(text), 64)]
+            for piece in pieces:
+                chunk = {
+                    "candidates": [{"content": {"role": "model", "parts": [{"text": piece}]}}],
+                    "usageMetadata": usage,
+                }
+                yield f"data: {json.dumps(chunk)}\r\n\r\n"
+                await asyncio.sleep(plan.latency() / len(pieces))
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/v1beta/cachedContents")
+    async def create_cached_content(request: Request):
+        body = await request.json()
+        name = f"cachedContents/stub-{next(ids)}"
+        cached_contents[name] = "".join(part.get("text", "") for part in body["systemInstruction"]["parts"])
+        return {"name": name, "model": body.get("model")}
+
+    @app.patch("/v1beta/cachedContents/{cache_id}")
+    async def refresh_cached_content(cache_id: str):
+        name = f"cachedContents/{cache_id}"
+        if name not in cached_contents:
+            return JSONResponse({"error": {"code": 404, "message": f"{name} not found"}}, status_code=404)
+        return {"name": name}
+
+    @app.delete("/v1beta/cachedContents/{cache_id}")
+    async def delete_cached_content(cache_id: str):
+        cached_contents.pop(f"cachedContents/{cache_id}", None)
+        return {}
+
+    @app.get("/stats")
+    async def get_stats():
+        return {**stats, "in_burst": plan.in_burst(), "cached_contents": len(cached_contents)}
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", default="fixed:0.05",
+                        help='"fixed:S", "uniform:LO,HI" or "lognormal:MEDIAN,SIGMA" (seconds)')
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls answered with 500/503")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="fraction of calls refused with 429")
+    parser.add_argument("--burst-every", type=float, default=0.0, help="seconds between 429 bursts (0: none)")
+    parser.add_argument("--burst-length", type=float, default=5.0, help="seconds each 429 burst lasts")
+    parser.add_argument("--retry-after", type=float, default=2.0, help="Retry-After sent with 429s")
+    parser.add_argument("--seed", type=int, default=None, help="seed for reproducible fault sequences")
+    args = parser.parse_args()
+
+    plan = FaultPlan(args.latency, args.error_rate, args.rate_429, args.burst_every, args.burst_length,
+                     args.retry_after, args.seed)
+    uvicorn.run(create_app(plan), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+"""Metrics (Prometheus text format), span tracing and Server-Timing, with no dependencies
+
+Shared by the orchestrator and the brainstorming service. Each process
+keeps its own registry and serves it on /metrics.
+
+Spans follow W3C trace context: an incoming traceparent header continues
+the caller's trace, and finished spans are appended as JSON lines to
+TRACE_EXPORT_PATH when it is set.
+"""
+
+import contextvars
+import json
+import os
+import re
+import secrets
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from providers.config import TRACE_EXPORT_PATH
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in values)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.label_names)
+
+    def header(self) -> list:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        super().__init__(name, help_text, labels)
+        self._values = defaultdict(float)
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] += amount
+
+    def render(self) -> list:
+        with self._lock:
+            return self.header() + [
+                f"{self.name}{_labels(self.label_names, key)} {value}" for key, value in self._values.items()
+            ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list:
+        names = self.label_names + ("le",)
+        lines = self.header()
+        with self._lock:
+            for key, series in self._series.items():
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{_labels(names, key + (bound,))} {count}")
+                lines.append(f"{self.name}_bucket{_labels(names, key + ('+Inf',))} {series[-1]}")
+                lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {series[-2]}")
+                lines.append(f"{self.name}_count{_labels(self.label_names, key)} {series[-1]}")
+        return lines
+
+
+class Registry:
+    """Metrics owned by this process, plus collectors that read existing
+    snapshots (token usage, cache stats, ...) at scrape time"""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help_text: str, labels: tuple = ()) -> Counter:
+        return self.register(Counter(name, help_text, labels))
+
+    def gauge(self, name: str, help_text: str, labels: tuple = ()) -> Gauge:
+        return self.register(Gauge(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def add_collector(self, collect) -> None:
+        """collect() returns metrics freshly filled from some other component's state"""
+        self._collectors.append(collect)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            try:
+                for metric in collect():
+                    lines.extend(metric.render())
+            except Exception as e:
+                print(f"Metrics collector failed: {e}")
+        return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+registry = Registry()
+http_duration = registry.histogram(
+    "kitchen_http_request_duration_seconds", "Time to the end of the response body", ("method", "route", "status")
+)
+http_in_flight = registry.gauge("kitchen_http_requests_in_flight", "Requests being handled")
+http_errors = registry.counter("kitchen_http_errors_total", "Responses with status >= 500", ("route", "status"))
+stage_duration = registry.histogram("kitchen_stage_duration_seconds", "Pipeline stage latency", ("stage", "outcome"))
+stage_in_flight = registry.gauge("kitchen_stage_in_flight", "Pipeline stages running", ("stage",))
+llm_errors = registry.counter("kitchen_llm_errors_total", "Failed LLM calls", ("call_site", "error"))
+build_memo = registry.counter("kitchen_build_memo_total", "Build requests by memoization outcome", ("outcome",))
+
+
+# --- Tracing ---
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "attributes", "start", "_clock", "duration", "error")
+
+    def __init__(self, name: str, trace_id: str, parent_id: str = None, attributes: dict = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes = attributes or {}
+        self.start = time.time()
+        self._clock = time.monotonic()
+        self.duration = None
+        self.error = None
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def finish(self) -> None:
+        self.duration = time.monotonic() - self._clock
+
+    def export(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": round(self.duration * 1000, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+def parse_traceparent(header: str):
+    """(trace_id, parent span_id) from a traceparent header, or None if absent/invalid"""
+    match = _TRACEPARENT.match((header or "").strip().lower())
+    if not match or match.group(1) == "0" * 32 or match.group(2) == "0" * 16:
+        return None
+    return match.group(1), match.group(2)
+
+
+_span = contextvars.ContextVar("span", default=None)
+# Stage durations for the request in progress, reported in its Server-Timing header
+_timings = contextvars.ContextVar("server_timing", default=None)
+
+
+class Tracer:
+    """Creates spans in the current context; exports finished ones as JSON lines"""
+
+    def __init__(self, export_path: str = ""):
+        self.export_path = export_path
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, traceparent: str = None, **attributes):
+        """A child of the current span, or a new root (continuing traceparent if given)"""
+        parent = _span.get()
+        if parent is not None:
+            span = Span(name, parent.trace_id, parent.span_id, attributes)
+        else:
+            remote = parse_traceparent(traceparent)
+            span = Span(name, *(remote or (secrets.token_hex(16), None)), attributes=attributes)
+        # set() rather than a reset token: the span may close in a generator finalizer elsewhere
+        _span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = type(e).__name__
+            raise
+        finally:
+            _span.set(parent)
+            span.finish()
+            self._export(span)
+
+    def _export(self, span: Span) -> None:
+        if not self.export_path:
+            return
+        line = json.dumps(span.export()) + "\n"
+        with self._lock:
+            try:
+                directory = os.path.dirname(self.export_path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                with open(self.export_path, "a") as f:
+                    f.write(line)
+            except OSError as e:
+                print(f"Trace export failed: {e}")
+
+
+tracer = Tracer(TRACE_EXPORT_PATH)
+
+
+@contextmanager
+def request_scope(name: str, traceparent: str = None, **attributes):
+    """Root span for one request, collecting stage timings for its Server-Timing header"""
+    timings = {}
+    _timings.set(timings)
+    try:
+        with tracer.span(name, traceparent, **attributes) as span:
+            yield span, timings
+    finally:
+        _timings.set(None)
+
+
+@contextmanager
+def stage(name: str, **attributes):
+    """One pipeline stage: a span, a latency histogram sample and a Server-Timing entry"""
+    stage_in_flight.inc(stage=name)
+    started = time.monotonic()
+    outcome = "ok"
+    try:
+        with tracer.span(name, **attributes):
+            yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        seconds = time.monotonic() - started
+        stage_in_flight.dec(stage=name)
+        stage_duration.observe(seconds, stage=name, outcome=outcome)
+        timings = _timings.get()
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + seconds
+
+
+def server_timing(timings: dict, total: float = None) -> str:
+    """Server-Timing header value: one entry per stage, in milliseconds"""
+    entries = [f"{re.sub(r'[^A-Za-z0-9_-]', '_', name)};dur={seconds * 1000:.1f}" for name, seconds in timings.items()]
+    if total is not None:
+        entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
@@ -0,0 +1,14 @@
+"""Keeps the suite offline and its caches, ledger and artifacts out of the working tree"""
+
+import os
+
+os.environ.setdefault("GEMINI_API_KEY", "test-key")
+os.environ.setdefault("LLM_LEDGER_ENABLED", "false")
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def _workdir(tmp_path, monkeypatch):
+    # Every store resolves its relative default path (.cache/..., output/artifacts) against the cwd
+    monkeypatch.chdir(tmp_path)
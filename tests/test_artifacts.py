@@ -0,0 +1,70 @@
+import asyncio
+import os
+
+import pytest
+
+from agents import frontend
+from orchestrator.artifacts import ArtifactStore
+from orchestrator.models import FrontendPrompt
+
+
+@pytest.fixture
+def store():
+    return ArtifactStore("artifacts")
+
+
+def test_identical_content_is_stored_once(store):
+    first = store.put("<html></html>")
+    second = store.put("<html></html>")
+
+    assert first == second and first["size"] == 13
+    assert store.read(first["sha256"]) == "<html></html>"
+
+
+def test_only_complete_builds_become_latest(store):
+    files = {"frontend/index.html": store.put("<html>v1</html>")}
+    complete = store.record(files)
+    assert store.latest() == complete
+    assert complete["files"]["frontend/index.html"]["url"] == f"/artifacts/{complete['build_id']}/frontend/index.html"
+
+    partial = store.record({"frontend/index.html": store.put("<html>v2</html>")}, complete=False)
+    store.record({})
+    assert store.manifest(partial["build_id"]) == partial
+    assert store.latest()["build_id"] == complete["build_id"]
+
+
+def test_missing_blob_and_unknown_builds(store):
+    entry = store.put("print('hi')")
+    assert store.has_files({"backend/main.py": entry})
+
+    os.remove(store.blob_path(entry["sha256"]))
+    assert not store.has_files({"backend/main.py": entry})
+    assert store.manifest("0" * 32) is None
+    assert store.manifest("../LATEST") is None
+    with pytest.raises(ValueError):
+        store.blob_path("../LATEST")
+
+
+def test_agent_writes_files_off_the_event_loop(monkeypatch):
+    from providers.gemini import gemini_client
+    on_loop = []
+
+    async def agenerate(prompt, **kwargs):
+        return "<html>bakery</html>"
+
+    def put(content):
+        try:
+            asyncio.get_running_loop()
+            on_loop.append(True)
+        except RuntimeError:
+            on_loop.append(False)
+        return {"sha256": "0" * 64, "size": len(content)}
+
+    monkeypatch.setattr(gemini_client, "agenerate", agenerate)
+    monkeypatch.setattr(frontend.artifact_store, "put", put)
+    prompt = FrontendPrompt(role="", domain_description="", project_context="", required_technologies={},
+                            code_requirements=[], core_deliverables=[], constraints=[])
+    files = asyncio.run(frontend.generate_frontend(prompt))
+
+    assert list(files) == ["frontend/index.html"]
+    assert on_loop == [False]
@@ -0,0 +1,47 @@
+import json
+
+import providers.brainstorming_utils as brainstorming_utils
+from providers.batching import MicroBatcher
+
+
+def test_full_queue_sends_one_batch():
+    calls = []
+
+    def run_batch(group, tasks):
+        calls.append((group, tasks))
+        return [f"answer {task}" for task in tasks]
+
+    batcher = MicroBatcher(60, 3, run_batch)
+    futures = [batcher.submit("flash", task) for task in ("a", "b", "c")]
+
+    assert [future.result(timeout=1) for future in futures] == ["answer a", "answer b", "answer c"]
+    assert calls == [("flash", ["a", "b", "c"])]
+    assert batcher.stats["batches"] == 1 and batcher.stats["fallbacks"] == 0
+
+
+def test_lone_task_is_not_batched():
+    calls = []
+    batcher = MicroBatcher(0.01, 8, lambda group, tasks: calls.append(tasks))
+
+    assert batcher.submit("flash", "a").result(timeout=1) is None
+    assert calls == [] and batcher.stats["batches"] == 0
+
+
+def test_failed_batch_falls_back_to_single_calls():
+    def run_batch(group, tasks):
+        raise RuntimeError("upstream down")
+
+    batcher = MicroBatcher(60, 2, run_batch)
+    futures = [batcher.submit("flash", task) for task in ("a", "b")]
+
+    assert [future.result(timeout=1) for future in futures] == [None, None]
+    assert batcher.stats["fallbacks"] == 2
+
+
+def test_list_batch_answers_only_the_tasks_it_covers(monkeypatch):
+    answer = {"results": [{"id": 0, "items": ["Sourdough club", "Bread school"]}, {"id": 1, "items": ["Only one"]}]}
+    monkeypatch.setattr(brainstorming_utils.fixtures, "call", lambda model, config, prompt, fn: json.dumps(answer))
+
+    results = brainstorming_utils._run_list_batch("flash", [("bakery ideas", 2, []), ("cafe ideas", 2, [])])
+
+    assert results == ["1. Sourdough club\n2. Bread school", None]
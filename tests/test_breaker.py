@@ -0,0 +1,81 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import providers.breaker as breaker_module
+import providers.brainstorming_utils as brainstorming_utils
+from providers.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from providers.errors import CircuitOpenError, ProviderError
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    monkeypatch.setattr(breaker_module, "BREAKER_MIN_CALLS", 4)
+    monkeypatch.setattr(breaker_module, "BREAKER_ERROR_RATE", 0.5)
+    monkeypatch.setattr(breaker_module, "BREAKER_OPEN_SECONDS", 30)
+    monkeypatch.setattr(breaker_module, "BREAKER_HALF_OPEN_PROBES", 1)
+    return CircuitBreaker("test:generateContent")
+
+
+def _trip(breaker):
+    for failed in (False, False, True, True):
+        breaker.admit()
+        breaker.record(0.1, failed=failed)
+
+
+def test_opens_once_error_rate_is_reached(breaker):
+    for failed in (False, False, True):
+        breaker.admit()
+        breaker.record(0.1, failed=failed)
+    assert breaker.state == CLOSED
+
+    breaker.admit()
+    breaker.record(0.1, failed=True)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError) as refused:
+        breaker.admit()
+    assert refused.value.retry_after > 0
+
+
+def test_half_open_probe_closes_or_reopens(breaker):
+    _trip(breaker)
+    breaker.opened_at -= 31
+
+    breaker.admit()
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.admit()  # only one probe at a time
+    breaker.record(0.1, failed=True)
+    assert breaker.state == OPEN and breaker.trips == 2
+
+    breaker.opened_at -= 31
+    breaker.admit()
+    breaker.record(0.1, failed=False)
+    assert breaker.state == CLOSED
+
+
+def test_non_retryable_errors_do_not_count(breaker):
+    def bad_request():
+        raise ProviderError("bad request", status=400)
+
+    for _ in range(6):
+        with pytest.raises(ProviderError):
+            breaker.call(bad_request)
+    assert breaker.state == CLOSED
+
+
+def test_open_circuit_is_an_error_not_placeholder_ideas(monkeypatch):
+    def refused(*args, **kwargs):
+        raise CircuitOpenError("gemini:generateContent", 12.0)
+
+    monkeypatch.setattr(brainstorming_utils, "_generate_content", refused)
+    with pytest.raises(CircuitOpenError):
+        brainstorming_utils.gemini_list_items("ideas for a bakery", n=3)
+
+    from orchestrator.main import app
+    response = TestClient(app).post(
+        "/api/generate-ideas",
+        json={"niche": "Food", "subNiche": "Bakery", "area": "Bread", "industry": "Food", "category": "Retail"},
+    )
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "12"
+    assert "circuit" in response.json()["error"].lower()
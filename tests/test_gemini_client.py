@@ -0,0 +1,50 @@
+import asyncio
+import json
+
+import httpx
+
+from providers.gemini import GeminiClient
+from providers.router import model_router
+
+
+def _client(handler) -> GeminiClient:
+    client = GeminiClient()
+    client._async_session = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return client
+
+
+def _answer(text: str) -> httpx.Response:
+    return httpx.Response(200, json={"candidates": [{"content": {"parts": [{"text": text}]}}]})
+
+
+def test_agenerate_returns_text_and_escalates_rejected_answers():
+    models = []
+
+    def handler(request):
+        models.append(request.url.path.rsplit("/", 1)[-1].split(":")[0])
+        return _answer("ok" if model_router.strong in request.url.path else "bad")
+
+    client = _client(handler)
+    text = asyncio.run(client.agenerate("a prompt", call_site="manager", use_cache=False,
+                                        model=model_router.fast, validate=lambda answer: answer == "ok"))
+    assert text == "ok"
+    assert models == [model_router.fast, model_router.strong]
+
+
+def test_identical_concurrent_calls_share_one_request():
+    calls = []
+
+    async def handler(request):
+        calls.append(json.loads(request.content))
+        await asyncio.sleep(0.05)
+        return _answer("shared")
+
+    client = _client(handler)
+
+    async def both():
+        return await asyncio.gather(*(
+            client.agenerate("same prompt", call_site="frontend", use_cache=False) for _ in range(2)
+        ))
+
+    assert asyncio.run(both()) == ["shared", "shared"]
+    assert len(calls) == 1
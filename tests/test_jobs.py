@@ -0,0 +1,76 @@
+import asyncio
+import json
+
+from fastapi.testclient import TestClient
+
+import orchestrator.jobs as jobs
+from orchestrator.jobs import JobStore
+from orchestrator.memo import IdempotencyConflict
+
+
+def _age(store, job_id, seconds):
+    store._conn().execute("UPDATE jobs SET heartbeat_at = heartbeat_at - ? WHERE id = ?", (seconds, job_id))
+
+
+def test_claims_oldest_queued_job_once():
+    store = JobStore("jobs.sqlite3")
+    first = store.submit({"user_prompt": "a bakery site"})
+    second = store.submit({"user_prompt": "a cafe site"})
+
+    claimed = store.claim("w1")
+    assert claimed["id"] == first and claimed["state"] == "running" and claimed["attempts"] == 1
+    assert store.claim("w2")["id"] == second
+    assert store.claim("w3") is None
+    assert store.counts() == {"running": 2}
+
+
+def test_same_idempotency_key_returns_the_same_job():
+    store = JobStore("jobs.sqlite3")
+    job_id = store.submit({"user_prompt": "a bakery site", "idempotency_key": "k1"})
+
+    assert store.submit({"user_prompt": "a  bakery site\n", "idempotency_key": "k1"}) == job_id
+    try:
+        store.submit({"user_prompt": "a cafe site", "idempotency_key": "k1"})
+    except IdempotencyConflict:
+        pass
+    else:
+        raise AssertionError("a reused key for another prompt must be rejected")
+
+
+def test_stale_job_is_requeued_then_failed(monkeypatch):
+    monkeypatch.setattr(jobs, "BUILD_MAX_ATTEMPTS", 2)
+    store = JobStore("jobs.sqlite3")
+    job_id = store.submit({"user_prompt": "a bakery site"})
+
+    store.claim("w1")
+    store.update(job_id, stage="manager")
+    assert store.claim("w2") is None  # still heartbeating
+
+    _age(store, job_id, jobs.STALE_SECONDS + 1)
+    reclaimed = store.claim("w2")
+    assert reclaimed["id"] == job_id and reclaimed["worker"] == "w2" and reclaimed["attempts"] == 2
+
+    _age(store, job_id, jobs.STALE_SECONDS + 1)
+    assert store.claim("w3") is None
+    failed = store.get(job_id)
+    assert failed["state"] == "failed"
+    assert json.loads(failed["error"]) == {"error": "Worker stopped responding"}
+
+
+def test_metrics_read_job_counts_off_the_event_loop(monkeypatch):
+    import orchestrator.main as main
+    on_loop = []
+
+    def counts():
+        try:
+            asyncio.get_running_loop()
+            on_loop.append(True)
+        except RuntimeError:
+            on_loop.append(False)
+        return {"queued": 3}
+
+    monkeypatch.setattr(main.job_store, "counts", counts)
+    response = TestClient(main.app).get("/metrics")
+
+    assert 'kitchen_build_jobs{state="queued"} 3' in response.text
+    assert on_loop == [False]
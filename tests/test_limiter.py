@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+from providers.errors import ProviderError
+from providers.limiter import AdaptiveLimiter, OutboundPolicy, RetryBudget
+
+CLASSES = ["interactive", "build"]
+
+
+async def _settle():
+    """Let woken waiters (resolved via call_soon_threadsafe) run"""
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+def test_limit_grows_additively_and_halves_on_overload():
+    limiter = AdaptiveLimiter(4, 1, 8, CLASSES, decrease_cooldown=60)
+    limiter.acquire("build")
+    limiter.release("build")
+    assert limiter.limit == pytest.approx(4.25)
+
+    for _ in range(2):
+        limiter.acquire("build")
+        limiter.release("build", overloaded=True)
+    # A second 429 inside the cooldown is the same overload, not a new one
+    assert limiter.limit == pytest.approx(2.125)
+
+
+def test_limit_stays_within_bounds():
+    limiter = AdaptiveLimiter(2, 2, 3, CLASSES, decrease_cooldown=0)
+    limiter.acquire("build")
+    limiter.release("build", overloaded=True)
+    assert limiter.limit == 2
+    for _ in range(20):
+        limiter.acquire("build")
+        limiter.release("build")
+    assert limiter.limit == 3
+
+
+def test_freed_slot_goes_to_the_higher_class_first():
+    limiter = AdaptiveLimiter(1, 1, 1, CLASSES)
+    granted = []
+
+    async def wait(cls):
+        await limiter.aacquire(cls)
+        granted.append(cls)
+
+    async def scenario():
+        await limiter.aacquire("build")
+        waiters = [asyncio.create_task(wait("build")), asyncio.create_task(wait("interactive"))]
+        await _settle()
+        assert granted == []
+        limiter.release("build")
+        await _settle()
+        assert granted == ["interactive"]
+        limiter.release("interactive")
+        await asyncio.gather(*waiters)
+
+    asyncio.run(scenario())
+    assert granted == ["interactive", "build"]
+
+
+def test_reserved_slots_are_kept_for_higher_classes():
+    limiter = AdaptiveLimiter(2, 1, 2, CLASSES, reserved={"interactive": 1})
+
+    async def scenario():
+        await limiter.aacquire("build")
+        blocked = asyncio.create_task(limiter.aacquire("build"))
+        await _settle()
+        assert not blocked.done()
+        # The reserved slot is still free for interactive traffic
+        await asyncio.wait_for(limiter.aacquire("interactive"), 1)
+        blocked.cancel()
+        await asyncio.gather(blocked, return_exceptions=True)
+
+    asyncio.run(scenario())
+    assert limiter.snapshot()["classes"]["build"]["queue_depth"] == 0
+
+
+def test_retry_budget_limits_retries_to_a_share_of_first_attempts():
+    budget = RetryBudget(0.5, cap=2)
+    assert [budget.withdraw() for _ in range(3)] == [True, True, False]
+    budget.deposit()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert budget.withdraw()
+
+
+def test_retries_stop_when_the_budget_is_spent():
+    policy = OutboundPolicy()
+    policy.retry_budget = RetryBudget(0, cap=1)
+    error = ProviderError("busy", status=503)
+    assert policy._on_error(error, 0) is not None
+    assert policy._on_error(error, 1) is None
+    assert policy._on_error(ProviderError("bad request", status=400), 0) is None
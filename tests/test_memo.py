@@ -0,0 +1,95 @@
+import asyncio
+import time
+
+import pytest
+
+import orchestrator.memo as memo
+from orchestrator.deadline import Deadline, DeadlineExceeded
+from orchestrator.memo import BuildMemo, IdempotencyConflict
+
+
+class FakeBuilds:
+    """Stands in for run_build: each build takes `seconds` under the leader's deadline"""
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.runs = []
+
+    async def __call__(self, user_prompt, use_cache, deadline, on_change=None, reuse=None):
+        self.runs.append(user_prompt)
+        try:
+            await deadline.run("manager", asyncio.sleep(self.seconds))
+        except DeadlineExceeded:
+            return {"status": "timeout", "deadline": deadline.report(), "pipeline": {}}
+        return {"status": "complete", "manifest": {"files": {}}, "deadline": deadline.report(), "pipeline": {}}
+
+
+@pytest.fixture
+def builds(monkeypatch):
+    fake = FakeBuilds()
+    monkeypatch.setattr(memo, "run_build", fake)
+    return fake
+
+
+def test_miss_then_hit_then_replayed(builds):
+    store = BuildMemo("memo.sqlite3")
+
+    async def main():
+        first = await store.run("a bakery site", True, Deadline(5), "key-1")
+        second = await store.run("a  bakery site", True, Deadline(5))
+        third = await store.run("a bakery site", False, Deadline(5), "key-1")
+        return first, second, third
+
+    outcomes = [result["memo"] for result in asyncio.run(main())]
+    assert outcomes == ["miss", "hit", "replayed"]
+    assert len(builds.runs) == 1
+
+    with pytest.raises(IdempotencyConflict):
+        asyncio.run(store.run("a cafe site", True, Deadline(5), "key-1"))
+
+
+def test_concurrent_repeat_joins_the_running_build(builds):
+    builds.seconds = 0.05
+    store = BuildMemo("memo.sqlite3")
+
+    async def main():
+        return await asyncio.gather(store.run("a bakery site", True, Deadline(5)),
+                                    store.run("a bakery site", True, Deadline(5)))
+
+    assert sorted(result["memo"] for result in asyncio.run(main())) == ["joined", "miss"]
+    assert len(builds.runs) == 1
+
+
+def test_joiner_times_out_on_its_own_deadline(builds):
+    builds.seconds = 0.5
+    store = BuildMemo("memo.sqlite3")
+
+    async def main():
+        leader = asyncio.ensure_future(store.run("a bakery site", True, Deadline(5)))
+        await asyncio.sleep(0.01)
+        started = time.monotonic()
+        joined = await store.run("a bakery site", True, Deadline(0.05))
+        waited = time.monotonic() - started
+        return await leader, joined, waited
+
+    leader, joined, waited = asyncio.run(main())
+    assert leader["status"] == "complete"
+    assert joined["status"] == "timeout" and joined["memo"] == "joined"
+    assert joined["deadline"]["budget_seconds"] == 0.05 and waited < 0.3
+
+
+def test_joiner_reruns_when_the_leaders_deadline_runs_out(builds):
+    builds.seconds = 0.1
+    store = BuildMemo("memo.sqlite3")
+
+    async def main():
+        leader = asyncio.ensure_future(store.run("a bakery site", True, Deadline(0.05)))
+        await asyncio.sleep(0.01)
+        joined = await store.run("a bakery site", True, Deadline(5))
+        return await leader, joined
+
+    leader, joined = asyncio.run(main())
+    assert leader["status"] == "timeout"
+    assert joined["status"] == "complete" and joined["memo"] == "miss"
+    assert joined["deadline"]["budget_seconds"] == 5
+    assert len(builds.runs) == 2
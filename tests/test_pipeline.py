@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from orchestrator.deadline import Deadline, DeadlineExceeded, within
+from orchestrator.pipeline import Node, Pipeline
+
+
+def _nodes(slow_seconds: float):
+    async def plan(idea, deadline):
+        return {"backend_prompt": f"api for {idea}", "frontend_prompt": f"ui for {idea}"}
+
+    async def backend(backend_prompt, deadline):
+        return {"main.py": backend_prompt}
+
+    async def frontend(frontend_prompt, deadline):
+        await within(deadline, "frontend", asyncio.sleep(slow_seconds))
+        return {"index.html": frontend_prompt}
+
+    return Pipeline([
+        Node("manager", plan, inputs=("idea",), outputs=("backend_prompt", "frontend_prompt")),
+        Node("backend", backend, inputs=("backend_prompt",), outputs=("backend_files",)),
+        Node("frontend", frontend, inputs=("frontend_prompt",), outputs=("frontend_files",)),
+    ])
+
+
+def test_runs_every_node():
+    values = {"idea": "bakery"}
+    timings = {}
+    asyncio.run(_nodes(0).run(values, timings, deadline=Deadline(5)))
+
+    assert values["backend_files"] == {"main.py": "api for bakery"}
+    assert values["frontend_files"] == {"index.html": "ui for bakery"}
+    assert {name: node["state"] for name, node in timings.items()} == {
+        "manager": "done", "backend": "done", "frontend": "done",
+    }
+
+
+def test_deadline_keeps_finished_outputs():
+    values = {"idea": "bakery"}
+    timings = {}
+    deadline = Deadline(0.05)
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(_nodes(5).run(values, timings, deadline=deadline))
+
+    # The manager's plan and the backend finished before the deadline; the frontend did not
+    assert values["backend_files"] == {"main.py": "api for bakery"}
+    assert "frontend_files" not in values
+    assert timings["frontend"]["state"] == "failed"
+    assert deadline.report()["exceeded_stage"] == "frontend"
+
+
+def test_first_failure_cancels_the_rest():
+    async def broken(backend_prompt, deadline):
+        raise RuntimeError("backend agent crashed")
+
+    pipeline = _nodes(5)
+    pipeline.nodes[1] = Node("backend", broken, inputs=("backend_prompt",), outputs=("backend_files",))
+    timings = {}
+    with pytest.raises(RuntimeError):
+        asyncio.run(pipeline.run({"idea": "bakery"}, timings, deadline=Deadline(5)))
+
+    assert timings["backend"]["state"] == "failed"
+    assert timings["frontend"]["state"] == "cancelled"
+
+
+def test_none_input_skips_the_node():
+    values = {"backend_prompt": None, "frontend_prompt": "ui"}
+    timings = {}
+    pipeline = _nodes(0)
+    asyncio.run(Pipeline(pipeline.nodes[1:]).run(values, timings, deadline=Deadline(5)))
+
+    assert values["backend_files"] is None
+    assert timings["backend"]["state"] == "skipped"
+
+
+def test_custom_idea_goes_through_the_build_memo_with_a_deadline(monkeypatch):
+    import orchestrator.main as main
+    calls = []
+
+    async def memo_run(user_prompt, use_cache, deadline, idempotency_key=None, on_change=None):
+        calls.append((use_cache, deadline.budget))
+        return {"status": "timeout", "deadline": deadline.report(), "pipeline": {}}
+
+    monkeypatch.setattr(main, "gemini_generate_text", lambda prompt, use_cache=True: "text")
+    monkeypatch.setattr(main.build_memo_store, "run", memo_run)
+    response = TestClient(main.app).post(
+        "/api/process-custom-idea", json={"idea": "bakery app", "use_cache": False},
+        headers={"X-Request-Timeout": "7"},
+    )
+
+    assert response.status_code == 504
+    assert response.json()["idea"] == "bakery app"
+    assert calls == [(False, 7.0)]
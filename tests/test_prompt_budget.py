@@ -0,0 +1,18 @@
+from agents.backend import build_backend_prompt
+from agents.prompt_budget import render_templates
+from orchestrator.models import BackendPrompt
+from providers.prompts import over_budget
+
+
+def test_templates_within_budget():
+    assert over_budget(render_templates()) == {}
+
+
+def test_multiline_field_keeps_template_dedented():
+    prompt = build_backend_prompt(BackendPrompt(
+        role="Backend Engineer", domain_description="Bookings", project_context="Line one\nLine two",
+        required_technologies={}, code_requirements=[], core_deliverables=[], constraints=[],
+        integration_requirements=[],
+    ))
+    assert prompt.startswith("You are a Backend Engineer.")
+    assert not any(line.startswith(" ") for line in prompt.splitlines())
@@ -0,0 +1,35 @@
+from providers import cache
+from providers.similarity import signature, similarity
+
+LIST_ITEMS_THRESHOLD = 0.9
+TEMPLATE = "List 3 product ideas for {area} in {category} for the {industry} industry."
+
+
+def _score(a, b) -> float:
+    return similarity(signature(a), signature(b))
+
+
+def test_reordered_words_collide():
+    assert _score(("Technology", "retail clothing", "Fashion"),
+                  ("Technology", "clothing retail", "Fashion")) >= LIST_ITEMS_THRESHOLD
+
+
+def test_unrelated_values_do_not_collide():
+    assert _score(("Technology", "retail clothing", "Fashion"),
+                  ("Healthcare", "fitness tracking", "Wellness")) < LIST_ITEMS_THRESHOLD
+    assert _score(("Services", "dog grooming", "Pets"),
+                  ("Services", "cat grooming", "Pets")) < LIST_ITEMS_THRESHOLD
+
+
+def test_reordered_category_is_a_near_hit_through_the_cache():
+    fields = ("Technology", "retail clothing", "Fashion")
+    reordered = ("Technology", "clothing retail", "Fashion")
+    unrelated = ("Healthcare", "fitness tracking", "Wellness")
+    prompt = TEMPLATE.format(area=fields[0], category=fields[1], industry=fields[2])
+    key, cached = cache.lookup("list_items", "model", {}, prompt, fields)
+    assert cached is None
+    cache.store("list_items", key, "model", {}, prompt, "1. Idea", fields)
+
+    for other, expected in ((reordered, "1. Idea"), (unrelated, None)):
+        other_prompt = TEMPLATE.format(area=other[0], category=other[1], industry=other[2])
+        assert cache.lookup("list_items", "model", {}, other_prompt, other)[1] == expected
@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+from providers.singleflight import AsyncSingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+    flights = AsyncSingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    async def main():
+        return await asyncio.gather(*(flights.do("k", fetch) for _ in range(3)))
+
+    assert asyncio.run(main()) == ["answer"] * 3
+    assert len(calls) == 1 and flights.coalesced == 2
+    assert not flights.in_flight("k")
+
+
+def test_cancelled_waiter_does_not_cancel_the_shared_call():
+    flights = AsyncSingleFlight()
+    finished = []
+
+    async def fetch():
+        await asyncio.sleep(0.05)
+        finished.append(1)
+        return "answer"
+
+    async def main():
+        leader = asyncio.ensure_future(flights.do("k", fetch))
+        joiner = asyncio.ensure_future(flights.do("k", fetch))
+        await asyncio.sleep(0)
+        assert flights.in_flight("k")
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        # A waiter giving up on its own deadline doesn't end it for the rest either
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(flights.do("k", fetch), 0.01)
+        return await joiner
+
+    assert asyncio.run(main()) == "answer"
+    assert finished == [1]
+
+
+def test_errors_reach_every_waiter():
+    flights = AsyncSingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    async def main():
+        return await asyncio.gather(flights.do("k", fetch), flights.do("k", fetch), return_exceptions=True)
+
+    assert [str(error) for error in asyncio.run(main())] == ["upstream down"] * 2
@@ -0,0 +1,79 @@
+import asyncio
+import os
+
+from orchestrator.artifacts import artifact_store
+from orchestrator.memo import BuildMemo, StageReuse
+from orchestrator.pipeline import Node, Pipeline
+
+
+class DictReuse:
+    def __init__(self):
+        self.stored = {}
+
+    def get(self, node, fingerprint):
+        return self.stored.get((node.name, fingerprint))
+
+    def put(self, node, fingerprint, outputs):
+        self.stored[(node.name, fingerprint)] = outputs
+
+
+def _pipeline(ran):
+    async def plan(idea):
+        return {"backend_prompt": "api", "frontend_prompt": f"ui for {idea}"}
+
+    def agent(name):
+        async def run(**inputs):
+            ran.append(name)
+            return {f"{name}.txt": inputs[f"{name}_prompt"]}
+        return run
+
+    return Pipeline([
+        Node("manager", plan, inputs=("idea",), outputs=("backend_prompt", "frontend_prompt")),
+        Node("backend", agent("backend"), inputs=("backend_prompt",), outputs=("backend_files",),
+             fingerprint=lambda backend_prompt: backend_prompt),
+        Node("frontend", agent("frontend"), inputs=("frontend_prompt",), outputs=("frontend_files",),
+             fingerprint=lambda frontend_prompt: frontend_prompt),
+    ])
+
+
+def test_only_changed_stages_run_again():
+    ran = []
+    reuse = DictReuse()
+    asyncio.run(_pipeline(ran).run({"idea": "bakery"}, reuse=reuse))
+    assert sorted(ran) == ["backend", "frontend"]
+
+    ran.clear()
+    values = {"idea": "cafe"}
+    timings = {}
+    asyncio.run(_pipeline(ran).run(values, timings, reuse=reuse))
+
+    assert ran == ["frontend"]
+    assert timings["backend"]["state"] == "reused" and timings["frontend"]["state"] == "done"
+    assert values["backend_files"] == {"backend.txt": "api"}
+    assert values["frontend_files"] == {"frontend.txt": "ui for cafe"}
+
+
+def test_stage_reuse_needs_the_files_still_stored():
+    reuse = StageReuse(BuildMemo("memo.sqlite3"))
+    node = Node("frontend", None, outputs=("frontend_files",))
+    entry = artifact_store.put("<html>bakery</html>")
+    outputs = {"frontend_files": {"frontend/index.html": entry}}
+
+    reuse.put(node, "ui for bakery", outputs)
+    assert reuse.get(node, "ui for bakery") == outputs
+    assert reuse.get(node, "ui for cafe") is None
+
+    os.remove(artifact_store.blob_path(entry["sha256"]))
+    assert reuse.get(node, "ui for bakery") is None
+
+
+def test_memo_hit_reports_every_stage_reused():
+    result = {
+        "status": "complete",
+        "pipeline": {"manager": {}, "backend": {}, "frontend": {}},
+        "stages": {"reused": ["backend"], "rebuilt": ["manager", "frontend"]},
+    }
+    hit = asyncio.run(BuildMemo("memo.sqlite3")._outcome(result, "hit"))
+
+    assert hit["stages"] == {"reused": ["manager", "backend", "frontend"], "rebuilt": []}
+    assert result["stages"]["rebuilt"] == ["manager", "frontend"]  # the stored result is untouched
@@ -0,0 +1,81 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from providers.errors import ProviderError
+from providers.fixtures import FixtureProvider, FixtureStore, fixtures
+from providers.gemini import GeminiClient
+from providers.stub_server import FaultPlan, canned_response, create_app
+
+
+def _plan(**faults) -> FaultPlan:
+    settings = dict(latency="fixed:0", error_rate=0.0, rate_429=0.0, burst_every=0, burst_length=0, retry_after=7)
+    return FaultPlan(**{**settings, **faults}, seed=1)
+
+
+def _body(text: str) -> dict:
+    return {"contents": [{"role": "user", "parts": [{"text": text}]}]}
+
+
+def test_canned_answers_have_the_shape_each_agent_parses():
+    plan = json.loads(canned_response("Project Manager Agent\nUser Request: a landing page"))
+    assert plan["project_type"] == "frontend_only" and "backend_engineer_prompt" not in plan
+
+    plan = json.loads(canned_response("Project Manager Agent\nUser Request: a todo app with an API"))
+    assert plan["project_type"] == "full_stack" and "backend_engineer_prompt" in plan
+
+    items = canned_response("Return exactly the requested number of short items. Return 4 items.")
+    assert items.splitlines()[-1] == "4. Stub idea number 4"
+
+
+def test_generate_and_stream_return_the_same_text():
+    client = TestClient(create_app(_plan()))
+    prompt = "You are a Frontend Engineer"
+
+    answer = client.post("/v1beta/models/flash:generateContent", json=_body(prompt)).json()
+    assert answer["candidates"][0]["content"]["parts"][0]["text"] == canned_response(prompt)
+
+    stream = client.post("/v1beta/models/flash:streamGenerateContent?alt=sse", json=_body(prompt))
+    chunks = [json.loads(line[len("data: "):]) for line in stream.text.splitlines() if line.startswith("data: ")]
+    assert "".join(chunk["candidates"][0]["content"]["parts"][0]["text"] for chunk in chunks) == canned_response(prompt)
+
+
+def test_injected_faults():
+    refused = TestClient(create_app(_plan(burst_every=60, burst_length=60))).post(
+        "/v1beta/models/flash:generateContent", json=_body("hi")
+    )
+    assert refused.status_code == 429 and refused.headers["Retry-After"] == "7"
+
+    failed = TestClient(create_app(_plan(error_rate=1.0))).post("/v1beta/models/flash:generateContent", json=_body("hi"))
+    assert failed.status_code in (500, 503)
+
+
+def test_record_then_replay_without_upstream(monkeypatch):
+    prompt = "You are a Backend Engineer; write the API"
+    monkeypatch.setattr(fixtures, "store", FixtureStore("fixtures"))
+
+    monkeypatch.setattr(fixtures, "mode", "record")
+    recording = GeminiClient()
+    recording._async_session = httpx.AsyncClient(transport=httpx.ASGITransport(app=create_app(_plan())))
+    recorded = asyncio.run(recording.agenerate(prompt, call_site="backend", use_cache=False))
+    assert recorded == canned_response(prompt)
+
+    def offline(request):
+        raise AssertionError("replay must not call upstream")
+
+    monkeypatch.setattr(fixtures, "mode", "replay")
+    replaying = GeminiClient()
+    replaying._async_session = httpx.AsyncClient(transport=httpx.MockTransport(offline))
+    assert asyncio.run(replaying.agenerate(prompt, call_site="backend", use_cache=False)) == recorded
+
+    with pytest.raises(ProviderError) as missing:
+        asyncio.run(replaying.agenerate("a prompt never recorded", call_site="backend", use_cache=False))
+    assert missing.value.status == 404 and not missing.value.retryable
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(RuntimeError):
+        FixtureProvider("replay-all", FixtureStore("fixtures"))